@@ -12,25 +12,52 @@ The workflow reproduces *exactly* the CLI steps:
     7. AI exam suggestions        → physician selects
     8. Persist record & show confirmation
 
-State is kept server-side in a simple in-memory store (`_SESSIONS`);
-swap in Redis or a DB for production.
+State is kept server-side in a ``SessionStore`` (in-memory LRU with TTL by
+default, or SQLite shared by every worker with ``SDX_SESSION_STORE=sqlite``).
+With ``SDX_PORTAL_PREFETCH=1`` the differential is requested in the
+background as soon as step 5 is posted (and reissued if earlier answers are
+edited), so step 6 usually renders from an already finished reply.
+``SDX_PORTAL_PREFETCH_EXAMS=1`` likewise requests exams for each of the top
+``SDX_PORTAL_PREFETCH_TOP_K`` diagnoses once step 6 is shown;
+``SDX_PORTAL_PREFETCH_BUDGET`` caps speculative calls per hour.
+Token and latency metrics of the LLM calls are served at ``/metrics``
+(Prometheus) and ``/metrics/llm`` (JSON, with p50/p95/p99 per step).
 """
 
 from __future__ import annotations
 
+import asyncio
+import copy
+import functools
+import os
 import uuid
 
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
-
-from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from typing import Any, AsyncIterator, Dict, List
+from urllib.parse import urlencode
+
+from fastapi import Depends, FastAPI, Form, HTTPException, Request
+from fastapi.responses import (
+    HTMLResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sdx.agents import metrics as llm_metrics
 from sdx.agents.diagnostics import core as diag  # OpenAI helpers
+from sdx.agents.streaming import StreamEvent
+from sdx.schema.clinical_outputs import LLMDiagnosis
 
-from research.models.repositories import PatientRepository
+from research.app.prefetch import Prefetcher, fingerprint
+from research.models.repositories import (
+    RepositoryInterface,
+    get_patient_repository,
+)
+from research.models.sessions import SessionStore, get_session_store
 
 APP_DIR = Path(__file__).parent
 TEMPLATES = Environment(
@@ -40,19 +67,88 @@ TEMPLATES = Environment(
 
 
 _STATIC = StaticFiles(directory=APP_DIR / 'static')
-_SESSIONS: Dict[str, Dict[str, Any]] = {}  # swap with redis if needed
+# Render AI pages immediately and fill them through the SSE endpoints.
+_STREAMING = os.getenv('SDX_PORTAL_STREAMING', '0') == '1'
+# Start the differential in the background once the tests step is posted.
+_PREFETCH = os.getenv('SDX_PORTAL_PREFETCH', '0') == '1'
+# Request exams for the top-k diagnoses while the physician is choosing.
+_PREFETCH_EXAMS = os.getenv('SDX_PORTAL_PREFETCH_EXAMS', '0') == '1'
+_PREFETCH_TOP_K = int(os.getenv('SDX_PORTAL_PREFETCH_TOP_K', '3'))
+# Max speculative calls per hour (0 = unlimited).
+_PREFETCHER = Prefetcher(
+    budget=int(os.getenv('SDX_PORTAL_PREFETCH_BUDGET', '0')) or None
+)
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create the application-scoped patient repository and sessions."""
+    app.state.repository = get_patient_repository()
+    app.state.sessions = get_session_store()
+    if _PREFETCH or _PREFETCH_EXAMS:
+        _PREFETCHER.bind(asyncio.get_running_loop())
+    yield
+    _PREFETCHER.bind(None)
+
 
-app = FastAPI(title='TeleHealthCareAI — Physician Portal')
+app = FastAPI(title='TeleHealthCareAI — Physician Portal', lifespan=_lifespan)
 app.mount('/static', _STATIC, name='static')
 
 
-@app.get('/', response_class=HTMLResponse)
-def dashboard() -> HTMLResponse:
-    """Dashboard page view with all recorded patients."""
-    repo = PatientRepository()
-    patients = repo.all()
+def _repository(request: Request) -> RepositoryInterface:
+    """Return the shared repository (built lazily outside the lifespan)."""
+    repo: RepositoryInterface | None = getattr(
+        request.app.state, 'repository', None
+    )
+    if repo is None:
+        repo = request.app.state.repository = get_patient_repository()
+    return repo
+
 
-    context = {'title': 'Dashboard', 'patients': patients}
+def _sessions() -> SessionStore:
+    """Return the shared session store (built lazily outside the lifespan)."""
+    store: SessionStore | None = getattr(app.state, 'sessions', None)
+    if store is None:
+        store = app.state.sessions = get_session_store()
+    return store
+
+
+@app.get('/', response_class=HTMLResponse)
+def dashboard(
+    cursor: str = '',
+    lang: str = '',
+    diagnosis: str = '',
+    exam: str = '',
+    limit: int = 20,
+    repo: RepositoryInterface = Depends(_repository),
+) -> HTMLResponse:
+    """Dashboard page view with one page of recorded patients."""
+    try:
+        page = repo.query(
+            limit=max(1, min(limit, 100)),
+            cursor=cursor or None,
+            language=lang or None,
+            diagnosis=diagnosis or None,
+            exam=exam or None,
+        )
+    except ValueError as exc:
+        raise HTTPException(400, str(exc)) from exc
+
+    filters = {'lang': lang, 'diagnosis': diagnosis, 'exam': exam}
+    params = {k: v for k, v in filters.items() if v}
+    first_url = '/?' + urlencode(params) if params else '/'
+    next_url = None
+    if page.next_cursor:
+        next_url = '/?' + urlencode({**params, 'cursor': page.next_cursor})
+
+    context = {
+        'title': 'Dashboard',
+        'patients': page.items,
+        'filters': filters,
+        'next_url': next_url,
+        'first_url': first_url,
+        'paged': bool(cursor),
+    }
 
     return _render('dashboard.html', **context)
 
@@ -67,10 +163,7 @@ def landing(request: Request) -> HTMLResponse:
 def start_with_language(lang: str = Form(...)) -> RedirectResponse:
     """Create a session after the physician chooses a language."""
     sid = str(uuid.uuid4())
-    _SESSIONS[sid] = {
-        'patient': {},
-        'meta': {'uuid': sid, 'lang': lang},
-    }
+    _sessions().save(sid, {'patient': {}, 'meta': {'uuid': sid, 'lang': lang}})
     return RedirectResponse(url=f'/demographics?sid={sid}', status_code=303)
 
 
@@ -88,19 +181,185 @@ def select_language(request: Request) -> HTMLResponse:
 
 def _session_or_404(sid: str) -> Dict[str, Any]:
     """Return the session dict or raise 404."""
-    if sid not in _SESSIONS:
+    sess = _sessions().get(sid)
+    if sess is None:
         raise HTTPException(status_code=404, detail='Session expired')
-    return _SESSIONS[sid]
+    return sess
+
+
+async def _asession_or_404(sid: str) -> Dict[str, Any]:
+    """Async ``_session_or_404`` that keeps store I/O off the event loop."""
+    sess = await _sessions().aget(sid)
+    if sess is None:
+        raise HTTPException(status_code=404, detail='Session expired')
+    return sess
+
+
+@app.get('/metrics/sessions')
+def session_metrics() -> Dict[str, int]:
+    """Return live-session and eviction counters of the session store."""
+    return _sessions().stats.as_dict()
+
+
+@app.get('/metrics/prefetch')
+def prefetch_metrics() -> Dict[str, int]:
+    """Return issued / hit / miss / cancelled counters of the prefetcher."""
+    return _PREFETCHER.stats.as_dict()
+
+
+@app.get('/metrics/llm')
+def llm_call_metrics() -> List[Dict[str, Any]]:
+    """Return tokens and p50/p95/p99 latency per LLM endpoint."""
+    return llm_metrics.registry.snapshot()
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+def prometheus_metrics() -> str:
+    """Return LLM call metrics in the Prometheus text format."""
+    return llm_metrics.registry.prometheus()
+
+
+def _differential_digest(sess: Dict[str, Any]) -> str:
+    """Return the fingerprint of the inputs of the differential call."""
+    return fingerprint(sess['patient'], sess['meta'].get('lang', 'en'))
+
+
+def _exams_job(selected: List[str], lang: str) -> tuple[str, str]:
+    """Return the prefetch job name and fingerprint of an exams call."""
+    digest = fingerprint(selected, lang)
+    return f'exams:{digest[:16]}', digest
+
+
+def _prefetch_differential(
+    sid: str, sess: Dict[str, Any], *, only_if_pending: bool = False
+) -> None:
+    """Speculatively start the differential for the current answers."""
+    if not _PREFETCH:
+        return
+    patient = copy.deepcopy(sess['patient'])
+    lang = sess['meta'].get('lang', 'en')
+    _PREFETCHER.submit(
+        (sid, 'differential'),
+        _differential_digest(sess),
+        lambda: diag.adifferential(patient, language=lang, session_id=sid),
+        only_if_pending=only_if_pending,
+    )
+
+
+def _top_options(options: Any, k: int) -> List[str]:
+    """
+    Return the *k* most likely option names of an ``LLMDiagnosis``.
+
+    *options* is a list (already ordered) or a ``{name: probability}``
+    dict, sorted here by probability.
+    """
+    if isinstance(options, dict):
+        scores: Dict[str, float] = options
+        return sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+    return list(options or [])[:k]
+
+
+def _prefetch_exams(sid: str, sess: Dict[str, Any]) -> None:
+    """Speculatively request exams for each of the top-k diagnoses."""
+    if not _PREFETCH_EXAMS:
+        return
+    try:
+        lang = sess['meta'].get('lang', 'en')
+        options = (sess.get('ai_diag') or {}).get('options')
+        for option in _top_options(options, _PREFETCH_TOP_K):
+            name, digest = _exams_job([option], lang)
+            _PREFETCHER.submit(
+                (sid, name),
+                digest,
+                functools.partial(
+                    diag.aexams, [option], language=lang, session_id=sid
+                ),
+            )
+    except Exception:  # a speculative job must never fail the page
+        _PREFETCHER.stats.errors += 1
+
+
+async def _prefetched(sid: str, name: str, digest: str) -> LLMDiagnosis | None:
+    """Return the result of a prefetched job if it matches *digest*."""
+    job = _PREFETCHER.take((sid, name), digest)
+    if job is None:
+        return None
+    try:
+        result: LLMDiagnosis = await job
+    except Exception:  # the live call made instead reports real errors
+        return None
+    return result
+
+
+async def _prefetched_differential(
+    sid: str, sess: Dict[str, Any]
+) -> LLMDiagnosis | None:
+    """Return the prefetched differential if it matches the session."""
+    if not _PREFETCH:
+        return None
+    return await _prefetched(sid, 'differential', _differential_digest(sess))
+
+
+async def _prefetched_exams(
+    sid: str, sess: Dict[str, Any]
+) -> LLMDiagnosis | None:
+    """Return prefetched exams for the selection, dropping other guesses."""
+    if not _PREFETCH_EXAMS:
+        return None
+    lang = sess['meta'].get('lang', 'en')
+    name, digest = _exams_job(sess['selected_diagnoses'], lang)
+    ai = await _prefetched(sid, name, digest)
+    _PREFETCHER.discard(sid, 'exams:')
+    return ai
+
+
+async def _replay(ai: LLMDiagnosis) -> AsyncIterator[StreamEvent]:
+    """Yield a finished reply as the events ``astream_chat`` would."""
+    yield StreamEvent('summary', ai.summary)
+    for option in ai.options:
+        yield StreamEvent('option', option)
+    yield StreamEvent('done', ai.model_dump())
+
+
+async def _differential_events(
+    sid: str, sess: Dict[str, Any]
+) -> AsyncIterator[StreamEvent]:
+    """Stream the differential, replaying a prefetched result if any."""
+    ai = await _prefetched_differential(sid, sess)
+    if ai is None:
+        lang = sess['meta'].get('lang', 'en')
+        events = diag.stream_differential(
+            sess['patient'], language=lang, session_id=sid
+        )
+    else:
+        events = _replay(ai)
+    async for event in events:
+        yield event
+
+
+async def _exams_events(
+    sid: str, sess: Dict[str, Any]
+) -> AsyncIterator[StreamEvent]:
+    """Stream the exam suggestions, replaying a prefetched result if any."""
+    ai = await _prefetched_exams(sid, sess)
+    if ai is None:
+        lang = sess['meta'].get('lang', 'en')
+        events = diag.stream_exams(
+            sess['selected_diagnoses'], language=lang, session_id=sid
+        )
+    else:
+        events = _replay(ai)
+    async for event in events:
+        yield event
 
 
 @app.get('/start', response_class=HTMLResponse)
 def start() -> HTMLResponse:
     """Kick-off page — redirects immediately to demographics step."""
     sess_id = str(uuid.uuid4())
-    _SESSIONS[sess_id] = {
-        'patient': {},
-        'meta': {'uuid': sess_id, 'lang': 'en'},
-    }  # Default to English
+    _sessions().save(
+        sess_id, {'patient': {}, 'meta': {'uuid': sess_id, 'lang': 'en'}}
+    )  # Default to English
     return RedirectResponse(f'/demographics?sid={sess_id}', status_code=302)
 
 
@@ -129,6 +388,8 @@ def demographics_post(
     sess['patient'].update(
         age=age, gender=gender, weight_kg=weight_kg, height_cm=height_cm
     )
+    _sessions().save(sid, sess)
+    _prefetch_differential(sid, sess, only_if_pending=True)
     return RedirectResponse(f'/lifestyle?sid={sid}', status_code=303)
 
 
@@ -160,6 +421,8 @@ def lifestyle_post(
         physical_activity=physical_activity,
         mental_exercises=mental_exercises,
     )
+    _sessions().save(sid, sess)
+    _prefetch_differential(sid, sess, only_if_pending=True)
     return RedirectResponse(f'/symptoms?sid={sid}', status_code=303)
 
 
@@ -180,6 +443,8 @@ def symptoms_post(sid: str, symptoms: str = Form(...)) -> RedirectResponse:
     """Handle symptoms POST request."""
     sess = _session_or_404(sid)
     sess['patient']['symptoms'] = symptoms
+    _sessions().save(sid, sess)
+    _prefetch_differential(sid, sess, only_if_pending=True)
     return RedirectResponse(f'/mental?sid={sid}', status_code=303)
 
 
@@ -200,6 +465,8 @@ def mental_post(sid: str, mental_health: str = Form(...)) -> RedirectResponse:
     """Handle mental POST request."""
     sess = _session_or_404(sid)
     sess['patient']['mental_health'] = mental_health
+    _sessions().save(sid, sess)
+    _prefetch_differential(sid, sess, only_if_pending=True)
     return RedirectResponse(f'/tests?sid={sid}', status_code=303)
 
 
@@ -220,16 +487,34 @@ def tests_post(sid: str, previous_tests: str = Form(...)) -> RedirectResponse:
     """Handle tests POST request."""
     sess = _session_or_404(sid)
     sess['patient']['previous_tests'] = previous_tests
+    _sessions().save(sid, sess)
+    _prefetch_differential(sid, sess)
     return RedirectResponse(f'/diagnosis?sid={sid}', status_code=303)
 
 
 @app.get('/diagnosis', response_class=HTMLResponse)
-def diagnosis(request: Request, sid: str) -> HTMLResponse:
+async def diagnosis(request: Request, sid: str) -> HTMLResponse:
     """Handle diagnosis GET request."""
-    sess = _session_or_404(sid)
+    sess = await _asession_or_404(sid)
     lang = sess['meta'].get('lang', 'en')
-    ai = diag.differential(sess['patient'], language=lang, session_id=sid)
+    if _STREAMING:
+        return _render(
+            'diagnosis.html',
+            request=request,
+            sid=sid,
+            summary='',
+            options=[],
+            lang=lang,
+            stream=True,
+        )
+    ai = await _prefetched_differential(sid, sess)
+    if ai is None:
+        ai = await diag.adifferential(
+            sess['patient'], language=lang, session_id=sid
+        )
     sess['ai_diag'] = ai.model_dump()
+    await _sessions().asave(sid, sess)
+    _prefetch_exams(sid, sess)
     return _render(
         'diagnosis.html',
         request=request,
@@ -240,6 +525,32 @@ def diagnosis(request: Request, sid: str) -> HTMLResponse:
     )
 
 
+async def _sse(
+    events: AsyncIterator[StreamEvent],
+    sid: str,
+    sess: Dict[str, Any],
+    key: str,
+) -> AsyncIterator[str]:
+    """Encode *events* as SSE frames, storing the final result in *sess*."""
+    async for event in events:
+        if event.event == 'done':
+            sess[key] = event.data
+            await _sessions().asave(sid, sess)
+            if key == 'ai_diag':
+                _prefetch_exams(sid, sess)
+        yield event.to_sse()
+
+
+@app.get('/diagnosis/stream')
+def diagnosis_stream(sid: str) -> StreamingResponse:
+    """Stream the differential diagnosis as Server-Sent Events."""
+    sess = _session_or_404(sid)
+    events = _differential_events(sid, sess)
+    return StreamingResponse(
+        _sse(events, sid, sess, 'ai_diag'), media_type='text/event-stream'
+    )
+
+
 @app.post('/diagnosis')
 def diagnosis_post(
     sid: str, selected: List[str] = Form(...)
@@ -247,16 +558,33 @@ def diagnosis_post(
     """Handle diagnosis POST request."""
     sess = _session_or_404(sid)
     sess['selected_diagnoses'] = selected
+    _sessions().save(sid, sess)
     return RedirectResponse(f'/exams?sid={sid}', status_code=303)
 
 
 @app.get('/exams', response_class=HTMLResponse)
-def exams(request: Request, sid: str) -> HTMLResponse:
+async def exams(request: Request, sid: str) -> HTMLResponse:
     """Handle exams GET request."""
-    sess = _session_or_404(sid)
+    sess = await _asession_or_404(sid)
     lang = sess['meta'].get('lang', 'en')
-    ai = diag.exams(sess['selected_diagnoses'], language=lang, session_id=sid)
+    if _STREAMING:
+        return _render(
+            'exams.html',
+            request=request,
+            sid=sid,
+            session_id=sid,
+            summary='',
+            options=[],
+            lang=lang,
+            stream=True,
+        )
+    ai = await _prefetched_exams(sid, sess)
+    if ai is None:
+        ai = await diag.aexams(
+            sess['selected_diagnoses'], language=lang, session_id=sid
+        )
     sess['ai_exam'] = ai.model_dump()
+    await _sessions().asave(sid, sess)
     return _render(
         'exams.html',
         request=request,
@@ -267,14 +595,29 @@ def exams(request: Request, sid: str) -> HTMLResponse:
     )
 
 
+@app.get('/exams/stream')
+def exams_stream(sid: str) -> StreamingResponse:
+    """Stream the exam suggestions as Server-Sent Events."""
+    sess = _session_or_404(sid)
+    events = _exams_events(sid, sess)
+    return StreamingResponse(
+        _sse(events, sid, sess, 'ai_exam'), media_type='text/event-stream'
+    )
+
+
 @app.post('/exams')
-def exams_post(sid: str, selected: List[str] = Form(...)) -> RedirectResponse:
+def exams_post(
+    sid: str,
+    selected: List[str] = Form(...),
+    repo: RepositoryInterface = Depends(_repository),
+) -> RedirectResponse:
     """Handle exams POST request."""
     sess = _session_or_404(sid)
     sess['selected_exams'] = selected
     sess['meta']['timestamp'] = datetime.utcnow().isoformat(timespec='seconds')
-    repo = PatientRepository()
     repo.create(sess)
+    _sessions().save(sid, sess)
+    _PREFETCHER.discard(sid)
     return RedirectResponse(f'/done?sid={sid}', status_code=303)
 
 
@@ -291,9 +634,10 @@ def done(request: Request, sid: str) -> HTMLResponse:
 
 
 @app.get('/patient/{patient_id}', response_class=HTMLResponse)
-def patient(patient_id: str) -> HTMLResponse:
+def patient(
+    patient_id: str, repo: RepositoryInterface = Depends(_repository)
+) -> HTMLResponse:
     """View all patients."""
-    repo = PatientRepository()
     patient = repo.get(patient_id)
 
     context = {'title': 'Patient', 'patient': patient}
@@ -306,11 +650,14 @@ def patient(patient_id: str) -> HTMLResponse:
     response_class=RedirectResponse,
     status_code=303,
 )
-def delete_patient(request: Request, patient_id: str) -> RedirectResponse:
+def delete_patient(
+    request: Request,
+    patient_id: str,
+    repo: RepositoryInterface = Depends(_repository),
+) -> RedirectResponse:
     """Delete one patient by id."""
     # The page the request came from
     referer = request.headers.get('referer')
-    repo = PatientRepository()
     repo.delete(patient_id)
 
     return RedirectResponse(referer, status_code=303)
@@ -0,0 +1,178 @@
+"""
+Speculative LLM calls for the consultation wizard.
+
+``Prefetcher`` starts a coroutine on the server event loop before the
+physician asks for its result (e.g. the differential right after the
+previous-tests step) and hands the running or finished job to the handler
+that needs it. Every job carries a fingerprint of its inputs: a job whose
+inputs changed is cancelled and reissued, and a handler only ever receives
+a result computed from the inputs it would have sent itself.
+
+Jobs run on one loop, so a request served by another worker misses the
+prefetch (the shared response cache may still answer it). An optional
+budget caps how many speculative jobs may start per time window, bounding
+what is spent on guesses that are never used.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import threading
+import time
+
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Coroutine
+
+JobKey = tuple[str, str]  # (session id, job name)
+Factory = Callable[[], Coroutine[Any, Any, Any]]
+
+
+@dataclass
+class PrefetchStats:
+    """Counters of a ``Prefetcher``."""
+
+    issued: int = 0
+    hits: int = 0
+    misses: int = 0
+    cancelled: int = 0
+    over_budget: int = 0
+    errors: int = 0  # jobs that could not even be submitted
+
+    def as_dict(self) -> dict[str, int]:
+        """Return the counters as a plain dict."""
+        return asdict(self)
+
+
+def fingerprint(*parts: Any) -> str:
+    """Return a stable digest of the JSON-serialisable *parts*."""
+    material = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class Prefetcher:
+    """Run speculative coroutines in the background, keyed per session."""
+
+    def __init__(
+        self,
+        max_jobs: int = 1024,
+        budget: int | None = None,
+        window: float = 3600.0,
+    ) -> None:
+        self.max_jobs = max_jobs
+        self.budget = budget
+        self.window = window
+        self.stats = PrefetchStats()
+        self._started: deque[float] = deque()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._jobs: OrderedDict[
+            JobKey, tuple[str, concurrent.futures.Future[Any]]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop | None) -> None:
+        """Run future jobs on *loop* (None disables prefetching)."""
+        with self._lock:
+            self._loop = loop
+            if loop is None:
+                self._drop(list(self._jobs))
+
+    def submit(
+        self,
+        key: JobKey,
+        digest: str,
+        factory: Factory,
+        *,
+        only_if_pending: bool = False,
+    ) -> bool:
+        """
+        Start ``factory()`` for *key* unless a job with *digest* exists.
+
+        A job for *key* with another digest is cancelled first. With
+        *only_if_pending* nothing new is started when *key* had no job, so
+        edits earlier in the wizard only refresh speculation already made.
+        Returns true if a job was started; false also when the budget of
+        *budget* jobs per *window* seconds is exhausted.
+        """
+        with self._lock:
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                return False
+            current = self._jobs.get(key)
+            if current is not None:
+                if current[0] == digest and not _failed(current[1]):
+                    return False
+                self._drop([key])
+            elif only_if_pending:
+                return False
+            if not self._spend():
+                self.stats.over_budget += 1
+                return False
+            future = asyncio.run_coroutine_threadsafe(factory(), loop)
+            self._jobs[key] = (digest, future)
+            self.stats.issued += 1
+            while len(self._jobs) > self.max_jobs:
+                self._drop([next(iter(self._jobs))])
+            return True
+
+    def take(self, key: JobKey, digest: str) -> Awaitable[Any] | None:
+        """
+        Return an awaitable for the job of *key*, if it matches *digest*.
+
+        The job is removed either way; a stale job is cancelled. Must be
+        called from a coroutine running on the bound loop.
+        """
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            if job is None or job[0] != digest:
+                if job is not None:
+                    job[1].cancel()
+                    self.stats.cancelled += 1
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            return asyncio.wrap_future(job[1])
+
+    def discard(self, sid: str, prefix: str = '') -> None:
+        """Cancel the jobs of session *sid* whose name starts with *prefix*."""
+        with self._lock:
+            self._drop(
+                [
+                    key
+                    for key in self._jobs
+                    if key[0] == sid and key[1].startswith(prefix)
+                ]
+            )
+
+    def pending(self, sid: str) -> list[str]:
+        """Return the names of the jobs held for session *sid*."""
+        with self._lock:
+            return [name for s, name in self._jobs if s == sid]
+
+    def _spend(self) -> bool:
+        """Record one job start if the budget allows it."""
+        if self.budget is None:
+            return True
+        now = time.monotonic()
+        while self._started and self._started[0] <= now - self.window:
+            self._started.popleft()
+        if len(self._started) >= self.budget:
+            return False
+        self._started.append(now)
+        return True
+
+    def _drop(self, keys: list[JobKey]) -> None:
+        for key in keys:
+            _, future = self._jobs.pop(key)
+            if future.cancel():
+                self.stats.cancelled += 1
+
+
+def _failed(future: concurrent.futures.Future[Any]) -> bool:
+    """Return true if *future* finished with an error or was cancelled."""
+    return future.done() and (
+        future.cancelled() or future.exception() is not None
+    )
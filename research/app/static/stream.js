@@ -0,0 +1,52 @@
+// Render a streamed LLM reply (Server-Sent Events) into a wizard page.
+function streamOptions(url, prefix) {
+    const summary = document.getElementById("ai-summary");
+    const options = document.getElementById("ai-options");
+    const source = new EventSource(url);
+    const shown = new Set();
+
+    function addOption(value) {
+        if (shown.has(value)) {
+            return;
+        }
+        shown.add(value);
+        const id = `${prefix}${shown.size}`;
+        const wrapper = document.createElement("div");
+        const input = document.createElement("input");
+        const label = document.createElement("label");
+        wrapper.className = "form-check";
+        input.className = "form-check-input";
+        input.type = "checkbox";
+        input.name = "selected";
+        input.value = value;
+        input.id = id;
+        label.className = "form-check-label";
+        label.htmlFor = id;
+        label.textContent = value;
+        wrapper.append(input, label);
+        options.append(wrapper);
+    }
+
+    source.addEventListener("summary", (event) => {
+        summary.textContent += JSON.parse(event.data);
+    });
+    source.addEventListener("option", (event) => {
+        addOption(JSON.parse(event.data));
+    });
+    source.addEventListener("done", (event) => {
+        source.close();
+        // Options may be a list or a {name: probability} object.
+        const result = JSON.parse(event.data);
+        const names = Array.isArray(result.options)
+            ? result.options
+            : Object.keys(result.options || {});
+        names.forEach(addOption);
+    });
+    source.addEventListener("error", (event) => {
+        source.close();
+        if (event.data) {
+            summary.className = "alert alert-danger";
+            summary.textContent = JSON.parse(event.data);
+        }
+    });
+}
@@ -13,13 +13,16 @@ import typer
 
 from rich import print
 from sdx.agents.diagnostics import core as diag
+from sdx.agents.diagnostics import offline
+
+from research.models.repositories import get_patient_repository
 
 RECORDS_DIR = Path.home() / 'config' / '.sdx' / 'records'
-RECORDS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def save_record(payload: dict[str, Any]) -> Path:
     """Save the record as JSON."""
+    RECORDS_DIR.mkdir(parents=True, exist_ok=True)
     path = RECORDS_DIR / f'{payload["meta"]["timestamp"]}.json'
     path.write_text(json.dumps(payload, indent=2, ensure_ascii=False))
     return path
@@ -86,5 +89,87 @@ def consult() -> None:
     print(f'\n[green]Record saved to {path}[/green]')
 
 
+@app.command('batch-export')
+def batch_export(output: Path, language: str = '') -> None:
+    """Write a Batch API JSONL with one differential request per patient."""
+    repo = get_patient_repository()
+    requests = (
+        offline.differential_request(
+            record['patient'],
+            record['meta']['uuid'],
+            language or record['meta'].get('lang', 'en'),
+        )
+        for record in repo.all()
+    )
+    count = offline.write_batch_requests(requests, output)
+    print(f'[green]{count} requests written to {output}[/green]')
+
+
+@app.command('batch-ingest')
+def batch_ingest(results: Path) -> None:
+    """Store Batch API differential results on the matching records."""
+    repo = get_patient_repository()
+    diagnoses, errors = offline.ingest_batch_results(results)
+    updated = 0
+    for sid, dx in diagnoses.items():
+        record = repo.get(sid)
+        if record is None:
+            errors[sid] = 'unknown session id'
+            continue
+        record['ai_diag'] = dx.model_dump()
+        repo.update(sid, record)
+        updated += 1
+
+    print(f'[green]{updated} records updated[/green]')
+    for sid, message in errors.items():
+        print(f'[red]{sid}: {message}[/red]')
+
+
+@app.command('ingest-reports')
+def ingest_reports_command(
+    source: Path,
+    output: Path,
+    pattern: str = '**/*.pdf',
+    cpu_workers: int = 0,
+    io_concurrency: int = 8,
+) -> None:
+    """Convert a folder of PDF reports to FHIR JSON (resumable)."""
+    # loads anamnesisai and its ML stack, so only when the command runs
+    from sdx.agents.extraction.ingest import ingest_reports
+
+    stats = ingest_reports(
+        source,
+        output,
+        pattern=pattern,
+        cpu_workers=cpu_workers or None,
+        io_concurrency=io_concurrency,
+    )
+    print(
+        f'[green]{stats.succeeded} ingested[/green], '
+        f'{stats.skipped} already done, '
+        f'[red]{stats.failed} failed[/red] '
+        f'({stats.files_per_second:.1f} files/s)'
+    )
+    if stats.failed:
+        print(f'See {output / "failures.jsonl"}')
+
+
+@app.command('reprocess-archive')
+def reprocess_archive_command(
+    output: Path,
+    source: Path = Path('data') / 'llm_raw',
+    workers: int = 0,
+) -> None:
+    """Validate archived LLM replies into a Parquet/Arrow table."""
+    from sdx.agents.reprocess import reprocess_archive
+
+    stats = reprocess_archive(source, output, workers=workers)
+    print(
+        f'[green]{stats.valid} valid[/green], '
+        f'[red]{stats.invalid} invalid[/red] replies written to {output} '
+        f'in {stats.elapsed:.1f}s'
+    )
+
+
 if __name__ == '__main__':  # pragma: no cover
     app()
@@ -2,9 +2,16 @@
 
 from __future__ import annotations
 
+import base64
+import bisect
+import copy
 import json
+import os
+import sqlite3
+import threading
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, TypeVar
 from uuid import UUID
@@ -14,6 +21,83 @@ T = TypeVar('T')
 # TODO: swap for Pydantic in future update
 # once we have a better defined schema
 Patient = dict[str, Any]
+# (meta.timestamp, meta.uuid): the order used by ``query``
+SortKey = tuple[str, str]
+
+
+@dataclass
+class Page:
+    """One page of ``query`` results plus the cursor of the next page."""
+
+    items: list[Any]
+    next_cursor: str | None = None
+
+
+def _sort_key(patient: Patient) -> SortKey:
+    meta = patient.get('meta', {})
+    return str(meta.get('timestamp') or ''), str(meta.get('uuid', ''))
+
+
+def _tags(patient: Patient) -> set[tuple[str, str]]:
+    """Return the filterable ``(kind, value)`` pairs of a patient."""
+    tags = {('lang', str(patient.get('meta', {}).get('lang', 'en')))}
+    for kind, field in (
+        ('diagnosis', 'selected_diagnoses'),
+        ('exam', 'selected_exams'),
+    ):
+        tags.update((kind, str(v).lower()) for v in patient.get(field) or [])
+    return tags
+
+
+def _filters(
+    language: str | None, diagnosis: str | None, exam: str | None
+) -> set[tuple[str, str]]:
+    """Return the tags a patient must carry to match a query."""
+    wanted = set()
+    if language:
+        wanted.add(('lang', language))
+    if diagnosis:
+        wanted.add(('diagnosis', diagnosis.lower()))
+    if exam:
+        wanted.add(('exam', exam.lower()))
+    return wanted
+
+
+def encode_cursor(key: SortKey) -> str:
+    """Return an opaque cursor pointing just after *key*."""
+    raw = json.dumps(list(key)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    """Return the sort key encoded by ``encode_cursor``."""
+    try:
+        ts, uid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from exc
+    return str(ts), str(uid)
+
+
+def _page_from_keys(
+    keys: list[SortKey],
+    limit: int,
+    cursor: str | None,
+    descending: bool,
+) -> tuple[list[SortKey], str | None]:
+    """Slice one page out of ascending *keys*, starting after *cursor*."""
+    if descending:
+        end = len(keys)
+        if cursor:
+            end = bisect.bisect_left(keys, decode_cursor(cursor))
+        chunk = keys[max(0, end - limit - 1) : end][::-1]
+    else:
+        start = 0
+        if cursor:
+            start = bisect.bisect_right(keys, decode_cursor(cursor))
+        chunk = keys[start : start + limit + 1]
+    more = len(chunk) > limit
+    chunk = chunk[:limit]
+    return chunk, encode_cursor(chunk[-1]) if more else None
 
 
 class RepositoryInterface(ABC):
@@ -44,9 +128,48 @@ class RepositoryInterface(ABC):
         """Delete a record."""
         pass
 
+    def query(
+        self,
+        *,
+        limit: int = 20,
+        cursor: str | None = None,
+        descending: bool = True,
+        language: str | None = None,
+        diagnosis: str | None = None,
+        exam: str | None = None,
+    ) -> Page:
+        """
+        Return one page of records sorted by ``meta.timestamp``.
+
+        Records can be filtered by language, selected diagnosis or selected
+        exam (case-insensitive exact match). Pass ``next_cursor`` of the
+        previous page as *cursor* to continue. This fallback scans ``all``;
+        backends override it with indexed lookups.
+        """
+        wanted = _filters(language, diagnosis, exam)
+        records: list[Patient] = self.all()
+        matches = {
+            _sort_key(record): record
+            for record in records
+            if wanted <= _tags(record)
+        }
+        keys, next_cursor = _page_from_keys(
+            sorted(matches), limit, cursor, descending
+        )
+        return Page([matches[key] for key in keys], next_cursor)
+
 
 class PatientRepository(RepositoryInterface):
-    """Implement the repository interface for Patient."""
+    """
+    Implement the repository interface for Patient.
+
+    Patients live in ``patients.json``. In-memory indexes (``uuid ->
+    position``, the ``(timestamp, uuid)`` order and language / diagnosis /
+    exam postings for ``query``) are kept coherent with every write. Before
+    each operation the file's mtime/size is compared with the last known
+    state, so one long-lived instance (e.g. shared by the web app) picks
+    up changes written by other processes.
+    """
 
     DATA_PATH = (
         Path(__file__).parent.parent / 'app/data/patients/patients.json'
@@ -57,56 +180,346 @@ class PatientRepository(RepositoryInterface):
     def __init__(self) -> None:
         """Load patients from file."""
         self.DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._stamp: tuple[int, int] | None = None
+        self._index: dict[str, int] = {}
+        self._order: list[SortKey] = []
+        self._postings: dict[tuple[str, str], set[str]] = {}
 
         if self.DATA_PATH.exists():
             # loads existing database
-            with self.DATA_PATH.open('r') as f:
-                # TODO: swap for parquet in future updates
-                self.patients = json.load(f)
+            self._load()
         else:
             # initializes empty database
-            with self.DATA_PATH.open('w') as f:
-                self.patients = []
-                json.dump(self.patients, f)
+            self.patients = []
+            self._save()
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = self.DATA_PATH.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> None:
+        with self.DATA_PATH.open('r') as f:
+            # TODO: swap for parquet in future updates
+            self.patients = json.load(f)
+        self._stamp = self._file_stamp()
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._index = {}
+        self._order = []
+        self._postings = {}
+        for position, patient in enumerate(self.patients):
+            uid = str(patient['meta']['uuid'])
+            if uid not in self._index:
+                self._index[uid] = position
+                self._add_to_indexes(patient)
+        self._order.sort()
+
+    def _add_to_indexes(self, patient: Patient) -> None:
+        uid = str(patient['meta']['uuid'])
+        bisect.insort(self._order, _sort_key(patient))
+        for tag in _tags(patient):
+            self._postings.setdefault(tag, set()).add(uid)
+
+    def _refresh(self) -> None:
+        """Reload the file if another process changed it."""
+        stamp = self._file_stamp()
+        if stamp is not None and stamp != self._stamp:
+            self._load()
+
+    def _save(self) -> None:
+        """Atomically rewrite the file so readers never see partial data."""
+        tmp_path = self.DATA_PATH.with_suffix(f'.{os.getpid()}.tmp')
+        with tmp_path.open('w') as f:
+            json.dump(self.patients, f)
+        os.replace(tmp_path, self.DATA_PATH)
+        self._stamp = self._file_stamp()
 
     def all(self) -> list[Patient]:
         """Return all patients."""
-        return self.patients
+        with self._lock:
+            self._refresh()
+            return self.patients
 
-    def get(self, id: UUID) -> Patient | None:
+    def get(self, id: UUID | str) -> Patient | None:
         """Return a single patient if exists."""
-        for patient in self.patients:
-            if patient['meta']['uuid'] == id:
-                return patient
-        return None
+        with self._lock:
+            self._refresh()
+            position = self._index.get(str(id))
+            return None if position is None else self.patients[position]
 
     def create(self, data: Patient) -> Patient:
         """Create a new patient."""
-        self.patients.append(data)
-        with open(self.DATA_PATH, 'w') as f:
-            json.dump(self.patients, f)
+        # store a copy: callers (e.g. the web app session) keep editing theirs
+        data = copy.deepcopy(data)
+        with self._lock:
+            self._refresh()
+            self.patients.append(data)
+            uid = str(data['meta']['uuid'])
+            if uid not in self._index:
+                self._index[uid] = len(self.patients) - 1
+                self._add_to_indexes(data)
+            self._save()
         return data
 
-    def update(self, id: UUID, data: Patient) -> bool:
+    def update(self, id: UUID | str, data: Patient) -> bool:
         """Update a patient. Returns true if successful."""
-        for index, patient in enumerate(self.patients):
-            if patient['meta']['uuid'] == id:
-                self.patients[index] = data
-                with open(self.DATA_PATH, 'w') as f:
-                    json.dump(self.patients, f)
-                return True
+        with self._lock:
+            self._refresh()
+            position = self._index.get(str(id))
+            if position is None:
+                # return false if patient does not exist
+                return False
+            self.patients[position] = copy.deepcopy(data)
+            self._reindex()
+            self._save()
+            return True
+
+    def delete(self, id: UUID | str) -> bool:
+        """Delete a patient. Returns true if successful."""
+        with self._lock:
+            self._refresh()
+            position = self._index.get(str(id))
+            if position is None:
+                # return false if patient does not exist
+                return False
+            del self.patients[position]
+            self._reindex()
+            self._save()
+            return True
 
-        # return false if patient does not exist
-        return False
+    def query(
+        self,
+        *,
+        limit: int = 20,
+        cursor: str | None = None,
+        descending: bool = True,
+        language: str | None = None,
+        diagnosis: str | None = None,
+        exam: str | None = None,
+    ) -> Page:
+        """Return one page of patients (see ``RepositoryInterface.query``)."""
+        with self._lock:
+            self._refresh()
+            keys = self._order
+            wanted = _filters(language, diagnosis, exam)
+            if wanted:
+                uids = set.intersection(
+                    *(self._postings.get(tag, set()) for tag in wanted)
+                )
+                keys = sorted(
+                    _sort_key(self.patients[self._index[uid]]) for uid in uids
+                )
+            page_keys, next_cursor = _page_from_keys(
+                keys, limit, cursor, descending
+            )
+            items = [self.patients[self._index[uid]] for _, uid in page_keys]
+            return Page(items, next_cursor)
 
-    def delete(self, id: UUID) -> bool:
+
+# must match the ``patients_by_time`` index expression for SQLite to use it
+_SQL_TIMESTAMP = "COALESCE(json_extract(data, '$.meta.timestamp'), '')"
+
+
+class SQLitePatientRepository(RepositoryInterface):
+    """
+    SQLite-backed patient repository.
+
+    Records are stored as JSON documents keyed by ``meta.uuid`` (primary
+    index), so ``get``/``update``/``delete`` are indexed point operations
+    and each write touches a single row instead of rewriting the whole
+    database. ``all`` keeps insertion order, like ``PatientRepository``.
+    ``query`` seeks through an expression index on ``(meta.timestamp,
+    uuid)`` and filters through the ``patient_tags`` table.
+    """
+
+    DATA_PATH = (
+        Path(__file__).parent.parent / 'app/data/patients/patients.sqlite3'
+    )
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        json_path: Path | str | None = None,
+    ) -> None:
+        """Open (or create) the database, importing *json_path* if empty."""
+        self.path = Path(path or self.DATA_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS patients ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' uuid TEXT NOT NULL UNIQUE,'
+            ' data TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS patients_by_time'
+            f' ON patients ({_SQL_TIMESTAMP}, uuid)'
+        )
+        has_tags = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'patient_tags'"
+        ).fetchone()
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS patient_tags ('
+            ' uuid TEXT NOT NULL,'
+            ' kind TEXT NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' PRIMARY KEY (kind, value, uuid)) WITHOUT ROWID'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS patient_tags_by_uuid'
+            ' ON patient_tags (uuid)'
+        )
+        if not has_tags:
+            self._backfill_tags()
+
+        json_path = Path(json_path or PatientRepository.DATA_PATH)
+        if json_path.exists() and not self._count():
+            self.migrate_from_json(json_path)
+
+    def _count(self) -> int:
+        row = self._conn.execute('SELECT COUNT(*) FROM patients').fetchone()
+        return int(row[0])
+
+    def _write_tags(self, uid: str, patient: Patient) -> None:
+        self._conn.execute('DELETE FROM patient_tags WHERE uuid = ?', (uid,))
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO patient_tags (uuid, kind, value)'
+            ' VALUES (?, ?, ?)',
+            ((uid, kind, value) for kind, value in _tags(patient)),
+        )
+
+    def _backfill_tags(self) -> None:
+        """Index the tags of rows written before ``patient_tags`` existed."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            for uid, data in self._conn.execute(
+                'SELECT uuid, data FROM patients'
+            ).fetchall():
+                self._write_tags(uid, json.loads(data))
+            self._conn.execute('COMMIT')
+
+    def migrate_from_json(self, json_path: Path | str) -> int:
+        """Import every patient of a ``patients.json`` file."""
+        with Path(json_path).open('r') as f:
+            patients: list[Patient] = json.load(f)
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO patients (uuid, data) VALUES (?, ?)',
+                ((str(p['meta']['uuid']), json.dumps(p)) for p in patients),
+            )
+            for p in patients:
+                self._write_tags(str(p['meta']['uuid']), p)
+            self._conn.execute('COMMIT')
+        return len(patients)
+
+    def all(self) -> list[Patient]:
+        """Return all patients."""
+        rows = self._conn.execute(
+            'SELECT data FROM patients ORDER BY seq'
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get(self, id: UUID | str) -> Patient | None:
+        """Return a single patient if exists."""
+        row = self._conn.execute(
+            'SELECT data FROM patients WHERE uuid = ?', (str(id),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create(self, data: Patient) -> Patient:
+        """Create a new patient (replacing one with the same uuid)."""
+        uid = str(data['meta']['uuid'])
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.execute(
+                'INSERT INTO patients (uuid, data) VALUES (?, ?) '
+                'ON CONFLICT (uuid) DO UPDATE SET data = excluded.data',
+                (uid, json.dumps(data)),
+            )
+            self._write_tags(uid, data)
+            self._conn.execute('COMMIT')
+        return data
+
+    def update(self, id: UUID | str, data: Patient) -> bool:
+        """Update a patient. Returns true if successful."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            cur = self._conn.execute(
+                'UPDATE patients SET data = ? WHERE uuid = ?',
+                (json.dumps(data), str(id)),
+            )
+            if cur.rowcount:
+                self._write_tags(str(id), data)
+            self._conn.execute('COMMIT')
+        return cur.rowcount > 0
+
+    def delete(self, id: UUID | str) -> bool:
         """Delete a patient. Returns true if successful."""
-        for index, patient in enumerate(self.patients):
-            if patient['meta']['uuid'] == id:
-                del self.patients[index]
-                with open(self.DATA_PATH, 'w') as f:
-                    json.dump(self.patients, f)
-                return True
-
-        # return false if patient does not exist
-        return False
+        with self._lock:
+            self._conn.execute('BEGIN')
+            cur = self._conn.execute(
+                'DELETE FROM patients WHERE uuid = ?', (str(id),)
+            )
+            self._conn.execute(
+                'DELETE FROM patient_tags WHERE uuid = ?', (str(id),)
+            )
+            self._conn.execute('COMMIT')
+        return cur.rowcount > 0
+
+    def query(
+        self,
+        *,
+        limit: int = 20,
+        cursor: str | None = None,
+        descending: bool = True,
+        language: str | None = None,
+        diagnosis: str | None = None,
+        exam: str | None = None,
+    ) -> Page:
+        """Return one page of patients (see ``RepositoryInterface.query``)."""
+        ts = _SQL_TIMESTAMP
+        where: list[str] = []
+        params: list[Any] = []
+        for kind, value in sorted(_filters(language, diagnosis, exam)):
+            where.append(
+                'uuid IN (SELECT uuid FROM patient_tags'
+                ' WHERE kind = ? AND value = ?)'
+            )
+            params += [kind, value]
+        if cursor:
+            where.append(f'({ts}, uuid) {"<" if descending else ">"} (?, ?)')
+            params += list(decode_cursor(cursor))
+        order = 'DESC' if descending else 'ASC'
+        sql = (
+            f'SELECT {ts}, uuid, data FROM patients'
+            f'{" WHERE " + " AND ".join(where) if where else ""}'
+            f' ORDER BY {ts} {order}, uuid {order} LIMIT ?'
+        )
+        rows = self._conn.execute(sql, [*params, limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor((rows[-1][0], rows[-1][1]))
+        return Page([json.loads(data) for _, _, data in rows], next_cursor)
+
+
+def get_patient_repository() -> RepositoryInterface:
+    """
+    Return the patient repository selected by ``SDX_PATIENT_STORE``.
+
+    ``json`` (default) keeps the ``patients.json`` file; ``sqlite`` uses
+    ``SQLitePatientRepository``, importing the JSON file on first start.
+    """
+    if os.getenv('SDX_PATIENT_STORE', 'json').lower() == 'sqlite':
+        return SQLitePatientRepository()
+    return PatientRepository()
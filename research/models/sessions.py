@@ -0,0 +1,334 @@
+"""
+Session stores for the consultation wizard.
+
+A session is the JSON-serialisable dict the portal builds step by step
+(``patient``, ``meta``, AI replies, selections). Two backends are provided:
+
+* ``MemorySessionStore`` - in-process LRU with sliding TTL (default).
+* ``SQLiteSessionStore`` - on-disk store shared by every uvicorn worker
+  on the host.
+
+The backend is chosen with ``SDX_SESSION_STORE`` (``memory`` or
+``sqlite``); ``SDX_SESSION_TTL``, ``SDX_SESSION_SIZE`` and
+``SDX_SESSION_PATH`` tune it. Callers must ``save`` a session after
+mutating it, since the SQLite backend hands out copies. Async code uses
+``aget`` / ``asave``, which keep blocking SQLite I/O off the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+Session = dict[str, Any]
+
+
+@dataclass
+class SessionStats:
+    """Counters of a session store (per process)."""
+
+    live: int = 0
+    created: int = 0
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        """Return the counters as a plain dict."""
+        return asdict(self)
+
+
+class SessionStore(ABC):
+    """Interface shared by every session backend."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 4 * 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._stats = SessionStats()
+        self._lock = threading.Lock()
+
+    def get(self, sid: str) -> Session | None:
+        """Return the session *sid* (renewing its TTL) or None."""
+        with self._lock:
+            session = self._get(sid, time.time())
+            if session is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+            return session
+
+    def save(self, sid: str, session: Session) -> None:
+        """Store *session*, evicting the least recently used if full."""
+        with self._lock:
+            created, evicted = self._save(sid, session, time.time())
+            self._stats.created += int(created)
+            self._stats.evicted += evicted
+
+    async def aget(self, sid: str) -> Session | None:
+        """Async ``get``, run in a worker thread."""
+        return await asyncio.to_thread(self.get, sid)
+
+    async def asave(self, sid: str, session: Session) -> None:
+        """Async ``save``, run in a worker thread."""
+        await asyncio.to_thread(self.save, sid, session)
+
+    def delete(self, sid: str) -> bool:
+        """Drop the session *sid*. Returns true if it existed."""
+        with self._lock:
+            return self._delete(sid)
+
+    def purge(self) -> int:
+        """Remove every expired session and return how many were dropped."""
+        with self._lock:
+            expired = self._purge(time.time())
+            self._stats.expired += expired
+            return expired
+
+    @property
+    def stats(self) -> SessionStats:
+        """Return a snapshot of the counters, with the live count."""
+        with self._lock:
+            return SessionStats(**{**asdict(self._stats), 'live': len(self)})
+
+    def __contains__(self, sid: object) -> bool:
+        """Return true if *sid* is a live session (does not renew TTL)."""
+        return isinstance(sid, str) and self._peek(sid, time.time())
+
+    @abstractmethod
+    def _get(self, sid: str, now: float) -> Session | None:
+        """Backend lookup; must drop the session if it expired."""
+
+    @abstractmethod
+    def _peek(self, sid: str, now: float) -> bool:
+        """Return true if *sid* exists and has not expired."""
+
+    @abstractmethod
+    def _save(
+        self, sid: str, session: Session, now: float
+    ) -> tuple[bool, int]:
+        """Backend upsert; return ``(is new, number of evicted sessions)``."""
+
+    @abstractmethod
+    def _delete(self, sid: str) -> bool:
+        """Backend delete."""
+
+    @abstractmethod
+    def _purge(self, now: float) -> int:
+        """Drop expired sessions; return how many were dropped."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the number of stored sessions."""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU store with sliding TTL.
+
+    ``get`` returns the stored dict itself, so ``save`` after a mutation is
+    only a recency / TTL bump.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 4 * 3600.0):
+        super().__init__(maxsize, ttl)
+        self._data: OrderedDict[str, tuple[float, Session]] = OrderedDict()
+
+    async def aget(self, sid: str) -> Session | None:
+        """Async ``get``; memory lookups never block, so no thread hop."""
+        return self.get(sid)
+
+    async def asave(self, sid: str, session: Session) -> None:
+        """Async ``save``; memory writes never block, so no thread hop."""
+        self.save(sid, session)
+
+    def _get(self, sid: str, now: float) -> Session | None:
+        entry = self._data.get(sid)
+        if entry is None:
+            return None
+        expires, session = entry
+        if expires <= now:
+            del self._data[sid]
+            self._stats.expired += 1
+            return None
+        self._data[sid] = (now + self.ttl, session)
+        self._data.move_to_end(sid)
+        return session
+
+    def _peek(self, sid: str, now: float) -> bool:
+        entry = self._data.get(sid)
+        return entry is not None and entry[0] > now
+
+    def _save(
+        self, sid: str, session: Session, now: float
+    ) -> tuple[bool, int]:
+        created = sid not in self._data
+        self._data[sid] = (now + self.ttl, session)
+        self._data.move_to_end(sid)
+        evicted = 0
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            evicted += 1
+        return created, evicted
+
+    def _delete(self, sid: str) -> bool:
+        return self._data.pop(sid, None) is not None
+
+    def _purge(self, now: float) -> int:
+        # entries are ordered by last use, so the expired ones come first
+        expired = 0
+        while self._data:
+            sid, (expires, _) = next(iter(self._data.items()))
+            if expires > now:
+                break
+            del self._data[sid]
+            expired += 1
+        return expired
+
+    def __len__(self) -> int:
+        """Return the number of stored sessions."""
+        return len(self._data)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    On-disk store shared by every process opening the same file.
+
+    Sessions are stored as JSON rows; ``get`` returns a fresh copy, so a
+    step handled by one worker is visible to the next request wherever it
+    lands. Expired rows are purged opportunistically on ``save``.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        maxsize: int = 10_000,
+        ttl: float = 4 * 3600.0,
+    ):
+        super().__init__(maxsize, ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30.0,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            ' sid TEXT PRIMARY KEY,'
+            ' data TEXT NOT NULL,'
+            ' expires REAL NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS sessions_accessed '
+            'ON sessions (accessed)'
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Run the block in one write transaction, rolled back on error."""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _get(self, sid: str, now: float) -> Session | None:
+        # SELECT + UPDATE rather than UPDATE ... RETURNING (SQLite 3.35+)
+        with self._transaction():
+            row = self._conn.execute(
+                'SELECT data, expires FROM sessions WHERE sid = ?', (sid,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute(
+                    'DELETE FROM sessions WHERE sid = ?', (sid,)
+                )
+                self._stats.expired += 1
+                return None
+            self._conn.execute(
+                'UPDATE sessions SET expires = ?, accessed = ? WHERE sid = ?',
+                (now + self.ttl, now, sid),
+            )
+        session: Session = json.loads(row[0])
+        return session
+
+    def _peek(self, sid: str, now: float) -> bool:
+        row = self._conn.execute(
+            'SELECT 1 FROM sessions WHERE sid = ? AND expires > ?', (sid, now)
+        ).fetchone()
+        return row is not None
+
+    def _save(
+        self, sid: str, session: Session, now: float
+    ) -> tuple[bool, int]:
+        with self._transaction():
+            self._stats.expired += self._purge(now)
+            cur = self._conn.execute(
+                'INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?)',
+                (sid, json.dumps(session), now + self.ttl, now),
+            )
+            created = cur.rowcount > 0
+            if not created:
+                self._conn.execute(
+                    'UPDATE sessions SET data = ?, expires = ?, accessed = ?'
+                    ' WHERE sid = ?',
+                    (json.dumps(session), now + self.ttl, now, sid),
+                )
+            evicted = max(0, len(self) - self.maxsize)
+            if evicted:
+                self._conn.execute(
+                    'DELETE FROM sessions WHERE sid IN ('
+                    ' SELECT sid FROM sessions ORDER BY accessed LIMIT ?)',
+                    (evicted,),
+                )
+        return created, evicted
+
+    def _delete(self, sid: str) -> bool:
+        cur = self._conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        return cur.rowcount > 0
+
+    def _purge(self, now: float) -> int:
+        cur = self._conn.execute(
+            'DELETE FROM sessions WHERE expires <= ?', (now,)
+        )
+        return cur.rowcount
+
+    def __len__(self) -> int:
+        """Return the number of stored sessions."""
+        row = self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()
+        return int(row[0])
+
+
+def get_session_store() -> SessionStore:
+    """Return the session store described by the ``SDX_SESSION_*`` vars."""
+    backend = os.getenv('SDX_SESSION_STORE', 'memory').lower()
+    ttl = float(os.getenv('SDX_SESSION_TTL', str(4 * 3600)))
+    size = int(os.getenv('SDX_SESSION_SIZE', '10000'))
+    if backend == 'sqlite':
+        path = os.getenv(
+            'SDX_SESSION_PATH',
+            str(Path(__file__).parent.parent / 'app/data/sessions.sqlite3'),
+        )
+        return SQLiteSessionStore(path, maxsize=size, ttl=ttl)
+    return MemorySessionStore(maxsize=size, ttl=ttl)
@@ -0,0 +1,91 @@
+"""
+Benchmark parsing of archived LLM replies into ``LLMDiagnosis``.
+
+Compares the previous strip/lstrip/rstrip chain, ``LLMDiagnosis.from_llm``
+on str and on bytes, and the bulk ``LLMDiagnosis.from_llm_many`` mode.
+
+Usage: python scripts/bench_llm_parsing.py [--replies N] [--repeat R]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import time
+
+from typing import Callable
+
+from sdx.schema.clinical_outputs import LLMDiagnosis
+
+
+def legacy_from_llm(text: str) -> LLMDiagnosis:
+    """Parse *text* the way ``from_llm`` did before the fast path."""
+    cleaned = (
+        text.strip().lstrip('```json').lstrip('```').rstrip('```').strip()
+    )
+    return LLMDiagnosis.model_validate_json(cleaned)
+
+
+def make_replies(count: int) -> list[str]:
+    """Return *count* fenced replies shaped like the archived ones."""
+    replies = []
+    for n in range(count):
+        body = json.dumps(
+            {
+                'summary': f'Patient {n} presents with fever and cough.',
+                'options': {f'Diagnosis {k}': k / 10 for k in range(5)},
+            }
+        )
+        replies.append(f'```json\n{body}\n```' if n % 2 else body)
+    return replies
+
+
+def timed(label: str, run: Callable[[], object], repeat: int) -> float:
+    """Print and return the best wall time of *repeat* runs of *run*."""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.disable()  # as timeit does, to keep collections out of timings
+        try:
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        finally:
+            gc.enable()
+    print(f'{label:<28} {best * 1000:9.2f} ms')
+    return best
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--replies', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = make_replies(args.replies)
+    blobs = [text.encode('utf-8') for text in texts]
+    assert [legacy_from_llm(t) for t in texts[:100]] == (
+        LLMDiagnosis.from_llm_many(blobs[:100])
+    )
+
+    print(f'{args.replies} replies, best of {args.repeat}')
+    base = timed(
+        'legacy (str)',
+        lambda: [legacy_from_llm(t) for t in texts],
+        args.repeat,
+    )
+    for label, run in (
+        ('from_llm (str)', lambda: [LLMDiagnosis.from_llm(t) for t in texts]),
+        (
+            'from_llm (bytes)',
+            lambda: [LLMDiagnosis.from_llm(b) for b in blobs],
+        ),
+        ('from_llm_many (bytes)', lambda: LLMDiagnosis.from_llm_many(blobs)),
+    ):
+        spent = timed(label, run, args.repeat)
+        print(f'{"":<28} {base / spent:9.2f}x vs legacy')
+
+
+if __name__ == '__main__':
+    main()
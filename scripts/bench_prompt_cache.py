@@ -0,0 +1,77 @@
+"""
+Measure provider-side prompt caching of the differential prompts.
+
+Sends the same series of patients with the plain prompts and with the
+cache-friendly prefix (``cache_prefix=True``), with the response cache
+disabled, and prints the share of prompt tokens OpenAI served from its
+prompt cache together with the latency quantiles of each mode.
+
+Needs ``OPENAI_API_KEY`` and bills real calls.
+
+Usage: python scripts/bench_prompt_cache.py [--calls N] [--language pt]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from sdx.agents import cache, client, metrics
+from sdx.agents.diagnostics.core import differential_prompt
+
+SYMPTOMS = (
+    'fever and productive cough for 5 days',
+    'chest pain on exertion for 2 weeks',
+    'headache, neck stiffness and photophobia since yesterday',
+    'abdominal pain in the right lower quadrant and nausea',
+    'fatigue, weight loss and night sweats for 2 months',
+    'sudden shortness of breath after a long flight',
+)
+
+
+def make_patients(count: int) -> list[dict[str, object]]:
+    """Return *count* small, distinct patient records."""
+    return [
+        {
+            'age': 20 + (n * 7) % 60,
+            'sex': 'FM'[n % 2],
+            'symptoms': SYMPTOMS[n % len(SYMPTOMS)],
+        }
+        for n in range(count)
+    ]
+
+
+def run(patients: list[dict[str, object]], language: str, prefix: bool):
+    """Send every patient and return the metrics snapshot of the run."""
+    registry = metrics.MetricsRegistry()
+    metrics.registry = registry
+    for patient in patients:
+        system, user = differential_prompt(patient, language, prefix)
+        client.chat(system, user, language=language, endpoint='differential')
+    (stats,) = registry.snapshot()
+    return stats
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--language', default='en')
+    args = parser.parse_args()
+
+    cache.set_cache(None)
+    patients = make_patients(args.calls)
+    print(f'{args.calls} differential calls ({args.language})')
+    for label, prefix in (('plain prompt', False), ('cached prefix', True)):
+        stats = run(patients, args.language, prefix)
+        ratio = stats['cached_ratio'] or 0.0
+        ttfb, wall = stats['ttfb'], stats['wall_time']
+        print(
+            f'{label:<14} prompt tokens {stats["prompt_tokens"]:>7}  '
+            f'cached {ratio:6.1%}  '
+            f'ttfb p50 {ttfb["p50"]:.2f}s p95 {ttfb["p95"]:.2f}s  '
+            f'wall p50 {wall["p50"]:.2f}s'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+Append-only, compressed archive for raw LLM replies.
+
+``SegmentArchive`` moves disk I/O off the request path: ``submit`` only
+enqueues the reply, and a background thread appends batches to rotating
+``segment-<UTC>-<pid>-<n>.jsonl.gz`` files. Each flush is written as one
+gzip member, so segments stay valid gzip streams while growing. Every
+record gets a line in ``index.jsonl``::
+
+    {"sid": ..., "ts": ..., "segment": ..., "offset": ..., "line": ...}
+
+where ``offset`` is the byte offset of the gzip member holding the record
+and ``line`` its position inside that member (see ``read_record``).
+Segments are per process, and index appends hold an exclusive ``flock``
+so lines of several workers never interleave.
+
+Archiving is best effort: a full queue drops new replies and a failed
+write loses its batch, both counted in ``SegmentArchive.stats``, but
+neither stops the writer or blocks the caller.
+"""
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+INDEX_NAME = 'index.jsonl'
+
+
+def _utc_stamp() -> str:
+    """Return the compact UTC timestamp used in archive names."""
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+@dataclass
+class ArchiveStats:
+    """Counters of a ``SegmentArchive``, in records."""
+
+    written: int = 0
+    failed: int = 0  # lost to a failed segment or index write
+    dropped: int = 0  # submitted while the queue was full
+
+    def as_dict(self) -> dict[str, int]:
+        """Return the counters as a plain dict."""
+        return asdict(self)
+
+
+class SegmentArchive:
+    """Background writer batching raw replies into gzip segments."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        *,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        flush_records: int = 256,
+        max_queue: int = 10_000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.pid = os.getpid()
+
+        self._queue: queue.Queue[Optional[Dict[str, str]]] = queue.Queue(
+            max_queue
+        )
+        self._flushed = threading.Condition()
+        self._submitted = 0
+        self._done = 0  # records written or lost, guarded by _flushed
+        self.stats = ArchiveStats()
+        self._segment: Optional[Path] = None
+        self._segment_no = 0
+        self._thread = threading.Thread(
+            target=self._run, name='sdx-llm-archive', daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, text: str, sid: Optional[str] = None) -> None:
+        """Queue *text* for archival without touching the disk."""
+        record = {
+            'sid': sid or uuid.uuid4().hex[:8],
+            'ts': _utc_stamp(),
+            'raw': text,
+        }
+        with self._flushed:
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.stats.dropped += 1
+            else:
+                self._submitted += 1
+
+    def flush(self, timeout: Optional[float] = 30.0) -> bool:
+        """Wait until everything submitted so far is written (or lost)."""
+        with self._flushed:
+            target = self._submitted
+        try:
+            self._queue.put_nowait({})  # wake the writer to flush now
+        except queue.Full:
+            pass  # the writer is busy draining anyway
+        with self._flushed:
+            return self._flushed.wait_for(
+                lambda: self._done >= target, timeout
+            )
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Flush pending records and stop the writer thread."""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        pending: List[Dict[str, str]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = {}
+            if record is None:
+                self._write(pending)
+                return
+            if record:
+                pending.append(record)
+            due = time.monotonic() >= deadline
+            if pending and (
+                not record or due or len(pending) >= self.flush_records
+            ):
+                self._write(pending)
+                pending = []
+            if due or not pending:
+                deadline = time.monotonic() + self.flush_interval
+
+    def _current_segment(self) -> Path:
+        """Return the segment to append to, rotating when it is full."""
+        if (
+            self._segment is None
+            or self._segment.stat().st_size >= self.max_segment_bytes
+        ):
+            self._segment_no += 1
+            name = f'segment-{_utc_stamp()}-{self.pid}-{self._segment_no}'
+            self._segment = self.directory / f'{name}.jsonl.gz'
+            self._segment.touch()
+        return self._segment
+
+    def _write(self, records: List[Dict[str, str]]) -> None:
+        try:
+            self._append(records)
+            failed = 0
+        except Exception:  # disk full, directory removed, ...
+            failed = len(records)
+            self._segment = None  # start afresh on the next batch
+        with self._flushed:
+            self.stats.written += len(records) - failed
+            self.stats.failed += failed
+            self._done += len(records)
+            self._flushed.notify_all()
+
+    def _append(self, records: List[Dict[str, str]]) -> None:
+        """Append *records* to the current segment and the index."""
+        if records:
+            segment = self._current_segment()
+            body = ''.join(
+                json.dumps(r, ensure_ascii=False) + '\n' for r in records
+            )
+            with segment.open('ab') as fh:
+                offset = fh.tell()
+                fh.write(gzip.compress(body.encode('utf-8')))
+            index = ''.join(
+                json.dumps(
+                    {
+                        'sid': r['sid'],
+                        'ts': r['ts'],
+                        'segment': segment.name,
+                        'offset': offset,
+                        'line': line,
+                    }
+                )
+                + '\n'
+                for line, r in enumerate(records)
+            )
+            with (self.directory / INDEX_NAME).open('a') as fh:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_EX)  # released on close
+                fh.write(index)
+
+
+def iter_index(directory: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Yield every index entry of the archive in *directory*."""
+    path = Path(directory) / INDEX_NAME
+    if not path.exists():
+        return
+    with path.open(encoding='utf-8') as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_segment(path: Union[str, Path]) -> Iterator[Dict[str, str]]:
+    """Yield every ``{"sid", "ts", "raw"}`` record stored in a segment."""
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_record(
+    directory: Union[str, Path], entry: Dict[str, Any]
+) -> Dict[str, str]:
+    """Return the record an index *entry* points to, reading one member."""
+    with (Path(directory) / entry['segment']).open('rb') as fh:
+        fh.seek(entry['offset'])
+        decoder = zlib.decompressobj(wbits=31)
+        data = b''
+        while not decoder.eof:
+            chunk = fh.read(64 * 1024)
+            if not chunk:
+                break
+            data += decoder.decompress(chunk)
+    lines = data.decode('utf-8').split('\n')
+    record: Dict[str, str] = json.loads(lines[entry['line']])
+    return record
+
+
+_archive: Optional[SegmentArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive(directory: Union[str, Path]) -> SegmentArchive:
+    """Return the process-wide archive for *directory* (fork-safe)."""
+    global _archive
+    with _archive_lock:
+        if (
+            _archive is None
+            or _archive.pid != os.getpid()
+            or _archive.directory != Path(directory)
+        ):
+            if _archive is not None and _archive.pid == os.getpid():
+                _archive.close()
+            _archive = SegmentArchive(
+                directory,
+                max_segment_bytes=int(
+                    os.getenv('SDX_LLM_ARCHIVE_SEGMENT_BYTES', '67108864')
+                ),
+                flush_interval=float(
+                    os.getenv('SDX_LLM_ARCHIVE_FLUSH_SECONDS', '1.0')
+                ),
+            )
+        return _archive
+
+
+@atexit.register
+def _close_archive() -> None:
+    """Flush the process-wide archive on interpreter exit."""
+    if _archive is not None and _archive.pid == os.getpid():
+        _archive.close()
+
+
+__all__ = [
+    'INDEX_NAME',
+    'ArchiveStats',
+    'SegmentArchive',
+    'get_archive',
+    'iter_index',
+    'iter_segment',
+    'read_record',
+]
@@ -0,0 +1,267 @@
+"""
+Content-addressed cache for validated LLM replies.
+
+Keys are SHA-256 digests of ``(model, system prompt, canonical user JSON,
+language)`` so identical consultations map to the same entry regardless of
+dict ordering. Two backends are provided:
+
+* ``MemoryCache`` - in-process LRU with TTL (default).
+* ``SQLiteCache`` - on-disk store shared by every process on the host.
+
+The active backend is chosen with ``SDX_LLM_CACHE`` (``memory``, ``sqlite``
+or ``none``); ``SDX_LLM_CACHE_TTL``, ``SDX_LLM_CACHE_SIZE`` and
+``SDX_LLM_CACHE_PATH`` tune it. ``set_cache`` swaps it at runtime.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+@dataclass
+class CacheStats:
+    """Hit / miss / eviction counters of a cache instance."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Return hits / lookups (0.0 when nothing was looked up)."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _canonical(user: str) -> str:
+    """Return *user* re-serialised with sorted keys when it is JSON."""
+    try:
+        payload = json.loads(user)
+    except ValueError:
+        return user
+    return json.dumps(
+        payload, sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+
+
+def cache_key(model: str, system: str, user: str, language: str) -> str:
+    """Return the content hash identifying one LLM request."""
+    material = json.dumps(
+        [model, system, _canonical(user), language], ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Interface shared by every cache backend."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached value for *key* or None (counts hit/miss)."""
+        with self._lock:
+            value = self._get(key, time.time())
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store *value* under *key*, evicting the LRU entries if needed."""
+        with self._lock:
+            self.stats.evictions += self._set(key, value, time.time())
+
+    @abstractmethod
+    def _get(self, key: str, now: float) -> str | None:
+        """Backend lookup; must drop expired entries."""
+
+    @abstractmethod
+    def _set(self, key: str, value: str, now: float) -> int:
+        """Backend insert; return the number of evicted entries."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the number of stored entries."""
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0) -> None:
+        super().__init__(maxsize, ttl)
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def _get(self, key: str, now: float) -> str | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: str, now: float) -> int:
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        evicted = 0
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        """Return the number of stored entries."""
+        return len(self._data)
+
+
+class SQLiteCache(ResponseCache):
+    """
+    On-disk LRU cache with TTL, safe to share between processes.
+
+    Counting the rows is a full scan, so the size is only checked every
+    ``maxsize // 100`` inserts; the table may exceed *maxsize* by that
+    many entries (1%) before the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        maxsize: int = 100_000,
+        ttl: float = 7 * 24 * 3600.0,
+    ) -> None:
+        super().__init__(maxsize, ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._check_every = max(1, maxsize // 100)
+        self._inserts = 0
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires REAL NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS llm_cache_accessed '
+            'ON llm_cache (accessed)'
+        )
+
+    def _get(self, key: str, now: float) -> str | None:
+        row = self._conn.execute(
+            'SELECT value, expires FROM llm_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires <= now:
+            self._conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+            return None
+        self._conn.execute(
+            'UPDATE llm_cache SET accessed = ? WHERE key = ?', (now, key)
+        )
+        return str(value)
+
+    def _set(self, key: str, value: str, now: float) -> int:
+        self._conn.execute(
+            'INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)',
+            (key, value, now + self.ttl, now),
+        )
+        self._inserts += 1
+        if self._inserts % self._check_every:
+            return 0
+        excess = len(self) - self.maxsize
+        if excess <= 0:
+            return 0
+        self._conn.execute(
+            'DELETE FROM llm_cache WHERE key IN ('
+            ' SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)',
+            (excess,),
+        )
+        return excess
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._conn.execute('DELETE FROM llm_cache')
+
+    def __len__(self) -> int:
+        """Return the number of stored entries."""
+        row = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()
+        return int(row[0])
+
+
+def _cache_from_env() -> ResponseCache | None:
+    """Build the default cache described by the ``SDX_LLM_CACHE*`` vars."""
+    backend = os.getenv('SDX_LLM_CACHE', 'memory').lower()
+    ttl = float(os.getenv('SDX_LLM_CACHE_TTL', '3600'))
+    size = int(os.getenv('SDX_LLM_CACHE_SIZE', '1024'))
+
+    if backend == 'none':
+        return None
+    if backend == 'sqlite':
+        path = os.getenv(
+            'SDX_LLM_CACHE_PATH', str(Path('data') / 'llm_cache.sqlite3')
+        )
+        return SQLiteCache(path, maxsize=size, ttl=ttl)
+    return MemoryCache(maxsize=size, ttl=ttl)
+
+
+_UNSET: Any = object()
+_cache: Any = _UNSET  # built from the environment on first use
+
+
+def get_cache() -> ResponseCache | None:
+    """Return the active response cache (None when caching is disabled)."""
+    global _cache
+    if _cache is _UNSET:
+        _cache = _cache_from_env()
+    cache: ResponseCache | None = _cache
+    return cache
+
+
+def set_cache(cache: ResponseCache | None) -> None:
+    """Install *cache* as the active backend (None disables caching)."""
+    global _cache
+    _cache = cache
+
+
+__all__ = [
+    'CacheStats',
+    'MemoryCache',
+    'ResponseCache',
+    'SQLiteCache',
+    'cache_key',
+    'get_cache',
+    'set_cache',
+]
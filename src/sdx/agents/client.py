@@ -3,66 +3,512 @@ Shared OpenAI helper used by all agents.
 
 * Forces JSON responses (`response_format={"type": "json_object"}`).
 * Validates with ``LLMDiagnosis.from_llm``.
-* Persists every raw reply under ``data/llm_raw/<sid>_<UTC>.json``.
+* Persists every raw reply under ``data/llm_raw/``: batched into gzip
+  segments by a background writer (``SDX_LLM_ARCHIVE=segments``, default)
+  or as one ``<UTC>_<sid>.json`` file per reply (``SDX_LLM_ARCHIVE=files``).
+* Serves repeated requests from the response cache (``sdx.agents.cache``).
+* ``chat`` / ``achat`` apply per-attempt timeouts, a per-call deadline,
+  jittered retries (also on replies failing validation) and optional
+  hedged requests (``sdx.agents.retry``); the SDK's own retries are off.
+* Reports tokens, latency and cache hits of every call, labelled with the
+  caller's *endpoint*, to ``sdx.agents.metrics.registry``.
+* Waits for the host-wide requests / tokens budget of
+  ``sdx.agents.ratelimit`` (when enabled) before every API request and
+  feeds it the ``x-ratelimit-*`` headers of every response.
+* ``astream_chat`` yields ``summary`` / ``option`` events while the reply
+  streams in, then the validated result. Opening the stream gets the same
+  per-attempt timeout and retries up to its first chunk; the rest must
+  arrive before the call deadline.
+* ``achat`` shares one connection-pooled ``AsyncOpenAI`` client per event
+  loop whose limits come from ``OPENAI_MAX_CONNECTIONS`` /
+  ``OPENAI_MAX_CONCURRENCY``.
+
+Importing this module has no side effects: ``.envs/.env`` is loaded, the
+OpenAI clients are built and ``data/llm_raw`` is created on first use
+(thread-safe), so CLI startup, test collection and worker forking stay
+cheap. ``openai`` and ``fastapi`` are only imported at that point.
 """
 
 from __future__ import annotations
 
+import asyncio
 import os
+import threading
+import time
 import uuid
+import weakref
 
+from dataclasses import replace
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator
 
-from dotenv import load_dotenv
-from fastapi import HTTPException
-from openai import OpenAI
 from pydantic import ValidationError
 
+from sdx.agents import metrics, ratelimit, retry
+from sdx.agents.archive import get_archive
+from sdx.agents.cache import cache_key, get_cache
+from sdx.agents.streaming import DiagnosisStreamParser, StreamEvent
 from sdx.schema.clinical_outputs import LLMDiagnosis
 
-load_dotenv(Path(__file__).parents[3] / '.envs' / '.env')
+if TYPE_CHECKING:
+    import httpx
+
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types.chat import ChatCompletionMessageParam
 
-_MODEL_NAME = os.getenv('OPENAI_MODEL', 'o4-mini-2025-04-16')
-_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY', ''))
+_ENV_FILE = Path(__file__).parents[3] / '.envs' / '.env'
+_DEFAULT_MODEL = 'o4-mini-2025-04-16'
 
 _RAW_DIR = Path('data') / 'llm_raw'
-_RAW_DIR.mkdir(parents=True, exist_ok=True)
+_ARCHIVE_MODE: str | None = None  # resolved from SDX_LLM_ARCHIVE on use
+
+_init_lock = threading.RLock()
+_env_loaded = False
+_client: OpenAI | None = None
+_async_pool: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, tuple[AsyncOpenAI, asyncio.Semaphore]
+] = weakref.WeakKeyDictionary()
+_pool_limits: dict[str, int] = {}
+
+
+def _load_env() -> None:
+    """Load ``.envs/.env`` once, on first use."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _init_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv(_ENV_FILE)
+            _env_loaded = True
+
+
+def _model_name() -> str:
+    """Return the configured OpenAI model name."""
+    _load_env()
+    return os.getenv('OPENAI_MODEL', _DEFAULT_MODEL)
+
+
+def _observe_rate_limits(response: httpx.Response) -> None:
+    """Feed the rate-limit headers of *response* to the limiter."""
+    limiter = ratelimit.get_rate_limiter()
+    if limiter is not None:
+        limiter.observe(response.status_code, response.headers)
+
+
+async def _aobserve_rate_limits(response: httpx.Response) -> None:
+    """Async ``_observe_rate_limits`` for the pooled httpx client."""
+    limiter = ratelimit.get_rate_limiter()
+    if limiter is not None:
+        await limiter.aobserve(response.status_code, response.headers)
+
+
+def _get_client() -> OpenAI:
+    """Return the shared synchronous client, building it on first use."""
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                from openai import DefaultHttpxClient, OpenAI
+
+                _load_env()
+                _client = OpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY', ''),
+                    http_client=DefaultHttpxClient(
+                        event_hooks={'response': [_observe_rate_limits]}
+                    ),
+                    max_retries=0,
+                )
+    return _client
+
+
+def _pool_limit(name: str, env: str) -> int:
+    """Return a pool limit set by ``configure_async_client`` or *env*."""
+    if name in _pool_limits:
+        return _pool_limits[name]
+    return int(os.getenv(env, '100'))
+
+
+def _build_async_client(max_connections: int) -> AsyncOpenAI:
+    """Return an ``AsyncOpenAI`` client backed by a bounded httpx pool."""
+    import httpx
+
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+    )
+    return AsyncOpenAI(
+        api_key=os.getenv('OPENAI_API_KEY', ''),
+        http_client=DefaultAsyncHttpxClient(
+            limits=limits,
+            event_hooks={'response': [_aobserve_rate_limits]},
+        ),
+        max_retries=0,
+    )
+
+
+def _async_resources() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    """
+    Return the async client and concurrency slots of the running loop.
+
+    httpx connections and semaphores are bound to one event loop, so each
+    loop (the uvicorn loop, a batch job's private loop, ...) gets its own.
+    """
+    loop = asyncio.get_running_loop()
+    resources = _async_pool.get(loop)
+    if resources is None:
+        with _init_lock:
+            resources = _async_pool.get(loop)
+            if resources is None:
+                _load_env()
+                max_connections = _pool_limit(
+                    'max_connections', 'OPENAI_MAX_CONNECTIONS'
+                )
+                max_concurrency = _pool_limit(
+                    'max_concurrency', 'OPENAI_MAX_CONCURRENCY'
+                )
+                resources = (
+                    _build_async_client(max_connections),
+                    asyncio.Semaphore(max_concurrency),
+                )
+                _async_pool[loop] = resources
+    return resources
+
+
+def configure_async_client(
+    *,
+    max_connections: int | None = None,
+    max_concurrency: int | None = None,
+) -> None:
+    """
+    Rebuild the shared async client with new pool limits.
+
+    *max_connections* caps open HTTP connections; *max_concurrency* caps
+    in-flight ``achat`` calls (extra callers wait for a free slot). The
+    clients built with the old limits are closed on their event loops.
+    """
+    with _init_lock:
+        if max_connections is not None:
+            _pool_limits['max_connections'] = max_connections
+        if max_concurrency is not None:
+            _pool_limits['max_concurrency'] = max_concurrency
+        retired = list(_async_pool.items())
+        _async_pool.clear()
+    for loop, (async_client, _) in retired:
+        _close_on_loop(loop, async_client)
+
+
+def _close_on_loop(loop: asyncio.AbstractEventLoop, async_client: Any) -> None:
+    """Close *async_client* and its httpx pool on its own *loop*."""
+    if loop.is_closed():
+        return  # its connections went away with the loop
+    if loop.is_running():
+        # the calling loop or another thread's: close once it gets a turn
+        asyncio.run_coroutine_threadsafe(async_client.close(), loop)
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        loop.run_until_complete(async_client.close())
+    # else: another loop runs in this thread and this one cannot be driven
+
+
+def _archive_mode() -> str:
+    """Return ``segments`` or ``files`` (see module docstring)."""
+    if _ARCHIVE_MODE is not None:
+        return _ARCHIVE_MODE
+    _load_env()
+    return os.getenv('SDX_LLM_ARCHIVE', 'segments').lower()
 
 
 def dump_llm_json(text: str, sid: str | None) -> None:
     """
-    Save *text* to data/llm_raw/<timestamp>_<sid>.json.
+    Archive the raw reply *text* under data/llm_raw/.
 
-    If *sid* is None, a random 8-char token is used instead.
+    In ``segments`` mode the reply is handed to the background
+    ``SegmentArchive`` and this call returns immediately. In ``files`` mode
+    it is written to data/llm_raw/<timestamp>_<sid>.json; if *sid* is None,
+    a random 8-char token is used instead.
     """
+    if _archive_mode() != 'files':
+        get_archive(_RAW_DIR).submit(text, sid)
+        return
     ts = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
     suffix = sid or uuid.uuid4().hex[:8]
+    _RAW_DIR.mkdir(parents=True, exist_ok=True)
     (_RAW_DIR / f'{ts}_{suffix}.json').write_text(text, encoding='utf-8')
 
 
+def _messages(system: str, user: str) -> list[ChatCompletionMessageParam]:
+    """Return the chat payload shared by ``chat`` and ``achat``."""
+    return [
+        {'role': 'system', 'content': system},
+        {'role': 'user', 'content': user},
+    ]
+
+
+def completion_body(system: str, user: str) -> dict[str, Any]:
+    """Return the ``/v1/chat/completions`` body that ``chat`` would send."""
+    return {
+        'model': _model_name(),
+        'response_format': {'type': 'json_object'},
+        'messages': _messages(system, user),
+    }
+
+
+def _request(system: str, user: str, timeout: float | None) -> dict[str, Any]:
+    """Return the ``create`` keyword arguments of one attempt."""
+    kwargs = completion_body(system, user)
+    if timeout is not None:
+        kwargs['timeout'] = timeout
+    return kwargs
+
+
+def _parse_reply(raw: str, session_id: str | None) -> LLMDiagnosis:
+    """Persist *raw* and validate it as ``LLMDiagnosis``."""
+    dump_llm_json(raw, session_id)
+    return LLMDiagnosis.from_llm(raw)
+
+
+def _unprocessable(exc: ValidationError) -> Exception:
+    """Return the HTTP 422 raised when no attempt gave a valid reply."""
+    from fastapi import HTTPException
+
+    return HTTPException(422, f'LLM response is not valid LLMDiagnosis: {exc}')
+
+
+def _settle(
+    limiter: ratelimit.RateLimiter | None, reserved: int, usage: Any
+) -> None:
+    """Charge *limiter* the billed tokens instead of the *reserved* ones."""
+    if limiter is not None and usage is not None:
+        used = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+        limiter.settle(reserved, used)
+
+
+async def _asettle(
+    limiter: ratelimit.RateLimiter | None, reserved: int, usage: Any
+) -> None:
+    """Async ``_settle``, keeping the state file I/O off the event loop."""
+    if limiter is not None and usage is not None:
+        used = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+        await limiter.asettle(reserved, used)
+
+
+def _cache_lookup(
+    system: str, user: str, language: str
+) -> tuple[str | None, LLMDiagnosis | None]:
+    """Return ``(key, cached reply)``; key is None when caching is off."""
+    _load_env()
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(_model_name(), system, user, language)
+    cached = cache.get(key)
+    if cached is None:
+        return key, None
+    return key, LLMDiagnosis.model_validate_json(cached)
+
+
+def _cache_store(key: str | None, result: LLMDiagnosis) -> None:
+    """Store *result* under *key* in the active cache (if any)."""
+    cache = get_cache()
+    if key is not None and cache is not None:
+        cache.set(key, result.model_dump_json())
+
+
 def chat(
     system: str,
     user: str,
     *,
     session_id: str | None = None,
+    language: str = 'en',
+    endpoint: str = 'chat',
 ) -> LLMDiagnosis:
     """Send system / user prompts and return a validated ``LLMDiagnosis``."""
-    rsp = _client.chat.completions.create(
-        model=_MODEL_NAME,
-        response_format={'type': 'json_object'},
-        messages=[
-            {'role': 'system', 'content': system},
-            {'role': 'user', 'content': user},
-        ],
-    )
+    with metrics.registry.track(endpoint, _model_name(), language) as call:
+        key, cached = _cache_lookup(system, user, language)
+        if cached is not None:
+            call.record.cache_hit = True
+            return cached
+
+        cost = ratelimit.estimate_tokens(system, user)
+
+        def attempt(timeout: float | None) -> LLMDiagnosis:
+            limiter = ratelimit.get_rate_limiter()
+            if limiter is not None:
+                limiter.acquire(cost, timeout)
+            rsp = _get_client().chat.completions.create(
+                **_request(system, user, timeout)
+            )
+            call.response(getattr(rsp, 'usage', None))
+            _settle(limiter, cost, getattr(rsp, 'usage', None))
+            raw = rsp.choices[0].message.content or '{}'
+            return _parse_reply(raw, session_id)
+
+        try:
+            result = retry.run(attempt)
+        except ValidationError as exc:
+            raise _unprocessable(exc) from exc
+        _cache_store(key, result)
+        return result
 
-    raw: str = rsp.choices[0].message.content or '{}'
-    dump_llm_json(raw, session_id)
 
+async def achat(
+    system: str,
+    user: str,
+    *,
+    session_id: str | None = None,
+    language: str = 'en',
+    endpoint: str = 'chat',
+) -> LLMDiagnosis:
+    """Async ``chat`` using the shared pooled client and concurrency cap."""
+    with metrics.registry.track(endpoint, _model_name(), language) as call:
+        key, cached = _cache_lookup(system, user, language)
+        if cached is not None:
+            call.record.cache_hit = True
+            return cached
+
+        async_client, slots = _async_resources()
+        cost = ratelimit.estimate_tokens(system, user)
+
+        async def attempt(timeout: float | None) -> LLMDiagnosis:
+            limiter = ratelimit.get_rate_limiter()
+            if limiter is not None:
+                await limiter.aacquire(cost, timeout)
+            async with slots:
+                rsp = await async_client.chat.completions.create(
+                    **_request(system, user, timeout)
+                )
+            call.response(getattr(rsp, 'usage', None))
+            await _asettle(limiter, cost, getattr(rsp, 'usage', None))
+            raw = rsp.choices[0].message.content or '{}'
+            return _parse_reply(raw, session_id)
+
+        try:
+            result = await retry.arun(attempt)
+        except ValidationError as exc:
+            raise _unprocessable(exc) from exc
+        _cache_store(key, result)
+        return result
+
+
+def _deadline(policy: retry.RetryPolicy) -> float | None:
+    """Return the monotonic time by which a call under *policy* must end."""
+    if policy.deadline is None:
+        return None
+    return time.monotonic() + policy.deadline
+
+
+async def _next_chunk(chunks: Any, deadline: float | None) -> Any:
+    """Return the next chunk of *chunks* (None at the end) by *deadline*."""
     try:
-        return LLMDiagnosis.from_llm(raw)
-    except ValidationError as exc:
-        raise HTTPException(
-            422, f'LLM response is not valid LLMDiagnosis: {exc}'
-        ) from exc
+        if deadline is None:
+            return await chunks.__anext__()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError('LLM call deadline exceeded')
+        return await asyncio.wait_for(chunks.__anext__(), remaining)
+    except StopAsyncIteration:
+        return None
+
+
+async def _close_stream(stream: Any) -> None:
+    """Release the connection of *stream* (best effort)."""
+    close = getattr(stream, 'close', None)
+    if close is not None:
+        try:
+            await close()
+        except Exception:  # already broken: nothing left to release
+            pass
+
+
+async def astream_chat(
+    system: str,
+    user: str,
+    *,
+    session_id: str | None = None,
+    language: str = 'en',
+    endpoint: str = 'chat',
+) -> AsyncIterator[StreamEvent]:
+    """
+    Stream a reply as ``StreamEvent`` objects.
+
+    Yields ``summary`` deltas and finished ``option`` entries as tokens
+    arrive, then one ``done`` event carrying the validated ``LLMDiagnosis``
+    (or ``error`` if the stream breaks or validation fails). The provider
+    stream is closed however the generator ends.
+    """
+    with metrics.registry.track(endpoint, _model_name(), language) as call:
+        key, cached = _cache_lookup(system, user, language)
+        if cached is not None:
+            call.record.cache_hit = True
+            yield StreamEvent('summary', cached.summary)
+            for option in cached.options:
+                yield StreamEvent('option', option)
+            yield StreamEvent('done', cached.model_dump())
+            return
+
+        parser = DiagnosisStreamParser()
+        async_client, slots = _async_resources()
+        cost = ratelimit.estimate_tokens(system, user)
+        limiter = ratelimit.get_rate_limiter()
+        # a twin stream would duplicate events: no hedging here
+        policy = replace(retry.get_retry_policy(), hedge=False)
+        deadline = _deadline(policy)
+
+        async def attempt(timeout: float | None) -> tuple[Any, Any, Any]:
+            if limiter is not None:
+                await limiter.aacquire(cost, timeout)
+            call.record.attempts += 1
+            stream = await async_client.chat.completions.create(
+                **_request(system, user, timeout),
+                stream=True,
+                stream_options={'include_usage': True},
+            )
+            chunks = stream.__aiter__()
+            try:
+                return stream, chunks, await _next_chunk(chunks, None)
+            except BaseException:
+                await _close_stream(stream)
+                raise
+
+        async with slots:
+            # failures before the first chunk are retried like chat calls
+            stream, chunks, chunk = await retry.arun(attempt, policy)
+            try:
+                while chunk is not None:
+                    call.first_byte()  # first streamed token
+                    usage = getattr(chunk, 'usage', None)
+                    call.add_usage(usage)
+                    await _asettle(limiter, cost, usage)
+                    choices = chunk.choices
+                    delta = choices[0].delta.content if choices else ''
+                    if delta:
+                        for event in parser.feed(delta):
+                            yield event
+                    chunk = await _next_chunk(chunks, deadline)
+            except Exception as exc:  # deadline, dropped connection, ...
+                call.record.ok = False
+                yield StreamEvent('error', f'LLM stream failed: {exc!r}')
+                return
+            finally:
+                # also on cancellation and aclose() by a gone client
+                await _close_stream(stream)
+
+        raw = parser.buffer or '{}'
+        dump_llm_json(raw, session_id)
+        try:
+            result = LLMDiagnosis.from_llm(raw)
+        except ValidationError as exc:
+            call.record.ok = False
+            yield StreamEvent(
+                'error', f'LLM response is not valid LLMDiagnosis: {exc}'
+            )
+            return
+        _cache_store(key, result)
+        yield StreamEvent('done', result.model_dump())
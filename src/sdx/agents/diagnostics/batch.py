@@ -0,0 +1,183 @@
+"""
+Batch differential diagnosis over many patient records.
+
+``adifferential_batch`` runs ``adifferential`` with at most
+``max_concurrency`` requests in flight and yields each ``BatchItem`` as soon
+as it completes. Failures are captured per item instead of aborting the
+batch. Errors ``retry.is_retryable`` accepts and invalid replies (HTTP
+422, under ``retry_invalid``) are retried up to ``max_retries`` times.
+After a transient API error such as a 429, every worker pauses until the
+``Retry-After`` deadline (or an exponential, jittered delay), so the batch
+backs off together and then resumes at full speed. This loop is the only
+retry layer: the client's own retries (``sdx.agents.retry``) are turned
+off for batch calls, which keep its per-attempt timeout and deadline.
+
+``differential_batch`` is the synchronous generator form for scripts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+
+from dataclasses import dataclass, replace
+from typing import (
+    Any,
+    AsyncGenerator,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+from sdx.agents import retry
+from sdx.agents.diagnostics.core import adifferential
+from sdx.schema.clinical_outputs import LLMDiagnosis
+
+
+@dataclass
+class BatchItem:
+    """Outcome of one patient in a batch run."""
+
+    index: int
+    result: Optional[LLMDiagnosis] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        """Return True when the diagnosis was produced."""
+        return self.error is None
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    """Return the server-suggested wait in seconds, if any."""
+    response = getattr(exc, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _invalid_reply(exc: BaseException) -> bool:
+    """Return True for the HTTP 422 ``achat`` raises on an invalid reply."""
+    import openai
+
+    return getattr(exc, 'status_code', None) == 422 and not isinstance(
+        exc, openai.APIStatusError
+    )
+
+
+class _Backoff:
+    """Shared pause gate so all workers honour one rate-limit signal."""
+
+    def __init__(self, base_delay: float, max_delay: float) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.resume_at = 0.0
+
+    async def wait(self) -> None:
+        """Sleep until the shared pause (if any) is over."""
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, exc: BaseException, attempt: int) -> None:
+        """Extend the shared pause after a transient failure."""
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2**attempt)
+            delay *= random.uniform(0.5, 1.0)
+        self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+
+async def adifferential_batch(
+    patients: Iterable[Dict[str, Any]],
+    language: str = 'en',
+    max_concurrency: int = 8,
+    *,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> AsyncGenerator[BatchItem, None]:
+    """Yield a ``BatchItem`` per patient, in completion order."""
+    source = iter(enumerate(patients))
+    done: asyncio.Queue[BatchItem | None] = asyncio.Queue(max_concurrency)
+    backoff = _Backoff(base_delay, max_delay)
+    single_attempt = replace(retry.get_retry_policy(), attempts=1)
+
+    async def run_one(index: int, patient: Dict[str, Any]) -> BatchItem:
+        item = BatchItem(index=index)
+        while True:
+            await backoff.wait()
+            item.attempts += 1
+            try:
+                with retry.use_retry_policy(single_attempt):
+                    item.result = await adifferential(
+                        patient, language=language
+                    )
+                return item
+            except Exception as exc:
+                invalid = _invalid_reply(exc)
+                if invalid:
+                    retryable = single_attempt.retry_invalid
+                else:
+                    retryable = retry.is_retryable(exc, single_attempt)
+                if not retryable or item.attempts > max_retries:
+                    item.error = exc
+                    return item
+                if not invalid:  # a bad reply says nothing about load
+                    backoff.pause(exc, item.attempts - 1)
+
+    async def worker() -> None:
+        for index, patient in source:
+            await done.put(await run_one(index, patient))
+        await done.put(None)
+
+    workers = [
+        asyncio.create_task(worker()) for _ in range(max(1, max_concurrency))
+    ]
+    remaining = len(workers)
+    try:
+        while remaining:
+            item = await done.get()
+            if item is None:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def differential_batch(
+    patients: Iterable[Dict[str, Any]],
+    language: str = 'en',
+    max_concurrency: int = 8,
+    **kwargs: Any,
+) -> Iterator[BatchItem]:
+    """
+    Run ``adifferential_batch`` on a private event loop, yielding items.
+
+    Must not be called from inside a running event loop; use the async
+    form there instead.
+    """
+    loop = asyncio.new_event_loop()
+    stream = adifferential_batch(patients, language, max_concurrency, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()
+
+
+__all__ = ['BatchItem', 'adifferential_batch', 'differential_batch']
@@ -1,12 +1,25 @@
-"""Diagnostic-related LLM utilities."""
+"""
+Diagnostic-related LLM utilities.
+
+With ``SDX_LLM_PROMPT_PREFIX=1`` (or ``cache_prefix=True`` on any of the
+functions below) the system prompts start with a long fixed prefix -
+instructions, output format, examples and language rules shared by every
+step and language - followed by the step section and the localized
+prompt, while the patient JSON stays last in the user message. OpenAI
+caches prompt prefixes of 1024 tokens or more, so consecutive calls reuse
+the prefix and only pay for the variable tail; ``metrics.registry``
+reports the cached share of prompt tokens.
+"""
 
 from __future__ import annotations
 
 import json
+import os
 
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-from sdx.agents.client import chat
+from sdx.agents.client import _load_env, achat, astream_chat, chat
+from sdx.agents.streaming import StreamEvent
 from sdx.schema.clinical_outputs import LLMDiagnosis
 
 _DIAG_PROMPTS = {
@@ -72,31 +85,315 @@ _EXAM_PROMPTS = {
     ),
 }
 
+# Identical for every step and language: keep it byte-stable, since any
+# change invalidates the provider's prompt cache.
+_PREFIX = """\
+# Role
+You are an experienced physician assistant supporting a licensed \
+clinician during a consultation. You never talk to the patient directly. \
+Your output is read by software first and by the clinician second, so it \
+must follow the output contract below exactly.
+
+# Output contract
+Reply with a single JSON object and nothing else: no Markdown fences, no \
+comments, no text before or after the object, no trailing commas.
+The object has exactly two keys:
+- "summary": a string of at most two sentences and 600 characters. It \
+states the clinical reasoning behind the options in plain clinical \
+language, mentioning the findings that weigh most.
+- "options": an array of strings, ordered from most to least likely \
+(or, for exams, from most to least useful). Never use an object or \
+numbers here; the order alone carries the ranking.
+Each option is a short, standard medical name (for example "Community-\
+acquired pneumonia", not "the patient probably has a lung infection"). \
+Do not repeat an option, do not number options and do not add \
+explanations inside option names. Do not add other keys.
+
+# How to reason
+- Use only the data given in the user message. Treat every field as \
+reported by the clinician; do not assume results that are not there.
+- Weigh age, sex, duration and onset of symptoms, vital signs, \
+comorbidities, medications, allergies, exposures and any exam results.
+- Prefer common conditions that explain most findings, but always keep \
+dangerous conditions that must not be missed when the findings allow \
+them (for example pulmonary embolism, myocardial infarction, sepsis, \
+meningitis, ectopic pregnancy, aortic dissection, stroke).
+- When data are missing or contradictory, still answer with the most \
+reasonable options and say in the summary which information would \
+change the assessment most.
+- When the data are insufficient for any clinical assessment, return an \
+empty "options" array and explain in the summary what is needed.
+- Never prescribe drugs or doses, never give a definitive diagnosis and \
+never include personal data of the patient in the summary.
+
+# Naming options
+- Name the most specific entity the data support, and no more: \
+"Community-acquired pneumonia" rather than "Lung infection", but not \
+"Pneumococcal pneumonia" unless a culture or antigen test says so.
+- Add acuity, laterality or severity only when the data establish it, \
+for example "Acute kidney injury" or "Left lower limb deep vein \
+thrombosis".
+- Do not offer a symptom as a diagnosis unless the syndrome itself is \
+the most useful answer, as in "Syncope of undetermined cause".
+- Keep each option a distinct condition; merge synonyms and spelling \
+variants into the most common name instead of listing both.
+- For exams, name the test, not the expected result: "Chest X-ray", \
+not "Chest X-ray showing consolidation". Name a panel only when it is \
+ordered as one, such as "Basic metabolic panel".
+- For imaging, give the modality and the region, and the use of \
+contrast when it matters: "Contrast-enhanced CT of the abdomen".
+
+# Choosing exams
+- Prefer widely available, first-line and least invasive tests, and \
+bedside tests such as ECG, pulse oximetry, capillary glucose or a \
+urine dipstick when they answer the question.
+- Cover every selected diagnosis, and order exams so that those which \
+confirm or exclude a dangerous condition come first.
+- Avoid two exams that answer the same question unless the first one \
+cannot exclude the diagnosis on its own.
+- Do not suggest treatments, referrals or follow-up visits as exams.
+
+# Special populations
+- In women of childbearing age, consider pregnancy and its \
+complications whenever abdominal pain, bleeding or syncope are present.
+- In children, weigh age-specific conditions and vaccination status; in \
+older adults, weigh atypical presentations, falls, polypharmacy and \
+delirium.
+- In immunocompromised patients, widen the differential to \
+opportunistic infections and keep malignancy in mind.
+
+# Language
+The last paragraph of the task section below is written in the \
+language of the reply. Write the "summary" and every option in that \
+language, using the terminology clinicians of that language use. Keep \
+JSON keys in English exactly as written above. Field names and values \
+of the user message may be in any language; do not translate them back \
+in the reply. Use the standard abbreviations of the reply language only \
+when they are unambiguous.
+
+# Examples
+Differential diagnosis, English, for {"age": 67, "sex": "M", \
+"symptoms": "crushing chest pain for 40 minutes, sweating", \
+"history": "hypertension, smoker"}:
+{"summary": "Acute chest pain with diaphoresis in an older smoker with \
+hypertension is an acute coronary syndrome until proven otherwise. An \
+ECG and troponin are the most informative next data.", "options": \
+["Acute myocardial infarction", "Unstable angina", "Aortic dissection", \
+"Pulmonary embolism", "Gastroesophageal reflux disease"]}
+Differential diagnosis, English, for {"age": 24, "sex": "F", \
+"symptoms": "fever, dysuria, right flank pain for 2 days"}:
+{"summary": "Fever, dysuria and flank pain in a young woman point to an \
+upper urinary tract infection. A pregnancy test and urinalysis would \
+refine the assessment.", "options": ["Acute pyelonephritis", "Cystitis", \
+"Nephrolithiasis", "Ectopic pregnancy", "Appendicitis"]}
+Exams, English, for ["Acute pyelonephritis", "Nephrolithiasis"]:
+{"summary": "Urine studies confirm the infection and guide antibiotics, \
+while imaging looks for obstruction or stones.", "options": \
+["Urinalysis", "Urine culture", "Complete blood count", "Serum \
+creatinine", "Beta-hCG", "Renal ultrasound", "Non-contrast abdominal CT"]}
+Differential diagnosis, Portuguese, for {"idade": 5, "sintomas": \
+"febre alta há 3 dias, manchas vermelhas no corpo, dor nas articulações"}:
+{"summary": "Febre alta com exantema e artralgia numa criança sugere \
+arbovirose ou doença exantemática da infância. A situação vacinal e a \
+contagem de plaquetas ajudariam a diferenciar.", "options": ["Dengue", \
+"Chikungunya", "Sarampo", "Escarlatina", "Doença de Kawasaki"]}
+Differential diagnosis, French, for {"âge": 82, "sexe": "F", \
+"symptômes": "confusion depuis hier, chutes, brûlures mictionnelles", \
+"traitements": "diurétique, benzodiazépine"}:
+{"summary": "Une confusion aiguë chez une patiente âgée avec des signes \
+urinaires évoque d'abord un syndrome confusionnel sur infection, sans \
+exclure une cause iatrogène ou métabolique. Un ionogramme, une \
+bandelette urinaire et la revue des traitements sont prioritaires.", \
+"options": ["Infection urinaire", "Syndrome confusionnel iatrogène", \
+"Hyponatrémie", "Hématome sous-dural", "Accident vasculaire cérébral", \
+"Déshydratation"]}
+Exams, Spanish, for ["Neumonía adquirida en la comunidad", \
+"Embolia pulmonar"]:
+{"summary": "La radiografía confirma la neumonía y los gases y el \
+dímero D orientan la sospecha de embolia, que la angiotomografía \
+confirma o descarta.", "options": ["Radiografía de tórax", \
+"Hemograma completo", "Proteína C reactiva", "Gasometría arterial", \
+"Dímero D", "Angiotomografía pulmonar"]}
+Insufficient data, English, for {"age": 30}:
+{"summary": "No symptoms, signs or history were provided, so no \
+differential can be proposed. Please add the main complaint and its \
+duration.", "options": []}
+
+# Task
+"""
+
+_PREFIX_STEPS = {
+    'differential': (
+        'Step: differential diagnosis. The user message is a JSON object '
+        'with the patient data. Return up to 10 differential diagnoses.\n'
+    ),
+    'exams': (
+        'Step: exams. The user message is a JSON array of the diagnoses '
+        'the clinician selected. Return at most 10 exams or procedures '
+        'that best confirm or rule them out, most useful first.\n'
+    ),
+}
+
+
+def _use_prefix(cache_prefix: bool | None) -> bool:
+    """Return *cache_prefix*, or ``SDX_LLM_PROMPT_PREFIX`` when None."""
+    if cache_prefix is not None:
+        return cache_prefix
+    _load_env()  # the flag may come from .envs/.env, like the API key
+    return os.getenv('SDX_LLM_PROMPT_PREFIX', '0').lower() in (
+        '1',
+        'true',
+        'yes',
+    )
+
+
+def _system_prompt(step: str, prompt: str, cache_prefix: bool | None) -> str:
+    """Return *prompt*, behind the shared prefix if enabled."""
+    if not _use_prefix(cache_prefix):
+        return prompt
+    return f'{_PREFIX}{_PREFIX_STEPS[step]}{prompt}'
+
+
+def differential_prompt(
+    patient: Dict[str, Any],
+    language: str = 'en',
+    cache_prefix: bool | None = None,
+) -> Tuple[str, str]:
+    """
+    Return the ``(system, user)`` prompts used by ``differential``.
+
+    *cache_prefix* puts the cache-friendly prefix ahead of the prompt
+    (None: follow ``SDX_LLM_PROMPT_PREFIX``).
+    """
+    prompt = _DIAG_PROMPTS.get(language, _DIAG_PROMPTS['en'])
+    return (
+        _system_prompt('differential', prompt, cache_prefix),
+        json.dumps(patient, ensure_ascii=False),
+    )
+
+
+def exams_prompt(
+    selected_dx: List[str],
+    language: str = 'en',
+    cache_prefix: bool | None = None,
+) -> Tuple[str, str]:
+    """Return the ``(system, user)`` prompts used by ``exams``."""
+    prompt = _EXAM_PROMPTS.get(language, _EXAM_PROMPTS['en'])
+    return (
+        _system_prompt('exams', prompt, cache_prefix),
+        json.dumps(selected_dx, ensure_ascii=False),
+    )
+
 
 def differential(
     patient: Dict[str, Any],
     language: str = 'en',
     session_id: str | None = None,
+    cache_prefix: bool | None = None,
 ) -> LLMDiagnosis:
     """Return summary + list of differential diagnoses."""
-    prompt = _DIAG_PROMPTS.get(language, _DIAG_PROMPTS['en'])
+    system, user = differential_prompt(patient, language, cache_prefix)
     return chat(
-        prompt,
-        json.dumps(patient, ensure_ascii=False),
+        system,
+        user,
         session_id=session_id,
+        language=language,
+        endpoint='differential',
     )
 
 
 def exams(
-    selected_dx: List[str], language: str = 'en', session_id: str | None = None
+    selected_dx: List[str],
+    language: str = 'en',
+    session_id: str | None = None,
+    cache_prefix: bool | None = None,
 ) -> LLMDiagnosis:
     """Return summary + list of suggested examinations."""
-    prompt = _EXAM_PROMPTS.get(language, _EXAM_PROMPTS['en'])
+    system, user = exams_prompt(selected_dx, language, cache_prefix)
     return chat(
-        prompt,
-        json.dumps(selected_dx, ensure_ascii=False),
+        system,
+        user,
+        session_id=session_id,
+        language=language,
+        endpoint='exams',
+    )
+
+
+async def adifferential(
+    patient: Dict[str, Any],
+    language: str = 'en',
+    session_id: str | None = None,
+    cache_prefix: bool | None = None,
+) -> LLMDiagnosis:
+    """Async ``differential`` backed by the pooled ``achat`` client."""
+    system, user = differential_prompt(patient, language, cache_prefix)
+    return await achat(
+        system,
+        user,
+        session_id=session_id,
+        language=language,
+        endpoint='differential',
+    )
+
+
+async def aexams(
+    selected_dx: List[str],
+    language: str = 'en',
+    session_id: str | None = None,
+    cache_prefix: bool | None = None,
+) -> LLMDiagnosis:
+    """Async ``exams`` backed by the pooled ``achat`` client."""
+    system, user = exams_prompt(selected_dx, language, cache_prefix)
+    return await achat(
+        system,
+        user,
+        session_id=session_id,
+        language=language,
+        endpoint='exams',
+    )
+
+
+def stream_differential(
+    patient: Dict[str, Any],
+    language: str = 'en',
+    session_id: str | None = None,
+    cache_prefix: bool | None = None,
+) -> AsyncIterator[StreamEvent]:
+    """Stream ``differential`` as incremental ``StreamEvent`` updates."""
+    system, user = differential_prompt(patient, language, cache_prefix)
+    return astream_chat(
+        system,
+        user,
+        session_id=session_id,
+        language=language,
+        endpoint='differential',
+    )
+
+
+def stream_exams(
+    selected_dx: List[str],
+    language: str = 'en',
+    session_id: str | None = None,
+    cache_prefix: bool | None = None,
+) -> AsyncIterator[StreamEvent]:
+    """Stream ``exams`` as incremental ``StreamEvent`` updates."""
+    system, user = exams_prompt(selected_dx, language, cache_prefix)
+    return astream_chat(
+        system,
+        user,
         session_id=session_id,
+        language=language,
+        endpoint='exams',
     )
 
 
-__all__ = ['differential', 'exams']
+__all__ = [
+    'adifferential',
+    'aexams',
+    'differential',
+    'differential_prompt',
+    'exams',
+    'exams_prompt',
+    'stream_differential',
+    'stream_exams',
+]
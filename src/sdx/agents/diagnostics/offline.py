@@ -0,0 +1,122 @@
+"""
+Offline (Batch API) mode for ``differential`` and ``exams``.
+
+Instead of one interactive ``chat`` call per consultation, prompts are
+written to a JSONL file in the OpenAI Batch API request format::
+
+    {"custom_id": "<session id>", "method": "POST",
+     "url": "/v1/chat/completions", "body": {...}}
+
+Once the provider has processed the job, ``ingest_batch_results`` reads the
+result file back into validated ``LLMDiagnosis`` objects keyed by the
+session id used as ``custom_id``.
+"""
+
+from __future__ import annotations
+
+import json
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from sdx.agents.client import completion_body, dump_llm_json
+from sdx.agents.diagnostics.core import differential_prompt, exams_prompt
+from sdx.schema.clinical_outputs import LLMDiagnosis
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+
+def _batch_request(custom_id: str, system: str, user: str) -> Dict[str, Any]:
+    """Wrap one prompt pair in a Batch API request line."""
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': completion_body(system, user),
+    }
+
+
+def differential_request(
+    patient: Dict[str, Any], session_id: str, language: str = 'en'
+) -> Dict[str, Any]:
+    """Return the batch request line for ``differential(patient)``."""
+    system, user = differential_prompt(patient, language)
+    return _batch_request(session_id, system, user)
+
+
+def exams_request(
+    selected_dx: List[str], session_id: str, language: str = 'en'
+) -> Dict[str, Any]:
+    """Return the batch request line for ``exams(selected_dx)``."""
+    system, user = exams_prompt(selected_dx, language)
+    return _batch_request(session_id, system, user)
+
+
+def write_batch_requests(
+    requests: Iterable[Dict[str, Any]], path: Union[str, Path]
+) -> int:
+    """Write *requests* as JSONL to *path* and return how many were written."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    seen: set[str] = set()
+    with path.open('w', encoding='utf-8') as fh:
+        for request in requests:
+            custom_id = request['custom_id']
+            if custom_id in seen:
+                raise ValueError(f'Duplicate custom_id in batch: {custom_id}')
+            seen.add(custom_id)
+            fh.write(json.dumps(request, ensure_ascii=False) + '\n')
+    return len(seen)
+
+
+def _reply_content(line: Dict[str, Any]) -> str:
+    """Return the assistant message of one result line or raise."""
+    if line.get('error'):
+        raise ValueError(f'Batch request failed: {line["error"]}')
+    response = line.get('response') or {}
+    status = response.get('status_code')
+    if status != 200:
+        raise ValueError(f'Batch request returned HTTP {status}')
+    content: str = response['body']['choices'][0]['message']['content']
+    return content or '{}'
+
+
+def ingest_batch_results(
+    path: Union[str, Path], *, archive: bool = True
+) -> Tuple[Dict[str, LLMDiagnosis], Dict[str, str]]:
+    """
+    Parse a Batch API result file.
+
+    Returns ``(results, errors)``: validated diagnoses and error messages,
+    both keyed by ``custom_id`` (the session id), or by ``'line <n>'``
+    for a line too malformed or truncated to carry one. With *archive*
+    enabled every raw reply is also persisted through ``dump_llm_json``.
+    """
+    results: Dict[str, LLMDiagnosis] = {}
+    errors: Dict[str, str] = {}
+
+    with Path(path).open(encoding='utf-8') as fh:
+        for number, raw_line in enumerate(fh, 1):
+            if not raw_line.strip():
+                continue
+            custom_id = f'line {number}'
+            try:
+                line = json.loads(raw_line)
+                custom_id = line['custom_id']
+                raw = _reply_content(line)
+                if archive:
+                    dump_llm_json(raw, custom_id)
+                results[custom_id] = LLMDiagnosis.from_llm(raw)
+            except (KeyError, IndexError, TypeError, ValueError) as exc:
+                errors[custom_id] = str(exc)
+
+    return results, errors
+
+
+__all__ = [
+    'BATCH_ENDPOINT',
+    'differential_request',
+    'exams_request',
+    'ingest_batch_results',
+    'write_batch_requests',
+]
@@ -0,0 +1,189 @@
+"""
+Content-addressed disk cache for extracted report text and FHIR output.
+
+Entries are keyed by the SHA-256 of the PDF bytes plus
+``EXTRACTOR_VERSION``, so a re-uploaded report (under any file name) costs
+one hash and a lookup, while upgrading the extractor invalidates old
+entries. Each key owns ``<dir>/<key[:2]>/<key>.txt`` (page text) and
+``<key>.<variant>.json`` (FHIR ``model_dump()`` per extraction variant,
+e.g. whole text vs. chunked). Least recently used files are evicted once
+the cache exceeds ``max_bytes``.
+
+The cache is opt-in because it stores clinical text on disk: set
+``SDX_REPORT_CACHE`` to a directory (and optionally
+``SDX_REPORT_CACHE_BYTES``), or install one with ``set_report_cache``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from pypdf import __version__ as _PYPDF_VERSION
+
+# Bump when text extraction or FHIR conversion changes their output.
+EXTRACTOR_VERSION = f'pypdf-{_PYPDF_VERSION}/3'
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """Return the cache key of the file at *path*."""
+    sha = hashlib.sha256(EXTRACTOR_VERSION.encode('utf-8') + b'\0')
+    with Path(path).open('rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ReportCache:
+    """Disk cache of report text and FHIR output with LRU size eviction."""
+
+    def __init__(
+        self, directory: Union[str, Path], max_bytes: int = 1024**3
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # computed on first write
+
+    def _path(self, digest: str, suffix: str) -> Path:
+        return self.directory / digest[:2] / f'{digest}{suffix}'
+
+    def _read(self, path: Path) -> Optional[str]:
+        try:
+            text = path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return text
+
+    def _write(self, path: Path, text: str) -> None:
+        data = text.encode('utf-8')
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            old = path.stat().st_size if path.exists() else 0
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f'{path.suffix}.{os.getpid()}.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._size += len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[Path]:
+        return [
+            path
+            for path in self.directory.glob('*/*')
+            if path.suffix in ('.txt', '.json')
+        ]
+
+    def _disk_usage(self) -> int:
+        return sum(path.stat().st_size for path in self._entries())
+
+    def _evict(self) -> None:
+        """Drop least recently used files until under ``max_bytes``."""
+        entries = sorted(self._entries(), key=lambda p: p.stat().st_mtime)
+        size = sum(path.stat().st_size for path in entries)
+        for path in entries:
+            if size <= self.max_bytes:
+                break
+            size -= path.stat().st_size
+            path.unlink(missing_ok=True)
+        self._size = size
+
+    def get_text(self, digest: str) -> Optional[str]:
+        """Return the cached page text of *digest*, if any."""
+        return self._read(self._path(digest, '.txt'))
+
+    def set_text(self, digest: str, text: str) -> None:
+        """Store the page text of *digest*."""
+        self._write(self._path(digest, '.txt'), text)
+
+    def get_fhir(
+        self, digest: str, variant: str = 'full'
+    ) -> Optional[Dict[str, Any]]:
+        """Return cached FHIR output of *digest* for *variant*, if any."""
+        raw = self._read(self._path(digest, f'.{variant}.json'))
+        if raw is None:
+            return None
+        data: Dict[str, Any] = json.loads(raw)
+        return data
+
+    def set_fhir(
+        self, digest: str, data: Dict[str, Any], variant: str = 'full'
+    ) -> None:
+        """Store FHIR output of *digest* for *variant*."""
+        self._write(
+            self._path(digest, f'.{variant}.json'),
+            json.dumps(data, ensure_ascii=False, default=str),
+        )
+
+    def invalidate(self, digest: str) -> int:
+        """Remove every entry of *digest*; return how many files went."""
+        removed = 0
+        with self._lock:
+            for path in (self.directory / digest[:2]).glob(f'{digest}.*'):
+                path.unlink(missing_ok=True)
+                removed += 1
+            self._size = None
+        return removed
+
+    def invalidate_file(self, path: Union[str, Path]) -> int:
+        """Remove every entry of the PDF at *path*."""
+        return self.invalidate(file_digest(path))
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for path in self._entries():
+                path.unlink(missing_ok=True)
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Return the bytes currently used by the cache."""
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            return self._size
+
+
+_UNSET: Any = object()
+_cache: Any = _UNSET  # built from the environment on first use
+
+
+def get_report_cache() -> Optional[ReportCache]:
+    """Return the active report cache (None when disabled)."""
+    global _cache
+    if _cache is _UNSET:
+        directory = os.getenv('SDX_REPORT_CACHE')
+        _cache = (
+            ReportCache(
+                directory,
+                int(os.getenv('SDX_REPORT_CACHE_BYTES', str(1024**3))),
+            )
+            if directory
+            else None
+        )
+    cache: Optional[ReportCache] = _cache
+    return cache
+
+
+def set_report_cache(cache: Optional[ReportCache]) -> None:
+    """Install *cache* as the active report cache (None disables it)."""
+    global _cache
+    _cache = cache
+
+
+__all__ = [
+    'EXTRACTOR_VERSION',
+    'ReportCache',
+    'file_digest',
+    'get_report_cache',
+    'set_report_cache',
+]
@@ -0,0 +1,245 @@
+"""
+Bulk ingestion of PDF medical reports into FHIR JSON.
+
+``ingest_reports`` runs two stages connected by a bounded queue:
+
+* CPU stage - ``extract_text_from_pdf`` for each file in a process pool;
+  at most ``queue_size`` parsed documents wait for the next stage, so a
+  slow API cannot make text pile up in memory.
+* I/O stage - ``extract_fhir`` calls on ``io_concurrency`` threads, each
+  writing ``<output>/<relative path>.json``.
+
+Progress is appended to ``<output>/checkpoint.jsonl`` so an interrupted
+run resumes where it stopped (files whose size or mtime changed are
+processed again). Per-file errors go to ``<output>/failures.jsonl`` with
+the stage that failed, and the returned ``IngestStats`` reports
+throughput.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Union
+
+from anamnesisai.openai import extract_fhir
+
+from sdx.agents.extraction.medical_reports import (
+    dump_fhir_resources,
+    extract_text_from_pdf,
+)
+
+CHECKPOINT_NAME = 'checkpoint.jsonl'
+FAILURES_NAME = 'failures.jsonl'
+
+
+@dataclass
+class IngestStats:
+    """Counters and timing of one ``ingest_reports`` run."""
+
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    text_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        """Return processed files per second of wall time."""
+        done = self.succeeded + self.failed
+        return done / self.elapsed if self.elapsed else 0.0
+
+
+def _file_key(path: Path) -> Dict[str, int]:
+    stat = path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_checkpoint(path: Path) -> Dict[str, Dict[str, int]]:
+    """Return ``{relative path: file key}`` of already ingested files."""
+    done: Dict[str, Dict[str, int]] = {}
+    if not path.exists():
+        return done
+    with path.open(encoding='utf-8') as fh:
+        for line in fh:
+            if line.strip():
+                entry = json.loads(line)
+                done[entry['file']] = entry['key']
+    return done
+
+
+class _Journal:
+    """Thread-safe append-only JSONL writer."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock, self.path.open('a', encoding='utf-8') as fh:
+            fh.write(line)
+
+
+def _extract_texts(
+    paths: List[Path], workers: Optional[int], in_flight: int
+) -> Iterator[tuple[Path, Union[str, BaseException]]]:
+    """Yield ``(path, text or error)`` with at most *in_flight* pending."""
+    pending: Dict[Future[str], Path] = {}
+    todo = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < in_flight:
+                path = next(todo, None)
+                if path is None:
+                    break
+                pending[pool.submit(extract_text_from_pdf, path)] = path
+            if not pending:
+                return
+            finished: Set[Future[str]]
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = pending.pop(future)
+                error = future.exception()
+                yield path, future.result() if error is None else error
+
+
+def ingest_reports(
+    source: Union[str, Path],
+    output: Union[str, Path],
+    *,
+    pattern: str = '**/*.pdf',
+    api_key: Optional[str] = None,
+    cpu_workers: Optional[int] = None,
+    io_concurrency: int = 8,
+    queue_size: int = 32,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+) -> IngestStats:
+    """
+    Convert every PDF matching *pattern* under *source* to FHIR JSON.
+
+    Parameters
+    ----------
+    source
+        Directory to scan.
+    output
+        Directory receiving one JSON file per report, the checkpoint and
+        the failure report.
+    pattern
+        Glob, relative to *source*, selecting the files to ingest.
+    api_key
+        OpenAI key (defaults to ``OPENAI_API_KEY``).
+    cpu_workers
+        Processes for text extraction (None: one per CPU).
+    io_concurrency
+        Concurrent ``extract_fhir`` calls.
+    queue_size
+        Maximum parsed documents buffered between the two stages.
+    progress
+        Called with the running stats after each finished file.
+    """
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise EnvironmentError(
+            'OpenAI API key is required. Provide it as an argument or '
+            'set the OPENAI_API_KEY environment variable.'
+        )
+
+    source = Path(source)
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    checkpoint = _Journal(output / CHECKPOINT_NAME)
+    failures = _Journal(output / FAILURES_NAME)
+    done = _read_checkpoint(checkpoint.path)
+
+    stats = IngestStats()
+    stats_lock = threading.Lock()
+    todo: List[Path] = []
+    for path in sorted(source.glob(pattern)):
+        if not path.is_file():
+            continue
+        stats.total += 1
+        if done.get(path.relative_to(source).as_posix()) == _file_key(path):
+            stats.skipped += 1
+        else:
+            todo.append(path)
+
+    def finish(path: Path, stage: str, error: Optional[BaseException]) -> None:
+        rel = path.relative_to(source).as_posix()
+        with stats_lock:
+            if error is None:
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+            stats.elapsed = time.perf_counter() - started
+            snapshot = IngestStats(**vars(stats))
+        if error is None:
+            checkpoint.append({'file': rel, 'key': _file_key(path)})
+        else:
+            failures.append(
+                {'file': rel, 'stage': stage, 'error': f'{error!s}'}
+            )
+        if progress is not None:
+            progress(snapshot)
+
+    texts: queue.Queue[Optional[tuple[Path, str]]] = queue.Queue(queue_size)
+
+    def fhir_worker() -> None:
+        while True:
+            item = texts.get()
+            if item is None:
+                return
+            path, text = item
+            try:
+                resources = dump_fhir_resources(extract_fhir(text, api_key))
+                target = output / path.relative_to(source).with_suffix('.json')
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_text(
+                    json.dumps(resources, ensure_ascii=False, default=str),
+                    encoding='utf-8',
+                )
+            except Exception as exc:
+                finish(path, 'fhir', exc)
+            else:
+                finish(path, 'fhir', None)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=fhir_worker, name=f'sdx-ingest-{n}')
+        for n in range(io_concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for path, text in _extract_texts(
+            todo, cpu_workers, in_flight=queue_size
+        ):
+            if isinstance(text, BaseException):
+                finish(path, 'text', text)
+                continue
+            with stats_lock:
+                stats.text_bytes += len(text.encode('utf-8'))
+            texts.put((path, text))  # blocks while the I/O stage is behind
+    finally:
+        for _ in threads:
+            texts.put(None)
+        for thread in threads:
+            thread.join()
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+__all__ = ['IngestStats', 'ingest_reports']
@@ -2,43 +2,423 @@
 
 from __future__ import annotations
 
+import copy
+import hashlib
+import json
+import mmap
 import os
+import re
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 from anamnesisai.openai import extract_fhir
 from pypdf import PdfReader
 
+from sdx.agents.extraction.cache import file_digest, get_report_cache
+from sdx.agents.extraction.ocr import (
+    OCREngine,
+    cached_text,
+    page_images,
+    recognize_images,
+    store_texts,
+)
 
-def extract_text_from_pdf(pdf_path: Union[str, Path]) -> str:
-    """Extract text content from a PDF file."""
+# Below this many pages per worker a process pool costs more than it saves.
+_MIN_PAGES_PER_WORKER = 8
+# One per report; chunk results are merged instead of listed.
+_SINGLETON_RESOURCES = frozenset({'Patient', 'Encounter'})
+_SECTION_BREAK = re.compile(r'\n\s*\n')
+
+
+def _resolve_workers(workers: int) -> int:
+    """Return *workers*, mapping values <= 0 to the number of CPUs."""
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def _extract_page_range(
+    pdf_path: Union[str, Path], start: int, stop: int
+) -> List[str]:
+    """Return the text of pages ``start:stop`` (runs in worker processes)."""
+    reader = PdfReader(pdf_path)
+    return [
+        reader.pages[number].extract_text() or ''
+        for number in range(start, stop)
+    ]
+
+
+def _page_ranges(page_count: int, workers: int) -> List[tuple[int, int]]:
+    """Split ``range(page_count)`` into ordered chunks for *workers*."""
+    # a few chunks per worker keeps the pool busy when pages vary in cost
+    size = max(1, -(-page_count // (workers * 4)))
+    return [
+        (start, min(start + size, page_count))
+        for start in range(0, page_count, size)
+    ]
+
+
+def iter_pdf_pages(
+    pdf_path: Union[str, Path],
+    workers: int = 1,
+    ocr: Optional[OCREngine] = None,
+) -> Iterator[str]:
+    """
+    Yield the text of every page of a PDF, in page order.
+
+    Pages without a text layer yield ``''``, or the text *ocr* recognises
+    in their images (see ``sdx.agents.extraction.ocr``). With
+    ``workers > 1`` (or ``<= 0`` for one per CPU) page ranges are extracted
+    in a process pool and yielded as soon as each range is done, so
+    downstream work can start before the whole document is parsed; OCR
+    always runs in a pool of that many processes.
+    """
     pdf_path = Path(pdf_path)
     if not pdf_path.exists():
         raise FileNotFoundError(f'PDF file not found: {pdf_path}')
 
-    try:
-        reader = PdfReader(pdf_path)
-        text_content = []
+    pages = _iter_text_layer(pdf_path, workers)
+    if ocr is None:
+        yield from pages
+    else:
+        yield from _with_ocr(pdf_path, pages, ocr, workers)
+
 
+def _iter_text_layer(pdf_path: Path, workers: int) -> Iterator[str]:
+    """Yield the text layer of every page (see ``iter_pdf_pages``)."""
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    workers = min(
+        _resolve_workers(workers), page_count // _MIN_PAGES_PER_WORKER
+    )
+    if workers <= 1:
         for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_content.append(page_text)
+            yield page.extract_text() or ''
+        return
+
+    del reader  # each worker parses the file on its own
+    ranges = _page_ranges(page_count, workers)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        chunks = pool.map(
+            _extract_page_range,
+            [pdf_path] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+        )
+        for chunk in chunks:
+            yield from chunk
+    finally:
+        # stop early consumers from waiting on ranges nobody will read
+        pool.shutdown(cancel_futures=True)
+
+
+def _mapped_reader(stack: ExitStack, pdf_path: Path) -> PdfReader:
+    """Return a reader over a memory map of *pdf_path* owned by *stack*."""
+    fh = stack.enter_context(pdf_path.open('rb'))
+    mapped = stack.enter_context(
+        mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    )
+    # mmap implements the read/seek/tell protocol pypdf relies on
+    return PdfReader(cast(IO[bytes], mapped))
+
+
+OCRJob = Tuple[str, List[bytes], Optional['Future[List[str]]']]
+
+
+def _with_ocr(
+    pdf_path: Path, pages: Iterator[str], engine: OCREngine, workers: int
+) -> Iterator[str]:
+    """Yield *pages*, replacing empty ones with OCR run in a pool."""
+    pending: Deque[OCRJob] = deque()
+
+    def resolve(job: OCRJob) -> str:
+        text, images, future = job
+        if future is None:
+            return text
+        return store_texts(engine, images, future.result())
+
+    with ExitStack() as stack:
+        reader: Optional[PdfReader] = None
+        pool: Optional[ProcessPoolExecutor] = None
+        for number, text in enumerate(pages):
+            if text:
+                pending.append((text, [], None))
+            else:
+                if reader is None:
+                    reader = _mapped_reader(stack, pdf_path)
+                images = page_images(reader.pages[number])
+                cached = cached_text(engine, images) if images else ''
+                if cached is not None:
+                    pending.append((cached, [], None))
+                else:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(_resolve_workers(workers))
+                        stack.callback(pool.shutdown, cancel_futures=True)
+                    future = pool.submit(recognize_images, engine, images)
+                    pending.append(('', images, future))
+            # keep page order: only release the head once it is ready
+            while pending and (pending[0][2] is None or pending[0][2].done()):
+                yield resolve(pending.popleft())
+        while pending:
+            yield resolve(pending.popleft())
+
+
+def iter_pdf_pages_mmap(pdf_path: Union[str, Path]) -> Iterator[str]:
+    """
+    Yield page text like ``iter_pdf_pages`` while keeping memory flat.
+
+    ``PdfReader(path)`` copies the whole file into memory; here the file is
+    memory-mapped instead, so the OS pages it in on demand, and the objects
+    pypdf parsed for a page are dropped once its text has been yielded.
+    """
+    pdf_path = Path(pdf_path)
+    if not pdf_path.exists():
+        raise FileNotFoundError(f'PDF file not found: {pdf_path}')
+
+    with (
+        pdf_path.open('rb') as fh,
+        mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+    ):
+        # mmap implements the read/seek/tell protocol pypdf relies on
+        reader = PdfReader(cast(IO[bytes], mapped))
+        for number in range(len(reader.pages)):
+            text = reader.pages[number].extract_text() or ''
+            reader.resolved_objects.clear()
+            yield text
+        del reader  # release buffer exports before the map is closed
+
+
+TextSink = Union[str, Path, IO[str], Callable[[str], Any]]
+
+
+def stream_pdf_text(
+    pdf_path: Union[str, Path],
+    sink: TextSink,
+    *,
+    separator: str = '\n',
+) -> int:
+    """
+    Write the text of a PDF to *sink* page by page; return pages written.
+
+    *sink* is a path (the text is written to that file), an open text file,
+    or a callable receiving each chunk. Pages are read through
+    ``iter_pdf_pages_mmap`` and joined with *separator* like
+    ``extract_text_from_pdf``, but the document is never held in memory.
+    Pages without text are skipped.
+    """
+    if isinstance(sink, (str, Path)):
+        with Path(sink).open('w', encoding='utf-8') as fh:
+            return stream_pdf_text(pdf_path, fh, separator=separator)
+    write = sink if callable(sink) else sink.write
+
+    written = 0
+    try:
+        for text in iter_pdf_pages_mmap(pdf_path):
+            if not text:
+                continue
+            write(f'{separator}{text}' if written else text)
+            written += 1
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise ValueError(f'Error reading PDF {pdf_path}: {e!s}') from e
+    return written
+
+
+def extract_text_from_pdf(
+    pdf_path: Union[str, Path],
+    workers: int = 1,
+    ocr: Optional[OCREngine] = None,
+) -> str:
+    """
+    Extract text content from a PDF file.
+
+    *workers* > 1 extracts page ranges in parallel processes (``<= 0``
+    uses one per CPU); the text is reassembled in page order. Pages
+    without a text layer are OCRed with *ocr*, if given. When a
+    report cache is active (``sdx.agents.extraction.cache``), a PDF with
+    the same bytes is only parsed once.
+    """
+    pdf_path = Path(pdf_path)
+    if not pdf_path.exists():
+        raise FileNotFoundError(f'PDF file not found: {pdf_path}')
+
+    cache = get_report_cache()
+    digest = file_digest(pdf_path) if cache is not None else ''
+    if ocr is not None and digest:
+        digest = hashlib.sha256(
+            f'{digest}\0{ocr.cache_id}'.encode('utf-8')
+        ).hexdigest()
+    if cache is not None:
+        cached = cache.get_text(digest)
+        if cached is not None:
+            return cached
+
+    try:
+        text_content = [
+            page_text
+            for page_text in iter_pdf_pages(pdf_path, workers, ocr)
+            if page_text
+        ]
 
         if not text_content:
             raise ValueError(f'No extractable text found in PDF: {pdf_path}')
 
-        return '\n'.join(text_content)
+        text = '\n'.join(text_content)
 
     except Exception as e:
         raise ValueError(f'Error reading PDF {pdf_path}: {e!s}') from e
 
+    if cache is not None:
+        cache.set_text(digest, text)
+    return text
+
+
+def dump_fhir_resources(resources: Dict[str, Any]) -> Dict[str, Any]:
+    """Return ``extract_fhir`` output as ``{resource type: plain dict}``."""
+    return {
+        resource_type: resource.model_dump()
+        for resource_type, resource in resources.items()
+    }
+
+
+def _split_long(text: str, max_chars: int, level: int = 0) -> List[str]:
+    """Split *text* on blank-line sections, then lines, then hard-wrap."""
+    if level == 0:
+        parts, separator = _SECTION_BREAK.split(text), '\n\n'
+    elif level == 1:
+        parts, separator = text.split('\n'), '\n'
+    else:
+        return [
+            text[start : start + max_chars]
+            for start in range(0, len(text), max_chars)
+        ]
+    pieces: List[str] = []
+    current = ''
+    for part in parts:
+        if len(part) > max_chars:
+            pieces.extend([current] if current else [])
+            current = ''
+            pieces.extend(_split_long(part, max_chars, level + 1))
+            continue
+        if current and len(current) + len(separator) + len(part) > max_chars:
+            pieces.append(current)
+            current = ''
+        current = f'{current}{separator}{part}' if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_report_text(pages: List[str], max_chars: int) -> List[str]:
+    """
+    Group page texts into chunks of at most *max_chars* characters.
+
+    Pages are kept whole when possible; a page longer than *max_chars* is
+    split on blank-line section boundaries, a section that is still too
+    long on line breaks, and only a single overlong line is hard-wrapped.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for page in pages:
+        if not page:
+            continue
+        if len(page) > max_chars:
+            pieces = _split_long(page, max_chars)
+        else:
+            pieces = [page]
+        for piece in pieces:
+            if current and size + 1 + len(piece) > max_chars:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + (1 if size else 0)
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def _merge_into(base: Dict[str, Any], extra: Dict[str, Any]) -> None:
+    """Fill the empty fields of *base* from *extra* and extend its lists."""
+    for key, value in extra.items():
+        current = base.get(key)
+        if current in (None, '', [], {}):
+            base[key] = copy.deepcopy(value)
+        elif isinstance(current, dict) and isinstance(value, dict):
+            _merge_into(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            current.extend(
+                copy.deepcopy(item) for item in value if item not in current
+            )
+
+
+def merge_fhir_resources(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge ``dump_fhir_resources`` outputs of several chunks of one report.
+
+    ``Patient`` and ``Encounter`` describe the whole report: the first
+    chunk's resource wins, later chunks fill its empty fields and add the
+    entries its list fields do not have yet. Every other type
+    (``Observation``, ``Condition``, ...) becomes a list of the distinct
+    resources found, in chunk order.
+    """
+    merged: Dict[str, Any] = {}
+    seen: Dict[str, set[str]] = {}
+    for part in parts:
+        for resource_type, resource in part.items():
+            if resource_type in _SINGLETON_RESOURCES:
+                if resource_type in merged:
+                    _merge_into(merged[resource_type], resource)
+                else:
+                    merged[resource_type] = copy.deepcopy(resource)
+                continue
+            digest = json.dumps(resource, sort_keys=True, default=str)
+            if digest not in seen.setdefault(resource_type, set()):
+                seen[resource_type].add(digest)
+                merged.setdefault(resource_type, []).append(
+                    copy.deepcopy(resource)
+                )
+    return merged
+
 
 def get_report_data_from_pdf(
-    pdf_path: Union[str, Path], api_key: Optional[str] = None
+    pdf_path: Union[str, Path],
+    api_key: Optional[str] = None,
+    *,
+    chunk_chars: Optional[int] = None,
+    max_concurrency: int = 4,
 ) -> Dict[str, Any]:
-    """Extract FHIR data from a medical PDF report."""
+    """
+    Extract FHIR data from a medical PDF report.
+
+    With *chunk_chars*, the text is split on section boundaries into
+    chunks of at most that many characters, up to *max_concurrency*
+    chunks are sent to ``extract_fhir`` at once, and the results are
+    combined with ``merge_fhir_resources``: one ``Patient`` and
+    ``Encounter``, and a list of every other resource type. Long reports
+    then take about as long as one chunk and never exceed the model
+    context.
+
+    With an active report cache, the PDF text and the output for identical
+    PDF bytes (and chunking setting) are reused, the latter without
+    calling ``extract_fhir``.
+    """
     api_key = api_key or os.environ.get('OPENAI_API_KEY')
 
     if not api_key:
@@ -47,15 +427,53 @@ def get_report_data_from_pdf(
             'set the OPENAI_API_KEY environment variable.'
         )
 
-    text_content = extract_text_from_pdf(pdf_path)
+    cache = get_report_cache()
+    digest = ''
+    variant = 'full' if chunk_chars is None else f'chunks-{chunk_chars}'
+    if cache is not None and Path(pdf_path).exists():
+        digest = file_digest(pdf_path)
+        cached = cache.get_fhir(digest, variant)
+        if cached is not None:
+            return cached
 
-    try:
-        fhir_resources = extract_fhir(text_content, api_key)
+    if chunk_chars is not None:
+        data = _chunked_report_data(
+            pdf_path, api_key, chunk_chars, max_concurrency
+        )
+    else:
+        text_content = extract_text_from_pdf(pdf_path)
+
+        try:
+            data = dump_fhir_resources(extract_fhir(text_content, api_key))
+
+        except Exception as e:
+            raise ValueError(f'Failed to convert PDF to FHIR: {e!s}') from e
 
-        return {
-            resource_type: resource.model_dump()
-            for resource_type, resource in fhir_resources.items()
-        }
+    if cache is not None and digest:
+        cache.set_fhir(digest, data, variant)
+    return data
 
+
+def _chunked_report_data(
+    pdf_path: Union[str, Path],
+    api_key: str,
+    chunk_chars: int,
+    max_concurrency: int,
+) -> Dict[str, Any]:
+    """Run ``extract_fhir`` per chunk concurrently and merge the results."""
+    # the cached report text keeps sections and lines, not page boundaries
+    chunks = split_report_text([extract_text_from_pdf(pdf_path)], chunk_chars)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            parts = list(
+                pool.map(
+                    lambda chunk: dump_fhir_resources(
+                        extract_fhir(chunk, api_key)
+                    ),
+                    chunks,
+                )
+            )
     except Exception as e:
         raise ValueError(f'Failed to convert PDF to FHIR: {e!s}') from e
+    return merge_fhir_resources(parts)
@@ -0,0 +1,117 @@
+"""
+Pluggable OCR for PDF pages without a text layer.
+
+``iter_pdf_pages(..., ocr=engine)`` hands the embedded images of every
+page whose text layer is empty to an ``OCREngine`` running in a process
+pool; pages that already have text are never OCRed. Results are cached per
+image (keyed by the image bytes and ``OCREngine.cache_id``) in the active
+report cache, so re-ingesting a scanned bundle skips recognition.
+
+``TesseractOCR`` needs the optional ``pytesseract`` and ``Pillow``
+packages plus the ``tesseract`` binary; they are imported on first use.
+Any other engine only has to implement ``recognize``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+from sdx.agents.extraction.cache import get_report_cache
+
+
+class OCREngine(ABC):
+    """Turn one page image into text (must be picklable)."""
+
+    @property
+    @abstractmethod
+    def cache_id(self) -> str:
+        """Return an identifier of the engine and its settings."""
+
+    @abstractmethod
+    def recognize(self, image: bytes) -> str:
+        """Return the text found in the encoded *image* (PNG, JPEG...)."""
+
+
+class TesseractOCR(OCREngine):
+    """OCR through a local Tesseract install (CPU only)."""
+
+    def __init__(self, lang: str = 'eng', config: str = '') -> None:
+        self.lang = lang
+        self.config = config
+
+    @property
+    def cache_id(self) -> str:
+        """Return an identifier of the engine and its settings."""
+        return f'tesseract:{self.lang}:{self.config}'
+
+    def recognize(self, image: bytes) -> str:
+        """Return the text Tesseract finds in *image*."""
+        try:
+            import pytesseract
+
+            from PIL import Image
+        except ImportError as exc:
+            raise ImportError(
+                'TesseractOCR needs the optional "pytesseract" and "Pillow" '
+                'packages and the tesseract binary.'
+            ) from exc
+        with Image.open(io.BytesIO(image)) as picture:
+            text: str = pytesseract.image_to_string(
+                picture, lang=self.lang, config=self.config
+            )
+        return text.strip()
+
+
+def image_cache_key(engine: OCREngine, image: bytes) -> str:
+    """Return the report cache key of *image* recognised by *engine*."""
+    sha = hashlib.sha256(f'ocr\0{engine.cache_id}\0'.encode('utf-8'))
+    sha.update(image)
+    return sha.hexdigest()
+
+
+def page_images(page: Any) -> List[bytes]:
+    """Return the encoded images embedded in a pypdf *page*."""
+    return [image.data for image in page.images]
+
+
+def recognize_images(engine: OCREngine, images: List[bytes]) -> List[str]:
+    """Run *engine* on each image (executed in worker processes)."""
+    return [engine.recognize(image) for image in images]
+
+
+def cached_text(engine: OCREngine, images: List[bytes]) -> Optional[str]:
+    """Return the page text if every image is cached, else None."""
+    cache = get_report_cache()
+    if cache is None:
+        return None
+    texts = []
+    for image in images:
+        text = cache.get_text(image_cache_key(engine, image))
+        if text is None:
+            return None
+        texts.append(text)
+    return '\n'.join(t for t in texts if t)
+
+
+def store_texts(
+    engine: OCREngine, images: List[bytes], texts: List[str]
+) -> str:
+    """Cache the recognised *texts* and return the joined page text."""
+    cache = get_report_cache()
+    if cache is not None:
+        for image, text in zip(images, texts):
+            cache.set_text(image_cache_key(engine, image), text)
+    return '\n'.join(t for t in texts if t)
+
+
+__all__ = [
+    'OCREngine',
+    'TesseractOCR',
+    'image_cache_key',
+    'page_images',
+    'recognize_images',
+]
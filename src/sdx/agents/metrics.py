@@ -0,0 +1,353 @@
+"""
+Per-call token and latency accounting for LLM calls.
+
+``chat``, ``achat`` and ``astream_chat`` report one ``CallRecord`` per call
+to the process-wide ``registry``: endpoint (wizard step), model, language,
+cache hit, API attempts, prompt / completion / provider-cached prompt
+tokens summed over every attempt (retries and hedges cost too), wall time
+and time to first byte (first streamed chunk, or first API response when
+not streaming).
+
+The registry keeps counters and latency histograms per
+``(endpoint, model, language)``:
+
+* ``snapshot()`` - JSON-friendly totals, the share of prompt tokens the
+  provider served from its prompt cache and p50 / p95 / p99 over the most
+  recent calls;
+* ``prometheus()`` - the text exposition format, for a ``/metrics`` route;
+* hooks - callables receiving every record, e.g. ``opentelemetry_hook()``
+  which turns calls into spans (needs the optional
+  ``opentelemetry-api`` package, imported on first use).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = tuple[str, str, str]  # (endpoint, model, language)
+Hook = Callable[['CallRecord'], None]
+
+
+@dataclass
+class CallRecord:
+    """Measurements of one LLM call."""
+
+    endpoint: str
+    model: str
+    language: str
+    cache_hit: bool = False
+    ok: bool = True
+    attempts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens served from the provider cache
+    wall_time: float = 0.0
+    ttfb: float | None = None
+    started: float = field(default_factory=time.time)  # epoch seconds
+
+
+class _Histogram:
+    """Cumulative bucket counts plus a window of recent samples."""
+
+    def __init__(self, buckets: tuple[float, ...], window: int) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.recent: deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantiles(self) -> dict[str, float | None]:
+        ordered = sorted(self.recent)
+        return {
+            f'p{round(q * 100)}': (
+                ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                if ordered
+                else None
+            )
+            for q in QUANTILES
+        }
+
+
+class _Series:
+    """Aggregates of one label set."""
+
+    def __init__(self, buckets: tuple[float, ...], window: int) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.attempts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.wall = _Histogram(buckets, window)
+        self.ttfb = _Histogram(buckets, window)
+
+    def add(self, record: CallRecord) -> None:
+        self.calls += 1
+        self.errors += not record.ok
+        self.cache_hits += record.cache_hit
+        self.attempts += record.attempts
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cached_tokens += record.cached_tokens
+        self.wall.observe(record.wall_time)
+        if record.ttfb is not None:
+            self.ttfb.observe(record.ttfb)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    pairs = dict(zip(('endpoint', 'model', 'language'), labels), **extra)
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+
+def _by_labels(item: tuple[Labels, _Series]) -> Labels:
+    return item[0]
+
+
+class MetricsRegistry:
+    """Thread-safe store of LLM call metrics."""
+
+    def __init__(
+        self,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        window: int = 1024,
+    ) -> None:
+        self.buckets = buckets
+        self.window = window
+        self.hooks: list[Hook] = []
+        self.hook_errors = 0
+        self._series: dict[Labels, _Series] = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Hook) -> None:
+        """Call *hook* with every future record."""
+        self.hooks.append(hook)
+
+    def record(self, record: CallRecord) -> None:
+        """Add *record* to the aggregates and pass it to the hooks."""
+        labels = (record.endpoint, record.model, record.language)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Series(
+                    self.buckets, self.window
+                )
+            series.add(record)
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception:  # never let exporters break a consultation
+                self.hook_errors += 1
+
+    @contextmanager
+    def track(
+        self, endpoint: str, model: str, language: str
+    ) -> Iterator[CallTracker]:
+        """Measure the enclosed call and record it on exit."""
+        tracker = CallTracker(CallRecord(endpoint, model, language))
+        try:
+            yield tracker
+        except BaseException:  # also a cancelled or abandoned stream
+            tracker.record.ok = False
+            raise
+        finally:
+            tracker.record.wall_time = time.perf_counter() - tracker.started
+            self.record(tracker.record)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Return one dict of totals and latency quantiles per label set."""
+        with self._lock:
+            return [
+                {
+                    'endpoint': labels[0],
+                    'model': labels[1],
+                    'language': labels[2],
+                    'calls': series.calls,
+                    'errors': series.errors,
+                    'cache_hits': series.cache_hits,
+                    'attempts': series.attempts,
+                    'prompt_tokens': series.prompt_tokens,
+                    'completion_tokens': series.completion_tokens,
+                    'cached_tokens': series.cached_tokens,
+                    'cached_ratio': (
+                        series.cached_tokens / series.prompt_tokens
+                        if series.prompt_tokens
+                        else None
+                    ),
+                    'wall_time': series.wall.quantiles(),
+                    'ttfb': series.ttfb.quantiles(),
+                }
+                for labels, series in sorted(
+                    self._series.items(), key=_by_labels
+                )
+            ]
+
+    def prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        out: list[str] = []
+        with self._lock:
+            series = sorted(self._series.items(), key=_by_labels)
+            for name, help_text in (
+                ('calls', 'LLM calls.'),
+                ('errors', 'LLM calls that failed.'),
+                ('cache_hits', 'LLM calls served from the response cache.'),
+                ('attempts', 'API requests, including retries and hedges.'),
+            ):
+                out.append(f'# HELP sdx_llm_{name}_total {help_text}')
+                out.append(f'# TYPE sdx_llm_{name}_total counter')
+                out.extend(
+                    f'sdx_llm_{name}_total{{{_labels(labels)}}} '
+                    f'{getattr(s, name)}'
+                    for labels, s in series
+                )
+            out.append('# HELP sdx_llm_tokens_total Tokens billed.')
+            out.append('# TYPE sdx_llm_tokens_total counter')
+            for labels, s in series:
+                for kind, count in (
+                    ('prompt', s.prompt_tokens),
+                    ('completion', s.completion_tokens),
+                    ('cached', s.cached_tokens),
+                ):
+                    out.append(
+                        'sdx_llm_tokens_total'
+                        f'{{{_labels(labels, kind=kind)}}} {count}'
+                    )
+            for name, help_text, attr in (
+                ('call_seconds', 'Wall time of LLM calls.', 'wall'),
+                ('ttfb_seconds', 'Time to first byte of LLM calls.', 'ttfb'),
+            ):
+                out.append(f'# HELP sdx_llm_{name} {help_text}')
+                out.append(f'# TYPE sdx_llm_{name} histogram')
+                for labels, s in series:
+                    histogram: _Histogram = getattr(s, attr)
+                    cumulative = 0
+                    bounds = [*map(str, self.buckets), '+Inf']
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        out.append(
+                            f'sdx_llm_{name}_bucket'
+                            f'{{{_labels(labels, le=bound)}}} {cumulative}'
+                        )
+                    out.append(
+                        f'sdx_llm_{name}_sum{{{_labels(labels)}}} '
+                        f'{histogram.total}'
+                    )
+                    out.append(
+                        f'sdx_llm_{name}_count{{{_labels(labels)}}} '
+                        f'{histogram.count}'
+                    )
+        return '\n'.join(out) + '\n'
+
+    def reset(self) -> None:
+        """Drop every aggregate (hooks are kept)."""
+        with self._lock:
+            self._series.clear()
+
+
+class CallTracker:
+    """Handle used inside ``MetricsRegistry.track`` to annotate a call."""
+
+    def __init__(self, record: CallRecord) -> None:
+        self.record = record
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def response(self, usage: Any) -> None:
+        """Count one API response and add its ``usage`` (may be None)."""
+        with self._lock:
+            self.record.attempts += 1
+        self.first_byte()
+        self.add_usage(usage)
+
+    def add_usage(self, usage: Any) -> None:
+        """Add the token counts of an OpenAI ``usage`` object (or None)."""
+        if usage is None:
+            return
+        with self._lock:
+            self.record.prompt_tokens += usage.prompt_tokens or 0
+            self.record.completion_tokens += usage.completion_tokens or 0
+            details = getattr(usage, 'prompt_tokens_details', None)
+            self.record.cached_tokens += (
+                getattr(details, 'cached_tokens', None) or 0
+            )
+
+    def first_byte(self) -> None:
+        """Mark the time to first byte, if not marked yet."""
+        if self.record.ttfb is None:
+            self.record.ttfb = time.perf_counter() - self.started
+
+
+def opentelemetry_hook(tracer: Any = None) -> Hook:
+    """
+    Return a hook exporting every call as an OpenTelemetry span.
+
+    Spans are named ``llm <endpoint>`` and carry the ``gen_ai.*`` model and
+    usage attributes. *tracer* defaults to the global ``sdx.agents`` one.
+    """
+    try:
+        from opentelemetry import trace
+    except ImportError as exc:
+        raise ImportError(
+            'opentelemetry_hook needs the optional "opentelemetry-api" '
+            'package.'
+        ) from exc
+
+    tracer = tracer or trace.get_tracer('sdx.agents')
+
+    def hook(record: CallRecord) -> None:
+        start = int(record.started * 1e9)
+        span = tracer.start_span(
+            f'llm {record.endpoint}',
+            start_time=start,
+            attributes={
+                'gen_ai.request.model': record.model,
+                'gen_ai.usage.input_tokens': record.prompt_tokens,
+                'gen_ai.usage.output_tokens': record.completion_tokens,
+                'sdx.cached_tokens': record.cached_tokens,
+                'sdx.language': record.language,
+                'sdx.cache_hit': record.cache_hit,
+                'sdx.attempts': record.attempts,
+                'sdx.ttfb': record.ttfb if record.ttfb is not None else -1.0,
+            },
+        )
+        if not record.ok:
+            span.set_status(trace.Status(trace.StatusCode.ERROR))
+        span.end(end_time=start + int(record.wall_time * 1e9))
+
+    return hook
+
+
+registry = MetricsRegistry()
+
+
+__all__ = [
+    'LATENCY_BUCKETS',
+    'CallRecord',
+    'CallTracker',
+    'MetricsRegistry',
+    'opentelemetry_hook',
+    'registry',
+]
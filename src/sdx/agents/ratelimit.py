@@ -0,0 +1,299 @@
+"""
+Client-side OpenAI rate limiter shared by every process on the host.
+
+``RateLimiter`` keeps two token buckets - requests and tokens per minute -
+in a small JSON state file guarded by an exclusive ``flock``, so uvicorn
+workers and batch jobs using one API key draw from the same budget. Each
+bucket holds ``burst`` seconds worth of quota, which smooths bursts that
+the provider would answer with 429s.
+
+Every OpenAI response updates the shared state (see ``observe``):
+
+* ``x-ratelimit-limit-*`` sets the per-minute limits (capped by the
+  configured ones), so the buckets follow the real quota;
+* ``x-ratelimit-remaining-*`` lowers the buckets when other clients of the
+  key used more than this host accounted for;
+* a 429 pauses every process until ``retry-after`` /
+  ``x-ratelimit-reset-*`` has elapsed.
+
+Token costs are estimated before a call (``estimate_tokens``) and settled
+with the billed usage afterwards. The ``a*`` methods do the file locking
+and I/O in a worker thread, so a busy lock never stalls an event loop.
+Enable it with ``SDX_LLM_RATE_LIMIT=1`` (limits learned from the
+headers) and/or ``SDX_LLM_RPM`` / ``SDX_LLM_TPM``; ``SDX_LLM_RATE_PATH``
+names the state file (default ``data/llm_ratelimit.json``). Without
+``fcntl`` (Windows) the buckets are only shared between threads.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Iterator, Mapping
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_UNIT_SECONDS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+State = dict[str, float]
+
+
+def parse_reset(value: str | None) -> float:
+    """Return the seconds of a reset header such as ``6m0s`` or ``20ms``."""
+    if not value:
+        return 0.0
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return 0.0
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+
+
+def estimate_tokens(*texts: str, completion: int = 512) -> int:
+    """Return a rough token cost of a call sending *texts* (4 chars/token)."""
+    return sum(len(text) for text in texts) // 4 + completion
+
+
+@dataclass
+class RateLimitStats:
+    """Counters of a ``RateLimiter`` in this process."""
+
+    acquired: int = 0
+    throttled: int = 0
+    waited: float = 0.0
+    paused: int = 0
+
+    def as_dict(self) -> dict[str, float]:
+        """Return the counters as a plain dict."""
+        return asdict(self)
+
+
+class RateLimiter:
+    """Requests- and tokens-per-minute buckets shared through a file."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        rpm: float = 0.0,
+        tpm: float = 0.0,
+        burst: float = 10.0,
+    ) -> None:
+        self.path = Path(path)
+        self.rpm = rpm  # 0: unlimited until learned from the headers
+        self.tpm = tpm
+        self.burst = burst
+        self.stats = RateLimitStats()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self) -> Iterator[State]:
+        """Yield the refilled shared state; save it if no error occurs."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open('a+', encoding='utf-8') as fh:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_EX)  # released on close
+                fh.seek(0)
+                raw = fh.read()
+                state: State = json.loads(raw) if raw.strip() else {}
+                self._refill(state, time.time())
+                yield state
+                fh.seek(0)
+                fh.truncate()
+                fh.write(json.dumps(state))
+
+    def _capacity(self, per_minute: float) -> float:
+        return max(1.0, per_minute * self.burst / 60.0)
+
+    def _refill(self, state: State, now: float) -> None:
+        state.setdefault('rpm', self.rpm)
+        state.setdefault('tpm', self.tpm)
+        state.setdefault('paused_until', 0.0)
+        elapsed = max(0.0, now - state.get('updated', now))
+        for bucket, limit in (('requests', 'rpm'), ('tokens', 'tpm')):
+            if state[limit] > 0:
+                capacity = self._capacity(state[limit])
+                level = state.get(bucket, capacity)
+                state[bucket] = min(
+                    capacity, level + elapsed * state[limit] / 60.0
+                )
+        state['updated'] = now
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Take one request and *tokens* if available.
+
+        Returns 0 on success, else the seconds to wait before trying again
+        (nothing is taken then). A cost above the bucket size is capped so
+        large prompts still go through once the bucket is full.
+        """
+        with self._state() as state:
+            now = state['updated']
+            if state['paused_until'] > now:
+                return state['paused_until'] - now
+            wait = 0.0
+            needs = (('requests', 'rpm', 1.0), ('tokens', 'tpm', tokens))
+            for bucket, limit, cost in needs:
+                if state[limit] > 0:
+                    cost = min(cost, self._capacity(state[limit]))
+                    missing = cost - state[bucket]
+                    if missing > 0:
+                        wait = max(wait, missing * 60.0 / state[limit])
+            if wait > 0:
+                return wait
+            for bucket, limit, cost in needs:
+                if state[limit] > 0:
+                    cost = min(cost, self._capacity(state[limit]))
+                    state[bucket] -= cost
+            return 0.0
+
+    def acquire(self, tokens: int, timeout: float | None = None) -> None:
+        """Block until *tokens* can be spent (TimeoutError after *timeout*)."""
+        waited = 0.0
+        while (wait := self.reserve(tokens)) > 0:
+            waited = self._throttle(wait, waited, timeout)
+            time.sleep(wait)
+        with self._lock:
+            self.stats.acquired += 1
+
+    async def aacquire(
+        self, tokens: int, timeout: float | None = None
+    ) -> None:
+        """Async ``acquire``; the state file is locked off the event loop."""
+        waited = 0.0
+        while (wait := await asyncio.to_thread(self.reserve, tokens)) > 0:
+            waited = self._throttle(wait, waited, timeout)
+            await asyncio.sleep(wait)
+        with self._lock:
+            self.stats.acquired += 1
+
+    def _throttle(
+        self, wait: float, waited: float, timeout: float | None
+    ) -> float:
+        if timeout is not None and waited + wait > timeout:
+            raise TimeoutError('Rate limit wait exceeds the call timeout')
+        with self._lock:
+            self.stats.throttled += 1
+            self.stats.waited += wait
+        return waited + wait
+
+    def settle(self, reserved: int, used: int | None) -> None:
+        """Correct the bucket once the billed token count is known."""
+        if used is None or used == reserved:
+            return
+        with self._state() as state:
+            if state['tpm'] > 0:
+                capacity = self._capacity(state['tpm'])
+                state['tokens'] = min(
+                    capacity, state['tokens'] + reserved - used
+                )
+
+    async def asettle(self, reserved: int, used: int | None) -> None:
+        """Async ``settle``, run off the event loop."""
+        if used is not None and used != reserved:
+            await asyncio.to_thread(self.settle, reserved, used)
+
+    async def aobserve(self, status: int, headers: Mapping[str, str]) -> None:
+        """Async ``observe``, run off the event loop."""
+        await asyncio.to_thread(self.observe, status, headers)
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> None:
+        """Adapt the shared buckets to an API response."""
+        pause = 0.0
+        if status == 429:
+            pause = max(
+                parse_reset(headers.get('retry-after')),
+                parse_reset(headers.get('x-ratelimit-reset-requests')),
+                parse_reset(headers.get('x-ratelimit-reset-tokens')),
+                1.0,
+            )
+        limits = (
+            ('requests', 'rpm', self.rpm),
+            ('tokens', 'tpm', self.tpm),
+        )
+        if not pause and not any(
+            f'x-ratelimit-limit-{bucket}' in headers for bucket, _, _ in limits
+        ):
+            return
+        with self._state() as state:
+            now = state['updated']
+            if pause:
+                state['paused_until'] = max(state['paused_until'], now + pause)
+                self.stats.paused += 1
+            for bucket, limit, configured in limits:
+                quota = _number(headers.get(f'x-ratelimit-limit-{bucket}'))
+                if quota:
+                    state[limit] = min(configured or quota, quota)
+                    state.setdefault(bucket, self._capacity(state[limit]))
+                remaining = _number(
+                    headers.get(f'x-ratelimit-remaining-{bucket}')
+                )
+                if remaining is not None and bucket in state:
+                    state[bucket] = min(state[bucket], remaining)
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _limiter_from_env() -> RateLimiter | None:
+    """Build the limiter described by the ``SDX_LLM_RATE*`` variables."""
+    rpm = float(os.getenv('SDX_LLM_RPM', '0'))
+    tpm = float(os.getenv('SDX_LLM_TPM', '0'))
+    enabled = os.getenv('SDX_LLM_RATE_LIMIT', '0').lower() in (
+        '1',
+        'true',
+        'yes',
+    )
+    if not (enabled or rpm or tpm):
+        return None
+    path = os.getenv(
+        'SDX_LLM_RATE_PATH', str(Path('data') / 'llm_ratelimit.json')
+    )
+    return RateLimiter(path, rpm=rpm, tpm=tpm)
+
+
+_UNSET: Any = object()
+_limiter: Any = _UNSET  # built from the environment on first use
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    """Return the active rate limiter (None when disabled)."""
+    global _limiter
+    if _limiter is _UNSET:
+        _limiter = _limiter_from_env()
+    limiter: RateLimiter | None = _limiter
+    return limiter
+
+
+def set_rate_limiter(limiter: RateLimiter | None) -> None:
+    """Install *limiter* as the active one (None disables limiting)."""
+    global _limiter
+    _limiter = limiter
+
+
+__all__ = [
+    'RateLimitStats',
+    'RateLimiter',
+    'estimate_tokens',
+    'get_rate_limiter',
+    'parse_reset',
+    'set_rate_limiter',
+]
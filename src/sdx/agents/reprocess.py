@@ -0,0 +1,235 @@
+"""
+Reprocess the raw LLM reply archive into a columnar table.
+
+``iter_archive_rows`` reads both archive layouts written by
+``dump_llm_json`` - loose ``<UTC>_<sid>.json`` files and gzip segments
+(see ``sdx.agents.archive``) - in a process pool, validates every reply
+with ``LLMDiagnosis`` and yields one row per reply::
+
+    {"sid", "ts", "source", "valid", "summary", "options", "scores",
+     "error"}
+
+``options`` always holds the option names; ``scores`` holds their
+probabilities when the reply used the ``{name: score}`` form. Replies are
+validated in bulk per work unit and only re-validated one by one when the
+batch contains an invalid reply.
+
+``reprocess_archive`` writes the rows to Parquet (``*.parquet``) or an
+Arrow IPC file (any other suffix) in record batches. It needs the optional
+``pyarrow`` package, imported on first use.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Tuple, Union
+
+from sdx.agents.archive import iter_segment
+from sdx.schema.clinical_outputs import LLMDiagnosis
+
+Row = Dict[str, Any]
+# ('segment', [path]) or ('files', [paths]): one task for the pool.
+WorkUnit = Tuple[str, List[str]]
+
+_FILES_PER_UNIT = 512
+
+
+@dataclass
+class ReprocessStats:
+    """Counters and timing of one ``reprocess_archive`` run."""
+
+    total: int = 0
+    valid: int = 0
+    invalid: int = 0
+    elapsed: float = 0.0
+
+
+def _row(sid: str, ts: str, source: str, raw: Union[str, bytes]) -> Row:
+    return {
+        'sid': sid,
+        'ts': ts,
+        'source': source,
+        'valid': False,
+        'summary': None,
+        'options': None,
+        'scores': None,
+        'error': None,
+        'raw': raw,
+    }
+
+
+def _fill(row: Row, diagnosis: LLMDiagnosis) -> None:
+    row['valid'] = True
+    if isinstance(diagnosis.options, dict):
+        row['options'] = list(diagnosis.options)
+        row['scores'] = list(diagnosis.options.values())
+    else:
+        row['options'] = diagnosis.options
+    row['summary'] = diagnosis.summary
+
+
+def _validate(rows: List[Row]) -> List[Row]:
+    """Validate the ``raw`` reply of *rows* in bulk, then drop it."""
+    try:
+        diagnoses = LLMDiagnosis.from_llm_many(row['raw'] for row in rows)
+    except ValueError:  # includes ValidationError
+        for row in rows:
+            try:
+                _fill(row, LLMDiagnosis.from_llm(row['raw']))
+            except ValueError as exc:
+                row['error'] = str(exc)
+    else:
+        for row, diagnosis in zip(rows, diagnoses):
+            _fill(row, diagnosis)
+    for row in rows:
+        del row['raw']
+    return rows
+
+
+def _parse_unit(unit: WorkUnit) -> List[Row]:
+    """Return the rows of one work unit (runs in worker processes)."""
+    kind, paths = unit
+    rows: List[Row] = []
+    for path in map(Path, paths):
+        if kind == 'segment':
+            rows.extend(
+                _row(record['sid'], record['ts'], path.name, record['raw'])
+                for record in iter_segment(path)
+            )
+        else:
+            ts, _, sid = path.stem.partition('_')
+            rows.append(_row(sid, ts, path.name, path.read_bytes()))
+    return _validate(rows)
+
+
+def _work_units(directory: Path) -> List[WorkUnit]:
+    units: List[WorkUnit] = [
+        ('segment', [str(path)])
+        for path in sorted(directory.glob('segment-*.jsonl.gz'))
+    ]
+    files = [str(path) for path in sorted(directory.glob('*_*.json'))]
+    for start in range(0, len(files), _FILES_PER_UNIT):
+        units.append(('files', files[start : start + _FILES_PER_UNIT]))
+    return units
+
+
+def iter_archive_rows(
+    directory: Union[str, Path], workers: int = 0
+) -> Iterator[Row]:
+    """
+    Yield one validated row per reply archived in *directory*.
+
+    Segments come first, then loose files, each in name order. Work units
+    run on *workers* processes (``<= 0``: one per CPU; ``1``: in this
+    process) with at most two units per worker in flight.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        raise FileNotFoundError(f'Archive directory not found: {directory}')
+    units = _work_units(directory)
+    workers = workers if workers > 0 else os.cpu_count() or 1
+    if workers == 1 or len(units) <= 1:
+        for unit in units:
+            yield from _parse_unit(unit)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: Deque[Future[List[Row]]] = deque()
+        for unit in units:
+            window.append(pool.submit(_parse_unit, unit))
+            if len(window) >= 2 * workers:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+
+
+def _arrow_schema(pa: Any) -> Any:
+    return pa.schema(
+        [
+            ('sid', pa.string()),
+            ('ts', pa.string()),
+            ('source', pa.string()),
+            ('valid', pa.bool_()),
+            ('summary', pa.string()),
+            ('options', pa.list_(pa.string())),
+            ('scores', pa.list_(pa.float64())),
+            ('error', pa.string()),
+        ]
+    )
+
+
+def reprocess_archive(
+    directory: Union[str, Path],
+    output: Union[str, Path],
+    *,
+    workers: int = 0,
+    batch_rows: int = 65536,
+) -> ReprocessStats:
+    """
+    Write every reply archived in *directory* to a columnar *output*.
+
+    Parameters
+    ----------
+    directory
+        Archive directory (``data/llm_raw`` by default in ``client``).
+    output
+        Target file: Parquet if it ends in ``.parquet``, else Arrow IPC.
+    workers
+        Parsing processes (``<= 0``: one per CPU).
+    batch_rows
+        Rows per record batch written.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError as exc:
+        raise ImportError(
+            'reprocess_archive needs the optional "pyarrow" package.'
+        ) from exc
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    schema = _arrow_schema(pa)
+    if output.suffix == '.parquet':
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(output, schema)
+    else:
+        writer = pa.ipc.new_file(str(output), schema)
+
+    stats = ReprocessStats()
+    started = time.perf_counter()
+    batch: List[Row] = []
+    try:
+        for row in iter_archive_rows(directory, workers):
+            stats.total += 1
+            if row['valid']:
+                stats.valid += 1
+            else:
+                stats.invalid += 1
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_batch(
+                    pa.RecordBatch.from_pylist(batch, schema=schema)
+                )
+                batch = []
+        if batch:
+            writer.write_batch(
+                pa.RecordBatch.from_pylist(batch, schema=schema)
+            )
+    finally:
+        writer.close()
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+__all__ = [
+    'ReprocessStats',
+    'iter_archive_rows',
+    'reprocess_archive',
+]
@@ -0,0 +1,367 @@
+"""
+Deadlines, retries and hedged requests for LLM calls.
+
+``run`` / ``arun`` call an *attempt* function (which receives the seconds
+it may take) until it succeeds, under a ``RetryPolicy``:
+
+* every attempt gets ``timeout`` seconds, never more than what is left of
+  the whole-call ``deadline``;
+* transient API errors (timeouts, connection errors, 408/409/429/5xx) and,
+  with ``retry_invalid``, replies failing ``LLMDiagnosis`` validation are
+  retried after an exponential backoff with full jitter (at least the
+  server's ``Retry-After``);
+* with ``hedge`` on, an attempt still running after ``hedge_after``
+  seconds - or the p95 of recent call latencies when unset - gets a twin
+  request, and the first valid answer wins.
+
+The policy comes from ``SDX_LLM_ATTEMPTS`` (default 3),
+``SDX_LLM_TIMEOUT`` (seconds per attempt, default 60),
+``SDX_LLM_DEADLINE`` (seconds per call, default none), ``SDX_LLM_HEDGE``
+(``1`` to enable) and ``SDX_LLM_HEDGE_AFTER``; ``set_retry_policy``
+replaces it at runtime and ``use_retry_policy`` overrides it for the
+calls made in one context (thread or asyncio task), e.g. to turn retries
+off under a caller that retries by itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from pydantic import ValidationError
+
+T = TypeVar('T')
+# evaluated at import time, so no PEP 604 unions (Python 3.9)
+Attempt = Callable[[Optional[float]], T]
+
+# asyncio.wait_for raises asyncio.TimeoutError, not the builtin, before 3.11
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError)
+
+_MIN_LATENCY_SAMPLES = 20
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How long, how often and how redundantly to call the LLM."""
+
+    attempts: int = 3
+    timeout: float | None = 60.0
+    deadline: float | None = None
+    backoff: float = 0.5
+    max_backoff: float = 8.0
+    retry_invalid: bool = True
+    hedge: bool = False
+    hedge_after: float | None = None
+
+    @classmethod
+    def from_env(cls) -> RetryPolicy:
+        """Build the policy described by the ``SDX_LLM_*`` variables."""
+        timeout = float(os.getenv('SDX_LLM_TIMEOUT', '60'))
+        deadline = float(os.getenv('SDX_LLM_DEADLINE', '0'))
+        hedge_after = os.getenv('SDX_LLM_HEDGE_AFTER')
+        return cls(
+            attempts=max(1, int(os.getenv('SDX_LLM_ATTEMPTS', '3'))),
+            timeout=timeout or None,
+            deadline=deadline or None,
+            hedge=os.getenv('SDX_LLM_HEDGE', '0').lower()
+            in ('1', 'true', 'yes'),
+            hedge_after=float(hedge_after) if hedge_after else None,
+        )
+
+
+@dataclass
+class RetryStats:
+    """Counters of the retry layer."""
+
+    calls: int = 0
+    retries: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    failures: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        """Return the counters as a plain dict."""
+        return asdict(self)
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful attempts."""
+
+    def __init__(self, size: int = 256) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        """Record one attempt latency."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Return the *q* quantile, or None with too few samples."""
+        with self._lock:
+            if len(self._samples) < _MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+stats = RetryStats()
+latencies = LatencyWindow()
+
+_UNSET: Any = object()
+_policy: Any = _UNSET  # built from the environment on first use
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_scoped: ContextVar[RetryPolicy | None] = ContextVar(
+    'sdx_retry_policy', default=None
+)
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Return the active retry policy."""
+    global _policy
+    scoped = _scoped.get()
+    if scoped is not None:
+        return scoped
+    if _policy is _UNSET:
+        _policy = RetryPolicy.from_env()
+    policy: RetryPolicy = _policy
+    return policy
+
+
+def set_retry_policy(policy: RetryPolicy | None) -> None:
+    """Install *policy* (None: rebuild from the environment on next use)."""
+    global _policy
+    _policy = _UNSET if policy is None else policy
+
+
+@contextmanager
+def use_retry_policy(policy: RetryPolicy) -> Iterator[RetryPolicy]:
+    """Apply *policy* to the calls made in the enclosed block only."""
+    token = _scoped.set(policy)
+    try:
+        yield policy
+    finally:
+        _scoped.reset(token)
+
+
+def is_retryable(exc: BaseException, policy: RetryPolicy) -> bool:
+    """Return true if a call failing with *exc* is worth another try."""
+    if isinstance(exc, ValidationError):
+        return policy.retry_invalid
+    if isinstance(exc, TIMEOUT_ERRORS):
+        return True
+    import openai
+
+    if isinstance(exc, openai.APIConnectionError):  # includes timeouts
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc: BaseException) -> float:
+    """Return the server-requested wait of *exc* in seconds (0 if none)."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('retry-after', 0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def backoff_delay(
+    policy: RetryPolicy, retry: int, exc: BaseException | None = None
+) -> float:
+    """Return the wait before retry number *retry* (0-based)."""
+    ceiling = min(policy.max_backoff, policy.backoff * 2**retry)
+    delay = random.uniform(0.0, ceiling)  # full jitter
+    return max(delay, _retry_after(exc)) if exc is not None else delay
+
+
+def _hedge_delay(policy: RetryPolicy) -> float | None:
+    if not policy.hedge:
+        return None
+    if policy.hedge_after is not None:
+        return policy.hedge_after
+    return latencies.quantile(0.95)
+
+
+class _Clock:
+    """Deadline bookkeeping of one call."""
+
+    def __init__(self, policy: RetryPolicy) -> None:
+        self.policy = policy
+        self.started = time.monotonic()
+
+    def remaining(self) -> float | None:
+        if self.policy.deadline is None:
+            return None
+        return self.policy.deadline - (time.monotonic() - self.started)
+
+    def timeout(self) -> float | None:
+        """Return the budget of the next attempt."""
+        remaining = self.remaining()
+        if remaining is None:
+            return self.policy.timeout
+        if self.policy.timeout is None:
+            return remaining
+        return min(self.policy.timeout, remaining)
+
+    def can_wait(self, delay: float) -> bool:
+        remaining = self.remaining()
+        return remaining is None or delay < remaining
+
+
+def _thread_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(thread_name_prefix='sdx-llm-hedge')
+        return _pool
+
+
+def _hedged(attempt: Attempt[T], timeout: float | None, delay: float) -> T:
+    """Run *attempt*, adding a twin if it is not done after *delay*."""
+    pool = _thread_pool()
+    first = pool.submit(attempt, timeout)
+    done, _ = wait_futures([first], timeout=delay)
+    if done:
+        return first.result()
+    stats.hedges += 1
+    second = pool.submit(attempt, timeout)
+    pending: set[Future[T]] = {first, second}
+    while pending:
+        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    stats.hedge_wins += 1
+                return future.result()
+    return first.result()  # both failed: raise the primary's error
+
+
+async def _ahedged(
+    attempt: Attempt[Awaitable[T]], timeout: float | None, delay: float
+) -> T:
+    """Async ``_hedged``; the losing request is cancelled."""
+    first = asyncio.ensure_future(attempt(timeout))
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        stats.hedges += 1
+        second = asyncio.ensure_future(attempt(timeout))
+        pending.add(second)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        stats.hedge_wins += 1
+                    return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    return first.result()  # both failed: raise the primary's error
+
+
+def run(attempt: Attempt[T], policy: RetryPolicy | None = None) -> T:
+    """Call ``attempt(timeout)`` under *policy* (default: the active one)."""
+    policy = policy or get_retry_policy()
+    clock = _Clock(policy)
+    stats.calls += 1
+    for retry in range(policy.attempts):
+        timeout = clock.timeout()
+        started = time.monotonic()
+        try:
+            if timeout is not None and timeout <= 0:
+                raise TimeoutError('LLM call deadline exceeded')
+            delay = _hedge_delay(policy)
+            result = (
+                attempt(timeout)
+                if delay is None
+                else _hedged(attempt, timeout, delay)
+            )
+        except Exception as exc:
+            wait = backoff_delay(policy, retry, exc)
+            if (
+                retry + 1 >= policy.attempts
+                or not is_retryable(exc, policy)
+                or not clock.can_wait(wait)
+            ):
+                stats.failures += 1
+                raise
+            stats.retries += 1
+            time.sleep(wait)
+            continue
+        latencies.add(time.monotonic() - started)
+        return result
+    raise AssertionError('unreachable')  # pragma: no cover
+
+
+async def arun(
+    attempt: Attempt[Awaitable[T]], policy: RetryPolicy | None = None
+) -> T:
+    """Async ``run``; each attempt is also cancelled at its timeout."""
+    policy = policy or get_retry_policy()
+    clock = _Clock(policy)
+    stats.calls += 1
+    for retry in range(policy.attempts):
+        timeout = clock.timeout()
+        started = time.monotonic()
+        try:
+            if timeout is not None and timeout <= 0:
+                raise TimeoutError('LLM call deadline exceeded')
+            delay = _hedge_delay(policy)
+            call = (
+                attempt(timeout)
+                if delay is None
+                else _ahedged(attempt, timeout, delay)
+            )
+            result = await asyncio.wait_for(call, timeout)
+        except Exception as exc:
+            wait = backoff_delay(policy, retry, exc)
+            if (
+                retry + 1 >= policy.attempts
+                or not is_retryable(exc, policy)
+                or not clock.can_wait(wait)
+            ):
+                stats.failures += 1
+                raise
+            stats.retries += 1
+            await asyncio.sleep(wait)
+            continue
+        latencies.add(time.monotonic() - started)
+        return result
+    raise AssertionError('unreachable')  # pragma: no cover
+
+
+__all__ = [
+    'TIMEOUT_ERRORS',
+    'LatencyWindow',
+    'RetryPolicy',
+    'RetryStats',
+    'arun',
+    'backoff_delay',
+    'get_retry_policy',
+    'is_retryable',
+    'latencies',
+    'run',
+    'set_retry_policy',
+    'stats',
+    'use_retry_policy',
+]
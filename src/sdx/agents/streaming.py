@@ -0,0 +1,166 @@
+"""
+Incremental parsing of streamed ``LLMDiagnosis`` JSON.
+
+The model streams a JSON object token by token. ``DiagnosisStreamParser``
+scans each chunk once, so ``summary`` text and finished ``options``
+entries can be shown to the physician long before the reply is complete.
+"""
+
+from __future__ import annotations
+
+import json
+
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+_ESCAPES = {
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+
+@dataclass
+class StreamEvent:
+    """One incremental update: ``summary`` delta, ``option``, ``done``."""
+
+    event: str
+    data: Any
+
+    def to_sse(self) -> str:
+        """Return the event encoded as a Server-Sent-Events frame."""
+        payload = json.dumps(self.data, ensure_ascii=False)
+        return f'event: {self.event}\ndata: {payload}\n\n'
+
+
+def _text(chars: List[str]) -> str:
+    """Join decoded string characters, pairing UTF-16 surrogates."""
+    joined = ''.join(chars)
+    return joined.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+
+
+class DiagnosisStreamParser:
+    """
+    Turn streamed JSON text into ``StreamEvent`` updates.
+
+    Every character is scanned once: the parser keeps the open containers,
+    the current top-level key and the string being generated between
+    chunks, so a whole reply costs linear time. Options are emitted as soon
+    as their string is closed, both from an ``options`` array and from the
+    keys of an ``options`` ``{name: probability}`` object. Text before the
+    root object (e.g. a Markdown fence) and after it is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[str] = []
+        self._stack: List[str] = []  # open containers: '{' or '['
+        self._root_key: Optional[str] = None  # current key of the root
+        self._want_key = False
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._target = ''  # open string: 'key', 'summary', 'option' or ''
+        self._chars: List[str] = []
+        self._escape: Optional[str] = None  # pending escape, e.g. 'u00'
+        self._summary_sent = 0
+
+    @property
+    def buffer(self) -> str:
+        """Return the raw text received so far."""
+        return ''.join(self._chunks)
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        """Consume *chunk* and return the new events it unlocks."""
+        self._chunks.append(chunk)
+        events: List[StreamEvent] = []
+        for ch in chunk:
+            if self._in_string:
+                self._string_char(ch, events)
+            elif not self._done:
+                self._structural(ch)
+        if self._in_string and self._target == 'summary':
+            self._flush_summary(events, final=False)
+        return events
+
+    def _structural(self, ch: str) -> None:
+        """Track containers and keys outside strings."""
+        stack = self._stack
+        if ch == '"':
+            if stack:
+                self._open_string(stack[-1] == '{' and self._want_key)
+                self._want_key = False
+        elif ch == '{' or (ch == '[' and stack):
+            self._started = True
+            stack.append(ch)
+            self._want_key = ch == '{'
+        elif ch in '}]' and stack:
+            stack.pop()
+            self._want_key = False
+            self._done = not stack
+        elif ch == ',' and stack:
+            self._want_key = stack[-1] == '{'
+
+    def _open_string(self, is_key: bool) -> None:
+        """Start a string and decide whether its text is needed."""
+        depth = len(self._stack)
+        options = depth == 2 and self._root_key == 'options'
+        if is_key:
+            if depth == 1:
+                self._target = 'key'
+            elif options and self._stack[1] == '{':
+                self._target = 'option'
+        elif depth == 1 and self._root_key == 'summary':
+            self._target = 'summary'
+        elif options and self._stack[1] == '[':
+            self._target = 'option'
+        self._in_string = True
+        self._chars = []
+        self._escape = None
+
+    def _string_char(self, ch: str, events: List[StreamEvent]) -> None:
+        """Decode one character of the open string."""
+        if self._escape is not None:
+            if self._escape or ch == 'u':
+                self._escape += ch
+                if len(self._escape) == 5:
+                    try:
+                        self._chars.append(chr(int(self._escape[1:], 16)))
+                    except ValueError:
+                        pass
+                    self._escape = None
+            else:
+                self._chars.append(_ESCAPES.get(ch, ch))
+                self._escape = None
+        elif ch == '\\':
+            self._escape = ''
+        elif ch == '"':
+            self._close_string(events)
+        elif self._target:
+            self._chars.append(ch)
+
+    def _close_string(self, events: List[StreamEvent]) -> None:
+        """Emit what the finished string unlocks."""
+        if self._target == 'key':
+            self._root_key = _text(self._chars)
+        elif self._target == 'option':
+            events.append(StreamEvent('option', _text(self._chars)))
+        elif self._target == 'summary':
+            self._flush_summary(events, final=True)
+        self._in_string = False
+        self._target = ''
+        self._chars = []
+
+    def _flush_summary(self, events: List[StreamEvent], final: bool) -> None:
+        """Emit the summary text decoded since the last flush."""
+        end = len(self._chars)
+        if not final and end and '\ud800' <= self._chars[-1] <= '\udbff':
+            end -= 1  # wait for the low half of a surrogate pair
+        if end > self._summary_sent:
+            delta = _text(self._chars[self._summary_sent : end])
+            events.append(StreamEvent('summary', delta))
+            self._summary_sent = end
+
+
+__all__ = ['DiagnosisStreamParser', 'StreamEvent']
@@ -2,7 +2,51 @@
 
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
+import re
+
+from typing import Iterable, Union
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+LLMReply = Union[str, bytes, bytearray, memoryview]
+
+# Opening fence with an optional language tag; the closing one is checked
+# separately, so truncated (or only closed) replies are unwrapped too.
+_OPEN_FENCE = r'\s*```[A-Za-z]*'
+_OPEN_FENCE_STR = re.compile(_OPEN_FENCE)
+_OPEN_FENCE_BYTES = re.compile(_OPEN_FENCE.encode('ascii'))
+
+
+def strip_fences(text: LLMReply) -> Union[str, bytes, bytearray]:
+    """
+    Return *text* without its Markdown code fences.
+
+    A leading ```` ```json ```` (or bare ```` ``` ````) fence and a
+    trailing ```` ``` ```` are removed independently, so a reply cut off
+    before its closing fence still parses. Unfenced input is returned as
+    is (JSON parsers ignore surrounding whitespace); otherwise only the
+    body is copied. A ``memoryview`` is always copied once, since the JSON
+    validator does not accept one.
+    """
+    if isinstance(text, memoryview):
+        text = text.tobytes()
+    if isinstance(text, str):
+        if '```' not in text:
+            return text
+        match = _OPEN_FENCE_STR.match(text)
+        start = match.end() if match else 0
+        end = max(start, len(text.rstrip()))
+        if end - 3 >= start and text.endswith('```', start, end):
+            end -= 3
+    else:
+        if b'```' not in text:
+            return text
+        found = _OPEN_FENCE_BYTES.match(text)
+        start = found.end() if found else 0
+        end = max(start, len(text.rstrip()))
+        if end - 3 >= start and text.endswith(b'```', start, end):
+            end -= 3
+    return text if (start, end) == (0, len(text)) else text[start:end]
 
 
 class LLMDiagnosis(BaseModel):
@@ -12,12 +56,34 @@ class LLMDiagnosis(BaseModel):
     options: list[str] | dict[str, float]
 
     @classmethod
-    def from_llm(cls, text: str) -> 'LLMDiagnosis':
+    def from_llm(cls, text: LLMReply) -> 'LLMDiagnosis':
         """Parse a JSON string generated by our medical LLM."""
-        cleaned = (
-            text.strip().lstrip('```json').lstrip('```').rstrip('```').strip()
+        return cls.model_validate_json(strip_fences(text))
+
+    @classmethod
+    def from_llm_many(cls, texts: Iterable[LLMReply]) -> list[LLMDiagnosis]:
+        """
+        Parse many replies with a single validator call.
+
+        Faster than ``from_llm`` per reply for bulk workloads, but one
+        invalid reply fails the whole call (a ``ValidationError`` location
+        holds its index); fall back to ``from_llm`` to isolate it.
+        """
+        parts = []
+        for text in texts:
+            part = strip_fences(text)
+            parts.append(
+                part.encode('utf-8') if isinstance(part, str) else part
+            )
+        diagnoses = _DIAGNOSIS_LIST.validate_json(
+            b'[' + b','.join(parts) + b']'
         )
-        return cls.model_validate_json(cleaned)
+        if len(diagnoses) != len(parts):  # e.g. a reply like '{...},{...}'
+            raise ValueError('A reply holds more than one JSON value.')
+        return diagnoses
+
+
+_DIAGNOSIS_LIST = TypeAdapter(list[LLMDiagnosis])
 
 
-__all__ = ['LLMDiagnosis']
+__all__ = ['LLMDiagnosis', 'LLMReply', 'strip_fences']
@@ -54,3 +54,60 @@ def api_key_openai(env: dict[str, str | None]) -> str:
         )
 
     return api_key
+
+
+def _pdf_bytes(pages: list[str]) -> bytes:
+    """Return a minimal PDF with one line of Helvetica text per page."""
+    count = len(pages)
+    font = 3 + 2 * count
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids ['
+        + b' '.join(b'%d 0 R' % (3 + 2 * i) for i in range(count))
+        + b'] /Count %d >>' % count,
+    ]
+    for i, text in enumerate(pages):
+        escaped = (
+            text.replace('\\', '\\\\')
+            .replace('(', '\\(')
+            .replace(')', '\\)')
+            .encode('latin-1')
+        )
+        stream = (
+            b'BT /F1 12 Tf 72 720 Td (%s) Tj ET' % escaped if text else b''
+        )
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]'
+            b' /Resources << /Font << /F1 %d 0 R >> >>'
+            b' /Contents %d 0 R >>' % (font, 4 + 2 * i)
+        )
+        objects.append(
+            b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream)
+        )
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+@pytest.fixture
+def make_pdf(tmp_path: Path):
+    """Return a factory writing a PDF whose pages hold the given text."""
+
+    def build(pages: list[str], name: str = 'report.pdf') -> Path:
+        path = tmp_path / name
+        path.write_bytes(_pdf_bytes(pages))
+        return path
+
+    return build
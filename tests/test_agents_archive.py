@@ -0,0 +1,102 @@
+"""Tests for the background raw-reply archive."""
+
+from __future__ import annotations
+
+import gzip
+
+from sdx.agents import archive, client
+
+
+def test_records_are_batched_into_one_segment(tmp_path):
+    """Submitted replies land in a gzip segment with an index entry."""
+    writer = archive.SegmentArchive(tmp_path, flush_interval=60)
+    for i in range(5):
+        writer.submit(f'{{"n": {i}}}', sid=f'sid-{i}')
+
+    assert writer.flush(timeout=5)
+    writer.close()
+
+    segments = list(tmp_path.glob('segment-*.jsonl.gz'))
+    assert len(segments) == 1
+    records = list(archive.iter_segment(segments[0]))
+    assert [r['raw'] for r in records] == [f'{{"n": {i}}}' for i in range(5)]
+    entries = list(archive.iter_index(tmp_path))
+    assert [e['sid'] for e in entries] == [f'sid-{i}' for i in range(5)]
+
+
+def test_index_points_at_individual_records(tmp_path):
+    """read_record decodes only the gzip member holding the entry."""
+    writer = archive.SegmentArchive(tmp_path, flush_interval=60)
+    for i in range(3):
+        writer.submit(f'reply {i}\u2028', sid=f'sid-{i}')
+        writer.flush(timeout=5)
+    writer.close()
+
+    entries = list(archive.iter_index(tmp_path))
+    assert len({e['offset'] for e in entries}) == 3
+    record = archive.read_record(tmp_path, entries[1])
+    assert record == {
+        'sid': 'sid-1',
+        'ts': entries[1]['ts'],
+        'raw': 'reply 1\u2028',
+    }
+
+
+def test_segments_rotate_by_size(tmp_path):
+    """A full segment is closed and a new one started."""
+    writer = archive.SegmentArchive(
+        tmp_path, max_segment_bytes=1, flush_interval=60
+    )
+    for i in range(3):
+        writer.submit('x' * 100, sid=str(i))
+        writer.flush(timeout=5)
+    writer.close()
+
+    segments = sorted(tmp_path.glob('segment-*.jsonl.gz'))
+    assert len(segments) == 3
+    with gzip.open(segments[0], 'rt') as fh:
+        assert len(fh.readlines()) == 1
+
+
+def test_dump_llm_json_uses_segments_by_default(tmp_path, monkeypatch):
+    """The default archive mode writes no per-reply files."""
+    monkeypatch.setattr(client, '_RAW_DIR', tmp_path)
+    monkeypatch.setattr(client, '_ARCHIVE_MODE', 'segments')
+
+    client.dump_llm_json('{"summary": "s"}', 'abc')
+    archive.get_archive(tmp_path).flush(timeout=5)
+
+    assert not list(tmp_path.glob('*.json'))
+    (entry,) = archive.iter_index(tmp_path)
+    assert entry['sid'] == 'abc'
+
+
+def test_write_errors_do_not_stop_the_writer(tmp_path, monkeypatch):
+    """A failed batch is counted and later batches are still written."""
+    writer = archive.SegmentArchive(tmp_path, flush_interval=60)
+    real_append = writer._append
+
+    def failing_append(records):
+        monkeypatch.setattr(writer, '_append', real_append)
+        raise OSError('disk full')
+
+    monkeypatch.setattr(writer, '_append', failing_append)
+    writer.submit('lost', sid='a')
+    assert writer.flush(timeout=5)
+    writer.submit('kept', sid='b')
+    assert writer.flush(timeout=5)
+    writer.close()
+
+    assert writer.stats.as_dict() == {'written': 1, 'failed': 1, 'dropped': 0}
+    assert [e['sid'] for e in archive.iter_index(tmp_path)] == ['b']
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    """Replies beyond max_queue are dropped and counted."""
+    writer = archive.SegmentArchive(tmp_path, flush_interval=60, max_queue=2)
+    writer.close()  # no writer left to drain the queue
+    for n in range(3):
+        writer.submit(str(n))
+
+    assert writer.stats.dropped == 1
+    assert not writer.flush(timeout=0.05)
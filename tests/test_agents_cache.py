@@ -0,0 +1,97 @@
+"""Tests for the LLM response cache backends."""
+
+from __future__ import annotations
+
+import pytest
+
+from sdx.agents.cache import MemoryCache, SQLiteCache, cache_key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    """Return a factory building the parametrized backend."""
+
+    def factory(**kwargs):
+        if request.param == 'memory':
+            return MemoryCache(**kwargs)
+        return SQLiteCache(tmp_path / 'cache.sqlite3', **kwargs)
+
+    return factory
+
+
+def test_cache_key_ignores_key_order():
+    """Canonicalized JSON makes dict ordering irrelevant."""
+    a = cache_key('m', 'sys', '{"age": 1, "sex": "F"}', 'en')
+    b = cache_key('m', 'sys', '{"sex": "F", "age": 1}', 'en')
+
+    assert a == b
+    assert a != cache_key('m', 'sys', '{"age": 1, "sex": "F"}', 'pt')
+    assert a != cache_key('other', 'sys', '{"age": 1, "sex": "F"}', 'en')
+
+
+def test_hit_and_miss_counters(make_cache):
+    """Lookups update the hit/miss counters."""
+    cache = make_cache()
+
+    assert cache.get('k') is None
+    cache.set('k', 'v')
+    assert cache.get('k') == 'v'
+
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.hit_ratio == 0.5
+
+
+def test_ttl_expiry(make_cache, monkeypatch):
+    """Entries older than the TTL are dropped."""
+    cache = make_cache(ttl=10)
+    clock = [1000.0]
+    monkeypatch.setattr('sdx.agents.cache.time.time', lambda: clock[0])
+
+    cache.set('k', 'v')
+    clock[0] += 11
+
+    assert cache.get('k') is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction(make_cache, monkeypatch):
+    """The least recently used entry is evicted first."""
+    cache = make_cache(maxsize=2)
+    clock = [1000.0]
+    monkeypatch.setattr('sdx.agents.cache.time.time', lambda: clock[0])
+
+    for key in ('a', 'b'):
+        cache.set(key, key)
+        clock[0] += 1
+    cache.get('a')
+    clock[0] += 1
+    cache.set('c', 'c')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a'
+    assert cache.get('c') == 'c'
+    assert cache.stats.evictions == 1
+
+
+def test_sqlite_cache_counts_rows_every_few_inserts(tmp_path):
+    """The table is not scanned on every insert, and stays bounded."""
+    cache = SQLiteCache(tmp_path / 'cache.sqlite3', maxsize=500)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    for n in range(520):
+        cache.set(str(n), 'v')
+
+    counts = [sql for sql in statements if 'COUNT' in sql]
+    assert len(counts) == 520 // 5
+    assert len(cache) == 500
+    assert cache.stats.evictions == 20
+
+
+def test_sqlite_cache_persists(tmp_path):
+    """A new SQLiteCache on the same file sees earlier entries."""
+    path = tmp_path / 'cache.sqlite3'
+    SQLiteCache(path).set('k', 'v')
+
+    assert SQLiteCache(path).get('k') == 'v'
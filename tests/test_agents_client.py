@@ -0,0 +1,270 @@
+"""Tests for the shared OpenAI client helpers."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import weakref
+
+from types import SimpleNamespace
+
+import pytest
+
+from sdx.agents import cache, client, metrics, retry
+from sdx.agents.diagnostics import core as diag
+
+REPLY = json.dumps({'summary': 'Short summary.', 'options': ['Flu', 'Cold']})
+
+
+def _completion(content: str) -> SimpleNamespace:
+    """Build an object shaped like an OpenAI chat completion."""
+    message = SimpleNamespace(content=content)
+    usage = SimpleNamespace(prompt_tokens=50, completion_tokens=10)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message)], usage=usage
+    )
+
+
+class FakeAsyncCompletions:
+    """Async ``chat.completions`` stub that tracks concurrency."""
+
+    def __init__(self, reply: str = REPLY, delay: float = 0.01) -> None:
+        self.reply = reply
+        self.delay = delay
+        self.calls: list[dict] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, **kwargs):
+        """Return a canned completion after a short delay."""
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return _completion(self.reply)
+
+
+@pytest.fixture(autouse=True)
+def raw_dir(tmp_path, monkeypatch):
+    """Redirect raw LLM dumps to a temporary directory."""
+    monkeypatch.setattr(client, '_RAW_DIR', tmp_path)
+    monkeypatch.setattr(client, '_ARCHIVE_MODE', 'files')
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    """Disable the response cache unless a test installs one."""
+    monkeypatch.setattr(cache, '_cache', None)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """Retry without backoff so failing replies do not slow the suite."""
+    monkeypatch.setattr(
+        retry, '_policy', retry.RetryPolicy(attempts=2, backoff=0.0)
+    )
+
+
+@pytest.fixture(autouse=True)
+def llm_metrics(monkeypatch):
+    """Collect call metrics in a fresh registry."""
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    return registry
+
+
+@pytest.fixture
+def fake_async(monkeypatch):
+    """Replace the pooled async client with a stub."""
+    completions = FakeAsyncCompletions()
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(client, '_build_async_client', lambda _: fake)
+    monkeypatch.setattr(client, '_async_pool', weakref.WeakKeyDictionary())
+    return completions
+
+
+def test_achat_returns_validated_diagnosis(fake_async, raw_dir):
+    """The async chat parses the reply and archives the raw JSON."""
+    result = asyncio.run(client.achat('sys', 'usr', session_id='abc'))
+
+    assert result.summary == 'Short summary.'
+    assert result.options == ['Flu', 'Cold']
+    assert fake_async.calls[0]['messages'][1] == {
+        'role': 'user',
+        'content': 'usr',
+    }
+    assert list(raw_dir.glob('*_abc.json'))
+
+
+def test_achat_respects_concurrency_limit(fake_async, monkeypatch):
+    """No more than max_concurrency calls are in flight at once."""
+    monkeypatch.setattr(client, '_pool_limits', {})
+    client.configure_async_client(max_concurrency=3)
+
+    async def run() -> None:
+        await asyncio.gather(*(client.achat('s', 'u') for _ in range(12)))
+
+    asyncio.run(run())
+
+    assert len(fake_async.calls) == 12
+    assert fake_async.peak == 3
+
+
+def test_configure_async_client_closes_old_clients(monkeypatch):
+    """Rebuilding the pool closes the clients it replaces."""
+    closed = []
+
+    def pooled(name):
+        async def close():
+            closed.append(name)
+
+        return SimpleNamespace(close=close), asyncio.Semaphore()
+
+    idle = asyncio.new_event_loop()
+    pool = weakref.WeakKeyDictionary({idle: pooled('idle')})
+    monkeypatch.setattr(client, '_async_pool', pool)
+    monkeypatch.setattr(client, '_pool_limits', {})
+
+    async def reconfigure_while_running():
+        pool[asyncio.get_running_loop()] = pooled('running')
+        client.configure_async_client(max_connections=5)
+        await asyncio.sleep(0)
+
+    client.configure_async_client(max_connections=10)
+    asyncio.run(reconfigure_while_running())
+    idle.close()
+
+    assert closed == ['idle', 'running']
+    assert not pool
+
+
+def test_adifferential_uses_language_prompt(fake_async):
+    """Async differential sends the localized prompt and patient JSON."""
+    patient = {'age': 40, 'symptoms': 'tosse'}
+    asyncio.run(diag.adifferential(patient, language='pt'))
+
+    messages = fake_async.calls[0]['messages']
+    assert messages[0]['content'] == diag._DIAG_PROMPTS['pt']
+    assert json.loads(messages[1]['content']) == patient
+
+
+def test_cache_prefix_is_shared_and_opt_in(fake_async, monkeypatch):
+    """The prefix is shared by every step and language, and opt-in."""
+    patient = {'age': 40}
+    assert diag.differential_prompt(patient)[0] == diag._DIAG_PROMPTS['en']
+
+    monkeypatch.setenv('SDX_LLM_PROMPT_PREFIX', '1')
+    asyncio.run(diag.adifferential(patient, language='pt'))
+    system, _ = diag.exams_prompt(['Flu'], 'fr')
+
+    sent = fake_async.calls[0]['messages']
+    # Every word is at least one token, so the prefix alone reaches the
+    # provider's 1024-token minimum for prompt caching.
+    assert len(re.findall(r'\w+', diag._PREFIX)) >= 1024
+    assert '"options": {' not in diag._PREFIX  # list form only
+    assert sent[0]['content'].startswith(diag._PREFIX)
+    assert sent[0]['content'].endswith(diag._DIAG_PROMPTS['pt'])
+    assert json.loads(sent[1]['content']) == patient
+    assert system.startswith(diag._PREFIX)
+    assert system.endswith(diag._EXAM_PROMPTS['fr'])
+    assert (
+        diag.exams_prompt(['Flu'], cache_prefix=False)[0]
+        == (diag._EXAM_PROMPTS['en'])
+    )
+
+
+def test_cache_prefix_is_threaded_through_calls(fake_async, monkeypatch):
+    """``cache_prefix`` on the call overrides the environment."""
+    monkeypatch.setenv('SDX_LLM_PROMPT_PREFIX', '0')
+    asyncio.run(diag.aexams(['Flu'], cache_prefix=True))
+    monkeypatch.setenv('SDX_LLM_PROMPT_PREFIX', '1')
+    asyncio.run(diag.adifferential({'age': 40}, cache_prefix=False))
+
+    exams_system = fake_async.calls[0]['messages'][0]['content']
+    assert exams_system.startswith(diag._PREFIX)
+    assert (
+        fake_async.calls[1]['messages'][0]['content']
+        == (diag._DIAG_PROMPTS['en'])
+    )
+
+
+def test_cache_prefix_flag_read_from_env_file(tmp_path, monkeypatch):
+    """The first prompt already honours the flag set in .envs/.env."""
+    env_file = tmp_path / '.env'
+    env_file.write_text('SDX_LLM_PROMPT_PREFIX=1\n')
+    monkeypatch.setattr(client, '_ENV_FILE', env_file)
+    monkeypatch.setattr(client, '_env_loaded', False)
+    monkeypatch.setenv('SDX_LLM_PROMPT_PREFIX', '')
+    monkeypatch.delenv('SDX_LLM_PROMPT_PREFIX')
+
+    system, _ = diag.differential_prompt({'age': 40})
+
+    assert system.startswith(diag._PREFIX)
+
+
+def test_aexams_invalid_reply_raises_422(fake_async):
+    """An invalid LLM reply surfaces as an HTTP 422."""
+    from fastapi import HTTPException
+
+    fake_async.reply = json.dumps({'summary': 'missing options'})
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(diag.aexams(['Flu']))
+
+    assert exc_info.value.status_code == 422
+    assert len(fake_async.calls) == 2
+
+
+def test_achat_retries_invalid_reply(fake_async):
+    """An invalid reply is retried and the next valid one returned."""
+    replies = [json.dumps({'summary': 'no options'}), REPLY]
+
+    async def create(**kwargs):
+        fake_async.calls.append(kwargs)
+        return _completion(replies.pop(0))
+
+    fake_async.create = create
+
+    result = asyncio.run(client.achat('sys', 'usr'))
+
+    assert result.options == ['Flu', 'Cold']
+    assert len(fake_async.calls) == 2
+    assert fake_async.calls[0]['timeout'] == 60.0
+
+
+def test_achat_metrics_per_endpoint(fake_async, llm_metrics, monkeypatch):
+    """Tokens of every attempt and cache hits are recorded per step."""
+    monkeypatch.setattr(cache, '_cache', cache.MemoryCache())
+    replies = [json.dumps({'summary': 'no options'}), REPLY]
+
+    async def create(**kwargs):
+        fake_async.calls.append(kwargs)
+        return _completion(replies.pop(0))
+
+    fake_async.create = create
+
+    asyncio.run(diag.adifferential({'age': 40}, language='pt'))
+    asyncio.run(diag.adifferential({'age': 40}, language='pt'))
+
+    (stats,) = llm_metrics.snapshot()
+    assert (stats['endpoint'], stats['language']) == ('differential', 'pt')
+    assert (stats['calls'], stats['cache_hits']) == (2, 1)
+    assert stats['attempts'] == 2
+    assert (stats['prompt_tokens'], stats['completion_tokens']) == (100, 20)
+    assert stats['ttfb']['p50'] is not None
+
+
+def test_achat_serves_repeats_from_cache(fake_async, monkeypatch):
+    """A second identical request is answered without an API call."""
+    monkeypatch.setattr(cache, '_cache', cache.MemoryCache())
+    patient = {'age': 40, 'symptoms': 'cough'}
+
+    first = asyncio.run(diag.adifferential(patient))
+    second = asyncio.run(diag.adifferential(dict(reversed(patient.items()))))
+
+    assert first == second
+    assert len(fake_async.calls) == 1
+    assert cache.get_cache().stats.hits == 1
@@ -0,0 +1,158 @@
+"""Tests for the LLM call metrics registry."""
+
+from __future__ import annotations
+
+import asyncio
+
+from types import SimpleNamespace
+
+import pytest
+
+from sdx.agents import metrics
+
+
+def _record(**overrides) -> metrics.CallRecord:
+    """Build a call record with sensible defaults."""
+    values = {
+        'endpoint': 'differential',
+        'model': 'm',
+        'language': 'en',
+        'attempts': 1,
+        'prompt_tokens': 100,
+        'completion_tokens': 20,
+        'wall_time': 0.3,
+        'ttfb': 0.3,
+    }
+    return metrics.CallRecord(**{**values, **overrides})
+
+
+def test_snapshot_quantiles_per_label_set():
+    """Calls are aggregated per endpoint / model / language."""
+    registry = metrics.MetricsRegistry()
+    for n in range(1, 101):
+        registry.record(_record(wall_time=n / 100))
+    registry.record(_record(endpoint='exams', cache_hit=True, attempts=0))
+
+    differential, exams = registry.snapshot()
+
+    assert differential['calls'] == 100
+    assert differential['prompt_tokens'] == 10_000
+    assert differential['wall_time'] == {'p50': 0.51, 'p95': 0.96, 'p99': 1.0}
+    assert exams['cache_hits'] == 1
+
+
+def test_prometheus_exposition():
+    """Counters and cumulative histograms use the text format."""
+    registry = metrics.MetricsRegistry(buckets=(0.5, 1.0))
+    registry.record(_record(wall_time=0.2))
+    registry.record(_record(wall_time=0.7, ok=False, model='a"b'))
+    registry.record(_record(wall_time=3.0))
+
+    text = registry.prometheus()
+
+    labels = 'endpoint="differential",model="m",language="en"'
+    assert '# TYPE sdx_llm_call_seconds histogram' in text
+    assert f'sdx_llm_calls_total{{{labels}}} 2' in text
+    assert f'sdx_llm_tokens_total{{{labels},kind="prompt"}} 200' in text
+    assert f'sdx_llm_call_seconds_bucket{{{labels},le="0.5"}} 1' in text
+    assert f'sdx_llm_call_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f'sdx_llm_call_seconds_count{{{labels}}} 2' in text
+    assert 'model="a\\"b"' in text
+    assert text.endswith('\n')
+
+
+def test_track_marks_failures_and_keeps_hooks_isolated():
+    """Exceptions are recorded as errors; a broken hook is only counted."""
+    registry = metrics.MetricsRegistry()
+    seen = []
+    registry.add_hook(seen.append)
+    registry.add_hook(lambda record: 1 / 0)
+
+    with pytest.raises(KeyError):
+        with registry.track('exams', 'm', 'pt') as call:
+            call.response(None)
+            raise KeyError
+
+    assert seen[0].ok is False
+    assert seen[0].attempts == 1
+    assert seen[0].ttfb is not None
+    assert registry.hook_errors == 1
+
+
+def test_cancelled_call_is_not_ok():
+    """Cancellation and closed generators count as failed calls."""
+    registry = metrics.MetricsRegistry()
+
+    async def stream():
+        with registry.track('differential', 'm', 'en'):
+            yield 'summary'
+            yield 'option'
+
+    async def abandon():
+        events = stream()
+        await events.__anext__()
+        await events.aclose()
+
+    asyncio.run(abandon())
+    with pytest.raises(asyncio.CancelledError):
+        with registry.track('exams', 'm', 'en'):
+            raise asyncio.CancelledError
+
+    assert [(s['endpoint'], s['errors']) for s in registry.snapshot()] == [
+        ('differential', 1),
+        ('exams', 1),
+    ]
+
+
+def test_cached_prompt_tokens_and_ratio():
+    """Provider-cached prompt tokens are summed and reported as a share."""
+    registry = metrics.MetricsRegistry()
+    details = SimpleNamespace(cached_tokens=1024)
+    usage = SimpleNamespace(
+        prompt_tokens=1280, completion_tokens=30, prompt_tokens_details=details
+    )
+    with registry.track('differential', 'm', 'en') as call:
+        call.response(usage)
+        call.response(SimpleNamespace(prompt_tokens=1280, completion_tokens=0))
+    registry.record(_record(endpoint='exams', prompt_tokens=0))
+
+    differential, exams = registry.snapshot()
+
+    assert differential['cached_tokens'] == 1024
+    assert differential['cached_ratio'] == 0.4
+    assert exams['cached_ratio'] is None
+    assert 'kind="cached"} 1024' in registry.prometheus()
+
+
+def test_opentelemetry_hook_emits_spans():
+    """Each record becomes one span with the usage attributes."""
+    spans = []
+
+    class Span:
+        def __init__(self, name, start_time, attributes):
+            self.name = name
+            self.start = start_time
+            self.attributes = attributes
+            self.end_time = None
+            self.status = None
+
+        def set_status(self, status):
+            self.status = status
+
+        def end(self, end_time):
+            self.end_time = end_time
+
+    class Tracer:
+        def start_span(self, name, start_time, attributes):
+            spans.append(Span(name, start_time, attributes))
+            return spans[-1]
+
+    pytest.importorskip('opentelemetry.trace')
+    hook = metrics.opentelemetry_hook(Tracer())
+    hook(_record(wall_time=2.0, ok=False))
+
+    span = spans[0]
+    assert span.name == 'llm differential'
+    assert span.attributes['gen_ai.usage.input_tokens'] == 100
+    assert span.end_time - span.start == 2_000_000_000
+    assert span.status is not None
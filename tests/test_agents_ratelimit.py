@@ -0,0 +1,178 @@
+"""Tests for the cross-process OpenAI rate limiter."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import weakref
+
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from sdx.agents import cache, client, ratelimit
+
+
+def _reserve(path: str) -> float:
+    """Reserve one request from a limiter built in a worker process."""
+    return ratelimit.RateLimiter(path, rpm=60, burst=3).reserve(1)
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    """Return a limiter with 2 requests and 200 tokens of burst."""
+    return ratelimit.RateLimiter(
+        tmp_path / 'limits.json', rpm=60, tpm=6000, burst=2
+    )
+
+
+def test_parse_reset():
+    """OpenAI duration headers and plain seconds are understood."""
+    assert ratelimit.parse_reset('6m0s') == 360.0
+    assert ratelimit.parse_reset('1h2m3.5s') == 3723.5
+    assert ratelimit.parse_reset('20ms') == pytest.approx(0.02)
+    assert ratelimit.parse_reset('7') == 7.0
+    assert ratelimit.parse_reset(None) == 0.0
+
+
+def test_buckets_refill_over_time(limiter, monkeypatch):
+    """Requests beyond the burst wait for the bucket to refill."""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now[0])
+
+    assert limiter.reserve(10) == 0
+    assert limiter.reserve(10) == 0
+    assert limiter.reserve(10) == pytest.approx(1.0)
+    now[0] += 1.0
+    assert limiter.reserve(10) == 0
+    assert limiter.reserve(250) == pytest.approx(1.0)  # tokens: 170 < 200
+
+
+def test_budget_shared_between_processes(tmp_path):
+    """Processes using the same state file draw from one bucket."""
+    path = str(tmp_path / 'limits.json')
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        waits = list(pool.map(_reserve, [path] * 6))
+
+    assert sum(wait == 0 for wait in waits) == 3
+
+
+def test_headers_adapt_limits_and_pause(limiter, monkeypatch):
+    """Limit / remaining headers shrink buckets; a 429 pauses everyone."""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now[0])
+
+    limiter.observe(
+        200,
+        {
+            'x-ratelimit-limit-requests': '30',
+            'x-ratelimit-remaining-requests': '0',
+            'x-ratelimit-limit-tokens': '600000',
+        },
+    )
+    other = ratelimit.RateLimiter(limiter.path)
+    assert other.reserve(1) == pytest.approx(2.0)  # 30 rpm, bucket empty
+    now[0] += 2.0
+    assert other.reserve(1) == 0
+
+    limiter.observe(429, {'retry-after': '5'})
+    assert other.reserve(1) == pytest.approx(5.0)
+    assert limiter.stats.paused == 1
+
+
+def test_settle_and_timeout(limiter):
+    """Unused tokens are refunded; a long wait honours the timeout."""
+    limiter.acquire(150)
+    limiter.settle(150, 50)
+    limiter.acquire(150)
+
+    with pytest.raises(TimeoutError):
+        limiter.acquire(150, timeout=0.1)
+    assert limiter.stats.acquired == 2
+
+
+def test_client_waits_and_observes(tmp_path, monkeypatch):
+    """Each attempt spends budget and responses feed the header hook."""
+    limiter = ratelimit.RateLimiter(tmp_path / 'limits.json', rpm=60)
+    reserved = []
+    monkeypatch.setattr(
+        limiter, 'reserve', lambda tokens: reserved.append(tokens) or 0.0
+    )
+    monkeypatch.setattr(ratelimit, '_limiter', limiter)
+    monkeypatch.setattr(client, '_ARCHIVE_MODE', 'files')
+    monkeypatch.setattr(client, '_RAW_DIR', tmp_path)
+    monkeypatch.setattr(cache, '_cache', None)
+
+    async def create(**kwargs):
+        message = SimpleNamespace(content='{"summary": "", "options": []}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    completions = SimpleNamespace(create=create)
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(client, '_build_async_client', lambda _: fake)
+    monkeypatch.setattr(client, '_async_pool', weakref.WeakKeyDictionary())
+
+    asyncio.run(client.achat('system', 'user'))
+    request = httpx.Request('POST', 'https://api.example/v1/chat')
+    client._observe_rate_limits(
+        httpx.Response(429, request=request, headers={'retry-after': '3'})
+    )
+
+    assert reserved == [ratelimit.estimate_tokens('system', 'user')]
+    assert limiter.stats.paused == 1
+
+
+def test_async_paths_do_not_block_the_loop(limiter, monkeypatch):
+    """State file locking runs in a worker thread, not on the loop."""
+    threads = set()
+    reserve, observe = limiter.reserve, limiter.observe
+
+    busy = []
+
+    def slow_reserve(tokens):
+        threads.add(threading.get_ident())
+        busy.append(time.monotonic())
+        time.sleep(0.1)  # e.g. another worker holds the flock
+        busy.append(time.monotonic())
+        return reserve(tokens)
+
+    def tracked_observe(status, headers):
+        threads.add(threading.get_ident())
+        observe(status, headers)
+
+    monkeypatch.setattr(limiter, 'reserve', slow_reserve)
+    monkeypatch.setattr(limiter, 'observe', tracked_observe)
+    monkeypatch.setattr(ratelimit, '_limiter', limiter)
+    request = httpx.Request('POST', 'https://api.example/v1/chat')
+    response = httpx.Response(
+        429, request=request, headers={'retry-after': '1'}
+    )
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(limiter.aacquire(1), ticker())
+        await client._aobserve_rate_limits(response)
+
+    asyncio.run(scenario())
+
+    assert any(busy[0] < tick < busy[1] for tick in ticks)
+    assert threading.get_ident() not in threads
+    assert limiter.stats.as_dict()['paused'] == 1
+
+
+def test_disabled_by_default(monkeypatch):
+    """Without SDX_LLM_* settings no limiter is built."""
+    for name in ('SDX_LLM_RATE_LIMIT', 'SDX_LLM_RPM', 'SDX_LLM_TPM'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(ratelimit, '_limiter', ratelimit._UNSET)
+
+    assert ratelimit.get_rate_limiter() is None
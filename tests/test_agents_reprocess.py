@@ -0,0 +1,72 @@
+"""Tests for reprocessing the raw LLM reply archive."""
+
+from __future__ import annotations
+
+import sys
+
+import pytest
+
+from sdx.agents import archive, reprocess
+
+GOOD = '{"summary": "s", "options": ["Flu"]}'
+SCORED = '```json\n{"summary": "t", "options": {"Flu": 0.7}}\n```'
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    """Archive holding one segment and three loose reply files."""
+    writer = archive.SegmentArchive(tmp_path, flush_interval=60)
+    writer.submit(GOOD, sid='seg-1')
+    writer.submit('not json', sid='seg-2')
+    writer.flush(timeout=5)
+    writer.close()
+    (tmp_path / '20250101T000000Z_file-1.json').write_text(SCORED)
+    (tmp_path / '20250101T000001Z_file-2.json').write_text(GOOD)
+    (tmp_path / '20250101T000002Z_file-3.json').write_text(f'{GOOD},{GOOD}')
+    return tmp_path
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rows_from_segments_and_files(raw_dir, workers):
+    """Every reply yields a row; invalid ones keep their error."""
+    rows = list(reprocess.iter_archive_rows(raw_dir, workers=workers))
+
+    assert [(r['sid'], r['valid']) for r in rows] == [
+        ('seg-1', True),
+        ('seg-2', False),
+        ('file-1', True),
+        ('file-2', True),
+        ('file-3', False),
+    ]
+    assert rows[2]['ts'] == '20250101T000000Z'
+    assert rows[2]['options'] == ['Flu']
+    assert rows[2]['scores'] == [0.7]
+    assert rows[0]['scores'] is None
+    assert rows[1]['error']
+    assert 'raw' not in rows[0]
+
+
+def test_missing_directory(tmp_path):
+    """A missing archive directory is reported before any work starts."""
+    with pytest.raises(FileNotFoundError):
+        list(reprocess.iter_archive_rows(tmp_path / 'missing'))
+
+
+def test_writes_parquet(raw_dir, tmp_path):
+    """The table round-trips through Parquet."""
+    pq = pytest.importorskip('pyarrow.parquet')
+    output = tmp_path / 'out' / 'replies.parquet'
+
+    stats = reprocess.reprocess_archive(raw_dir, output, workers=1)
+
+    assert (stats.total, stats.valid, stats.invalid) == (5, 3, 2)
+    table = pq.read_table(output)
+    assert table.column('sid').to_pylist()[0] == 'seg-1'
+
+
+def test_pyarrow_is_optional(raw_dir, tmp_path, monkeypatch):
+    """Without pyarrow the writer explains what is missing."""
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+
+    with pytest.raises(ImportError, match='pyarrow'):
+        reprocess.reprocess_archive(raw_dir, tmp_path / 'replies.arrow')
@@ -0,0 +1,171 @@
+"""Tests for LLM call deadlines, retries and hedging."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+import pytest
+
+from sdx.agents import retry
+
+FAST = retry.RetryPolicy(attempts=3, timeout=1.0, backoff=0.0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    """Give every test its own counters and latency window."""
+    monkeypatch.setattr(retry, 'stats', retry.RetryStats())
+    monkeypatch.setattr(retry, 'latencies', retry.LatencyWindow())
+    return retry.stats
+
+
+def _flaky(failures: list[BaseException], value: str = 'ok'):
+    """Return an attempt raising *failures* in turn, then *value*."""
+    timeouts: list[float | None] = []
+
+    def attempt(timeout: float | None) -> str:
+        timeouts.append(timeout)
+        if failures:
+            raise failures.pop(0)
+        return value
+
+    attempt.timeouts = timeouts
+    return attempt
+
+
+def _status_error(status: int, headers: dict | None = None):
+    """Build an ``openai.APIStatusError`` for *status*."""
+    request = httpx.Request('POST', 'https://api.example/v1/chat')
+    response = httpx.Response(status, request=request, headers=headers)
+    return openai.APIStatusError('error', response=response, body=None)
+
+
+def test_transient_errors_are_retried(fresh_stats):
+    """Timeouts and 429/5xx responses are retried until success."""
+    attempt = _flaky([TimeoutError(), _status_error(429)])
+
+    assert retry.run(attempt, FAST) == 'ok'
+    assert attempt.timeouts == [1.0, 1.0, 1.0]
+    assert fresh_stats.retries == 2
+    assert retry.is_retryable(asyncio.TimeoutError(), FAST)  # wait_for
+
+
+def test_permanent_errors_are_not_retried(fresh_stats):
+    """A 400 or a programming error fails on the first attempt."""
+    attempt = _flaky([_status_error(400)])
+
+    with pytest.raises(openai.APIStatusError):
+        retry.run(attempt, FAST)
+    assert len(attempt.timeouts) == 1
+    assert fresh_stats.failures == 1
+
+
+def test_invalid_replies_retried_when_enabled():
+    """ValidationError is retried only with retry_invalid."""
+    from pydantic import ValidationError
+    from sdx.schema import LLMDiagnosis
+
+    def invalid() -> ValidationError:
+        try:
+            LLMDiagnosis.from_llm('{}')
+        except ValidationError as exc:
+            return exc
+        raise AssertionError
+
+    assert retry.run(_flaky([invalid()]), FAST) == 'ok'
+    strict = retry.RetryPolicy(backoff=0.0, retry_invalid=False)
+    with pytest.raises(ValidationError):
+        retry.run(_flaky([invalid()]), strict)
+
+
+def test_deadline_bounds_the_whole_call():
+    """Attempts share the deadline and a timed-out attempt is cancelled."""
+    policy = retry.RetryPolicy(
+        attempts=10, timeout=0.05, deadline=0.2, backoff=0.0
+    )
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        await asyncio.sleep(10)
+
+    started = time.monotonic()
+    with pytest.raises(retry.TIMEOUT_ERRORS):
+        asyncio.run(retry.arun(attempt, policy))
+
+    assert time.monotonic() - started < 1
+    assert 2 <= len(calls) <= 5
+    assert all(timeout <= 0.05 for timeout in calls)
+
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    """Delays stay under the exponential cap unless the server asks more."""
+    policy = retry.RetryPolicy(backoff=1.0, max_backoff=4.0)
+
+    delays = [retry.backoff_delay(policy, 5) for _ in range(50)]
+    assert all(0 <= d <= 4.0 for d in delays)
+    assert len(set(delays)) > 1
+    limited = _status_error(429, {'retry-after': '7'})
+    assert retry.backoff_delay(policy, 0, limited) == 7.0
+
+
+def test_async_hedge_takes_first_valid_answer(fresh_stats):
+    """A slow primary gets a twin; the faster one wins, the other stops."""
+    policy = retry.RetryPolicy(backoff=0.0, hedge=True, hedge_after=0.05)
+    started = []
+    cancelled = []
+
+    async def attempt(timeout):
+        started.append(timeout)
+        delay = 5 if len(started) == 1 else 0.01
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(len(started))
+            raise
+        return f'call {len(started)}'
+
+    assert asyncio.run(retry.arun(attempt, policy)) == 'call 2'
+    assert cancelled
+    assert (fresh_stats.hedges, fresh_stats.hedge_wins) == (1, 1)
+
+
+def test_sync_hedge_skipped_for_fast_calls(fresh_stats):
+    """No twin is sent when the primary answers before the hedge delay."""
+    policy = retry.RetryPolicy(backoff=0.0, hedge=True, hedge_after=1.0)
+
+    assert retry.run(_flaky([]), policy) == 'ok'
+    assert fresh_stats.hedges == 0
+
+
+def test_sync_hedge_after_p95(fresh_stats):
+    """Without a fixed delay the twin fires after the recent p95."""
+    for _ in range(20):
+        retry.latencies.add(0.02)
+    policy = retry.RetryPolicy(backoff=0.0, hedge=True)
+    calls = []
+
+    def attempt(timeout):
+        calls.append(timeout)
+        time.sleep(0.5 if len(calls) == 1 else 0.0)
+        return json.dumps(len(calls))
+
+    assert retry.run(attempt, policy) == '2'
+    assert fresh_stats.hedge_wins == 1
+
+
+def test_policy_from_env(monkeypatch):
+    """SDX_LLM_* variables configure the policy."""
+    monkeypatch.setenv('SDX_LLM_ATTEMPTS', '5')
+    monkeypatch.setenv('SDX_LLM_DEADLINE', '30')
+    monkeypatch.setenv('SDX_LLM_HEDGE', '1')
+    monkeypatch.setattr(retry, '_policy', retry._UNSET)
+
+    policy = retry.get_retry_policy()
+
+    assert (policy.attempts, policy.deadline, policy.hedge) == (5, 30.0, True)
+    assert policy.hedge_after is None
@@ -0,0 +1,249 @@
+"""Tests for streamed LLM replies and the SSE endpoints."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import weakref
+
+from types import SimpleNamespace
+
+import pytest
+
+from sdx.agents import cache, client, retry
+from sdx.agents.streaming import DiagnosisStreamParser
+
+REPLY = (
+    '{"summary": "Cough with \\"fever\\" \\u00e9.", '
+    '"options": ["Flu [A]", "Cold", "Sinusitis"]}'
+)
+
+
+def _feed(raw: str, step: int) -> list:
+    """Feed *raw* to a parser in *step*-sized chunks."""
+    parser = DiagnosisStreamParser()
+    events = []
+    for start in range(0, len(raw), step):
+        events += parser.feed(raw[start : start + step])
+    return events
+
+
+@pytest.mark.parametrize('step', [1, 3, 7, len(REPLY)])
+def test_parser_emits_summary_and_options(step):
+    """Chunk boundaries do not change the reconstructed reply."""
+    events = _feed(REPLY, step)
+
+    summary = ''.join(e.data for e in events if e.event == 'summary')
+    options = [e.data for e in events if e.event == 'option']
+    assert summary == 'Cough with "fever" é.'
+    assert options == ['Flu [A]', 'Cold', 'Sinusitis']
+
+
+def test_parser_waits_for_complete_option():
+    """A half-generated option is not emitted."""
+    parser = DiagnosisStreamParser()
+
+    events = parser.feed('{"summary": "S", "options": ["Flu", "Co')
+
+    assert [e.data for e in events if e.event == 'option'] == ['Flu']
+
+
+def test_parser_summary_arrives_before_options():
+    """The summary is streamed while it is still being generated."""
+    parser = DiagnosisStreamParser()
+
+    events = parser.feed('```json\n{"summary": "Early te')
+
+    assert [(e.event, e.data) for e in events] == [('summary', 'Early te')]
+
+
+def test_parser_emits_keys_of_scored_options():
+    """Options in the {name: probability} form are emitted by name."""
+    raw = (
+        '```json\n{"summary": "S \\ud83d\\ude00", '
+        '"options": {"Flu": 0.7, "Cold \\"B\\"": 0.3}}\n```'
+    )
+
+    events = _feed(raw, 2)
+
+    summary = ''.join(e.data for e in events if e.event == 'summary')
+    assert summary == 'S \U0001f600'
+    assert [e.data for e in events if e.event == 'option'] == [
+        'Flu',
+        'Cold "B"',
+    ]
+
+
+def test_parser_scans_each_chunk_once():
+    """Long replies are parsed in linear time, not re-parsed per chunk."""
+    options = [f'Diagnosis {n}' for n in range(20_000)]
+    raw = json.dumps({'summary': 'S', 'options': options})
+    parser = DiagnosisStreamParser()
+
+    events = [
+        e for n in range(0, len(raw), 4) for e in parser.feed(raw[n : n + 4])
+    ]
+
+    assert len(events) == len(options) + 1
+    assert parser.buffer == raw
+
+
+class FakeStream:
+    """Async iterator of chat completion chunks."""
+
+    def __init__(self, text: str, step: int = 4) -> None:
+        self.parts = [text[i : i + step] for i in range(0, len(text), step)]
+        self.closed = False
+
+    async def close(self) -> None:
+        """Release the (fake) connection."""
+        self.closed = True
+
+    def __aiter__(self):
+        """Return the chunk iterator."""
+        return self._chunks()
+
+    async def _chunks(self):
+        for part in self.parts:
+            delta = SimpleNamespace(content=part)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+@pytest.fixture
+def fake_stream(tmp_path, monkeypatch):
+    """Replace the async client with one that streams REPLY."""
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        return FakeStream(REPLY)
+
+    completions = SimpleNamespace(create=create)
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(client, '_build_async_client', lambda _: fake)
+    monkeypatch.setattr(client, '_async_pool', weakref.WeakKeyDictionary())
+    monkeypatch.setattr(client, '_RAW_DIR', tmp_path)
+    monkeypatch.setattr(client, '_ARCHIVE_MODE', 'files')
+    monkeypatch.setattr(cache, '_cache', None)
+    return calls
+
+
+def test_astream_chat_ends_with_validated_result(fake_stream, tmp_path):
+    """The final event carries the validated diagnosis."""
+
+    async def collect():
+        return [e async for e in client.astream_chat('s', 'u', session_id='x')]
+
+    events = asyncio.run(collect())
+
+    assert fake_stream[0]['stream'] is True
+    assert events[-1].event == 'done'
+    assert events[-1].data['options'] == ['Flu [A]', 'Cold', 'Sinusitis']
+    assert list(tmp_path.glob('*_x.json'))
+
+
+class StalledStream(FakeStream):
+    """Stream that hangs after its first *ready* chunks."""
+
+    def __init__(self, text: str, ready: int) -> None:
+        super().__init__(text)
+        self.ready = ready
+
+    async def _chunks(self):
+        for n, part in enumerate(self.parts):
+            if n == self.ready:
+                await asyncio.sleep(60)
+            delta = SimpleNamespace(content=part)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def test_astream_chat_retries_stall_before_first_chunk(
+    fake_stream, monkeypatch
+):
+    """A stream silent past the attempt timeout is reopened."""
+    policy = retry.RetryPolicy(attempts=2, timeout=0.05, backoff=0.0)
+    monkeypatch.setattr(retry, '_policy', policy)
+    streams = [StalledStream(REPLY, ready=0), FakeStream(REPLY)]
+
+    async def create(**kwargs):
+        fake_stream.append(kwargs)
+        return streams.pop(0)
+
+    monkeypatch.setattr(
+        client._build_async_client(None).chat.completions, 'create', create
+    )
+
+    async def collect():
+        return [e async for e in client.astream_chat('s', 'u')]
+
+    events = asyncio.run(collect())
+
+    assert [c['timeout'] for c in fake_stream] == [0.05, 0.05]
+    assert events[-1].event == 'done'
+
+
+def test_astream_chat_deadline_stops_stalled_stream(fake_stream, monkeypatch):
+    """A stream stalling after its first chunk ends at the call deadline."""
+    policy = retry.RetryPolicy(attempts=2, timeout=None, deadline=0.1)
+    monkeypatch.setattr(retry, '_policy', policy)
+
+    stream = StalledStream(REPLY, ready=2)
+
+    async def create(**kwargs):
+        fake_stream.append(kwargs)
+        return stream
+
+    monkeypatch.setattr(
+        client._build_async_client(None).chat.completions, 'create', create
+    )
+
+    async def collect():
+        return [e async for e in client.astream_chat('s', 'u')]
+
+    events = asyncio.run(collect())
+
+    assert events[-1].event == 'error'
+    assert 'TimeoutError' in events[-1].data
+    assert len(fake_stream) == 1
+    assert stream.closed
+
+
+def test_astream_chat_closes_abandoned_stream(fake_stream, monkeypatch):
+    """A consumer that stops early (client gone) releases the stream."""
+    stream = FakeStream(REPLY)
+
+    async def create(**kwargs):
+        return stream
+
+    monkeypatch.setattr(
+        client._build_async_client(None).chat.completions, 'create', create
+    )
+
+    async def first_event():
+        events = client.astream_chat('s', 'u')
+        event = await events.__anext__()
+        await events.aclose()
+        return event
+
+    assert asyncio.run(first_event()).event == 'summary'
+    assert stream.closed
+
+
+def test_diagnosis_sse_endpoint(fake_stream):
+    """GET /diagnosis/stream emits SSE frames and stores the result."""
+    from fastapi.testclient import TestClient
+
+    from research.app import main
+
+    sid = 'sse-session'
+    main._sessions().save(sid, {'patient': {'age': 1}, 'meta': {'lang': 'en'}})
+    try:
+        rsp = TestClient(main.app).get(f'/diagnosis/stream?sid={sid}')
+        assert rsp.headers['content-type'].startswith('text/event-stream')
+        frames = [f for f in rsp.text.split('\n\n') if f]
+        assert frames[0].startswith('event: summary')
+        assert frames[-1].startswith('event: done')
+        done = json.loads(frames[-1].split('data: ', 1)[1])
+        assert main._sessions().get(sid)['ai_diag'] == done
+    finally:
+        main._sessions().delete(sid)
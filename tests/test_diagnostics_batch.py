@@ -0,0 +1,131 @@
+"""Tests for the batch differential-diagnosis API."""
+
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from sdx.agents import retry
+from sdx.agents.diagnostics import batch
+from sdx.schema.clinical_outputs import LLMDiagnosis
+
+
+def _rate_limit_error() -> openai.RateLimitError:
+    """Build a 429 error carrying a zero Retry-After header."""
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat')
+    response = httpx.Response(
+        429, headers={'retry-after': '0'}, request=request
+    )
+    return openai.RateLimitError('slow down', response=response, body=None)
+
+
+@pytest.fixture
+def fake_differential(monkeypatch):
+    """Replace adifferential with a stub driven by the patient payload."""
+    state = {'in_flight': 0, 'peak': 0, 'calls': 0}
+
+    async def stub(patient, language='en', session_id=None):
+        state['calls'] += 1
+        state['in_flight'] += 1
+        state['peak'] = max(state['peak'], state['in_flight'])
+        try:
+            await asyncio.sleep(patient.get('delay', 0.001))
+            if patient.get('fail'):
+                raise ValueError('bad record')
+            if patient.get('errors'):
+                raise patient['errors'].pop(0)
+            if patient.get('throttle', 0) > 0:
+                patient['throttle'] -= 1
+                raise _rate_limit_error()
+            return LLMDiagnosis(summary=language, options=[patient['name']])
+        finally:
+            state['in_flight'] -= 1
+
+    monkeypatch.setattr(batch, 'adifferential', stub)
+    return state
+
+
+def test_sync_batch_yields_every_patient(fake_differential):
+    """Every record is returned once, with errors captured per item."""
+    patients = [{'name': f'p{i}'} for i in range(20)]
+    patients[3]['fail'] = True
+
+    items = list(batch.differential_batch(patients, 'pt', max_concurrency=4))
+
+    assert sorted(item.index for item in items) == list(range(20))
+    failed = [item for item in items if not item.ok]
+    assert [item.index for item in failed] == [3]
+    assert isinstance(failed[0].error, ValueError)
+    assert all(item.result.summary == 'pt' for item in items if item.ok)
+    assert fake_differential['peak'] <= 4
+
+
+def test_async_batch_streams_in_completion_order(fake_differential):
+    """A slow record does not hold back faster ones."""
+    patients = [{'name': 'slow', 'delay': 0.05}, {'name': 'fast'}]
+
+    async def collect():
+        return [
+            item
+            async for item in batch.adifferential_batch(
+                patients, max_concurrency=2
+            )
+        ]
+
+    items = asyncio.run(collect())
+
+    assert [item.result.options for item in items] == [['fast'], ['slow']]
+
+
+def test_rate_limited_items_are_retried(fake_differential):
+    """429 responses are retried after the Retry-After delay."""
+    patients = [{'name': 'p', 'throttle': 2}]
+
+    (item,) = batch.differential_batch(patients, max_retries=3)
+
+    assert item.ok
+    assert item.attempts == 3
+
+
+def test_retries_exhausted_reports_error(fake_differential):
+    """Persistent 429s are reported instead of retried forever."""
+    patients = [{'name': 'p', 'throttle': 10}]
+
+    (item,) = batch.differential_batch(patients, max_retries=1)
+
+    assert isinstance(item.error, openai.RateLimitError)
+    assert item.attempts == 2
+
+
+def test_timeouts_and_invalid_replies_are_retried(fake_differential):
+    """Attempt timeouts and 422 invalid replies get another try."""
+    from fastapi import HTTPException
+
+    errors = [TimeoutError(), HTTPException(422, 'not valid LLMDiagnosis')]
+    patients = [{'name': 'p', 'errors': errors}]
+
+    (item,) = batch.differential_batch(patients, max_retries=3)
+
+    assert item.ok
+    assert item.attempts == 3
+
+
+def test_client_retries_are_off_inside_batch(monkeypatch):
+    """Batch calls run single-attempt so only the batch loop retries."""
+    seen = []
+
+    async def stub(patient, language='en', session_id=None):
+        seen.append(retry.get_retry_policy().attempts)
+        return LLMDiagnosis(summary='s', options=['o'])
+
+    monkeypatch.setattr(batch, 'adifferential', stub)
+    monkeypatch.setattr(retry, '_policy', retry.RetryPolicy(attempts=3))
+
+    items = list(batch.differential_batch([{}, {}], max_concurrency=2))
+
+    assert [item.ok for item in items] == [True, True]
+    assert seen == [1, 1]
+    assert retry.get_retry_policy().attempts == 3
@@ -0,0 +1,110 @@
+"""Tests for the offline Batch API mode."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from sdx.agents import client
+from sdx.agents.diagnostics import offline
+
+
+def fake_batch_endpoint(requests_path, results_path, replies):
+    """Consume a batch request JSONL and write a Batch API result file."""
+    with requests_path.open() as src, results_path.open('w') as dst:
+        for line in src:
+            request = json.loads(line)
+            custom_id = request['custom_id']
+            assert request['url'] == offline.BATCH_ENDPOINT
+            assert request['body']['messages'][0]['role'] == 'system'
+            reply = replies[custom_id]
+            if reply is None:
+                result = {
+                    'custom_id': custom_id,
+                    'response': None,
+                    'error': {'code': 'server_error', 'message': 'boom'},
+                }
+            else:
+                body = {'choices': [{'message': {'content': reply}}]}
+                result = {
+                    'custom_id': custom_id,
+                    'response': {'status_code': 200, 'body': body},
+                    'error': None,
+                }
+            dst.write(json.dumps(result) + '\n')
+
+
+@pytest.fixture(autouse=True)
+def raw_dir(tmp_path, monkeypatch):
+    """Redirect raw LLM dumps to a temporary directory."""
+    path = tmp_path / 'llm_raw'
+    path.mkdir()
+    monkeypatch.setattr(client, '_RAW_DIR', path)
+    monkeypatch.setattr(client, '_ARCHIVE_MODE', 'files')
+    return path
+
+
+def test_round_trip_through_fake_endpoint(tmp_path, raw_dir):
+    """Requests written to JSONL come back as validated diagnoses."""
+    requests_path = tmp_path / 'batch.jsonl'
+    results_path = tmp_path / 'results.jsonl'
+    requests = [
+        offline.differential_request({'age': 30}, 'sid-1', 'pt'),
+        offline.exams_request(['Flu'], 'sid-2'),
+        offline.differential_request({'age': 50}, 'sid-3'),
+        offline.differential_request({'age': 60}, 'sid-4'),
+    ]
+    replies = {
+        'sid-1': '{"summary": "ok", "options": ["A"]}',
+        'sid-2': '```json\n{"summary": "ok", "options": ["CBC"]}\n```',
+        'sid-3': '{"summary": "missing options"}',
+        'sid-4': None,
+    }
+
+    assert offline.write_batch_requests(requests, requests_path) == 4
+    fake_batch_endpoint(requests_path, results_path, replies)
+    results, errors = offline.ingest_batch_results(results_path)
+
+    assert results['sid-1'].options == ['A']
+    assert results['sid-2'].options == ['CBC']
+    assert set(errors) == {'sid-3', 'sid-4'}
+    assert len(list(raw_dir.iterdir())) == 3
+
+
+def test_request_body_matches_interactive_prompt():
+    """Batch requests carry the same localized prompt as chat()."""
+    request = offline.differential_request({'age': 30}, 'sid', 'fr')
+    system, user = request['body']['messages']
+
+    assert system['content'].startswith('Vous êtes')
+    assert json.loads(user['content']) == {'age': 30}
+    assert request['body']['response_format'] == {'type': 'json_object'}
+
+
+def test_duplicate_custom_id_rejected(tmp_path):
+    """The Batch API requires unique custom ids."""
+    requests = [offline.exams_request(['Flu'], 'same')] * 2
+
+    with pytest.raises(ValueError, match='Duplicate'):
+        offline.write_batch_requests(requests, tmp_path / 'batch.jsonl')
+
+
+def test_malformed_lines_are_recorded_not_fatal(tmp_path):
+    """A truncated or id-less line fails alone; the rest is ingested."""
+    reply = '{"summary": "ok", "options": ["A"]}'
+    body = {'choices': [{'message': {'content': reply}}]}
+    good = {'custom_id': 'sid', 'response': {'status_code': 200, 'body': body}}
+    results_path = tmp_path / 'results.jsonl'
+    results_path.write_text(
+        '{"custom_id": "cut", "respo\n'
+        + json.dumps({'response': None})
+        + '\n'
+        + json.dumps(good)
+        + '\n'
+    )
+
+    results, errors = offline.ingest_batch_results(results_path, archive=False)
+
+    assert set(errors) == {'line 1', 'line 2'}
+    assert results['sid'].options == ['A']
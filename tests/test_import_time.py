@@ -0,0 +1,59 @@
+"""Import-time budget for the agents package."""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+SRC = ROOT / 'src'
+BUDGET = float(os.getenv('SDX_IMPORT_BUDGET', '0.5'))
+
+_PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+heavy = {'openai', 'fastapi', 'httpx', 'anamnesisai'} & set(sys.modules)
+heavy = sorted(heavy)
+print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))
+"""
+
+
+def _probe(cwd: Path, module: str = 'sdx.agents.diagnostics.core') -> dict:
+    """Import *module* in a fresh interpreter."""
+    path = os.pathsep.join((str(SRC), str(ROOT)))
+    env = {**os.environ, 'PYTHONPATH': path}
+    out = subprocess.run(
+        [sys.executable, '-c', _PROBE, module],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def test_import_is_side_effect_free(tmp_path):
+    """Importing creates no directories and loads no HTTP stack."""
+    result = _probe(tmp_path)
+
+    assert result['heavy'] == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_import_time_budget(tmp_path):
+    """Importing sdx.agents.diagnostics.core stays within the budget."""
+    best = min(_probe(tmp_path)['elapsed'] for _ in range(3))
+
+    assert best < BUDGET, f'import took {best:.3f}s (budget {BUDGET}s)'
+
+
+def test_cli_import_skips_extraction_stack(tmp_path):
+    """The research CLI loads the PDF/FHIR stack only in its commands."""
+    assert 'anamnesisai' not in _probe(tmp_path, 'research.cli')['heavy']
@@ -2,11 +2,19 @@
 
 import os
 
+from types import SimpleNamespace
+
 import pytest
 
+from sdx.agents.extraction import medical_reports
 from sdx.agents.extraction.medical_reports import (
     extract_text_from_pdf,
     get_report_data_from_pdf,
+    iter_pdf_pages,
+    iter_pdf_pages_mmap,
+    merge_fhir_resources,
+    split_report_text,
+    stream_pdf_text,
 )
 
 
@@ -57,3 +65,126 @@ def test_get_report_data_from_pdf(reports_data_dir, api_key_openai):
     assert any(
         resource_type in fhir_data for resource_type in expected_resource_types
     ), 'No expected FHIR resource types found'
+
+
+def test_parallel_extraction_keeps_page_order(make_pdf, monkeypatch):
+    """Page ranges extracted in a process pool are reassembled in order."""
+    monkeypatch.setattr(medical_reports, '_MIN_PAGES_PER_WORKER', 2)
+    pages = [f'Page {n}' for n in range(12)]
+    pages[5] = ''
+    pdf_path = make_pdf(pages)
+
+    serial = extract_text_from_pdf(pdf_path)
+    parallel = extract_text_from_pdf(pdf_path, workers=3)
+
+    assert parallel == serial
+    assert parallel.split('\n') == [p for p in pages if p]
+
+
+def test_iter_pdf_pages_streams_every_page(make_pdf, monkeypatch):
+    """The generator yields one entry per page, '' for textless pages."""
+    monkeypatch.setattr(medical_reports, '_MIN_PAGES_PER_WORKER', 2)
+    pdf_path = make_pdf(['one', '', 'three', 'four'])
+
+    assert list(iter_pdf_pages(pdf_path)) == ['one', '', 'three', 'four']
+    stream = iter_pdf_pages(pdf_path, workers=2)
+    assert next(stream) == 'one'
+    stream.close()
+
+
+def test_pdf_without_text_layer(make_pdf):
+    """A PDF whose pages hold no text raises ValueError."""
+    with pytest.raises(ValueError, match='No extractable text'):
+        extract_text_from_pdf(make_pdf(['', '']))
+
+
+def test_split_report_text_respects_boundaries():
+    """Pages are grouped whole; long pages split on sections."""
+    long_page = 'a' * 30 + '\n\n' + 'b' * 30 + '\n\n' + 'c' * 90
+    chunks = split_report_text(['p1', '', 'p2', long_page], max_chars=40)
+
+    assert chunks[:2] == ['p1\np2\n' + 'a' * 30, 'b' * 30]
+    assert ''.join(chunks[2:]) == 'c' * 90
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert split_report_text(['l1\nl2\nl3\n\nl4'], max_chars=5) == [
+        'l1\nl2',
+        'l3\nl4',
+    ]
+
+
+def test_merge_fhir_resources():
+    """Patient/Encounter are merged; other resources are listed."""
+    parts = [
+        {
+            'Patient': {'id': 'p', 'name': None},
+            'Observation': {'code': 'hb', 'note': ['low']},
+        },
+        {
+            'Patient': {'id': 'other', 'name': 'Ana'},
+            'Encounter': {'id': 'e'},
+            'Observation': {'code': 'ldl', 'note': ['low', 'fasting']},
+        },
+    ]
+
+    merged = merge_fhir_resources(parts)
+
+    assert merged == {
+        'Patient': {'id': 'p', 'name': 'Ana'},
+        'Observation': [
+            {'code': 'hb', 'note': ['low']},
+            {'code': 'ldl', 'note': ['low', 'fasting']},
+        ],
+        'Encounter': {'id': 'e'},
+    }
+    assert parts[0]['Patient']['name'] is None
+    assert parts[0]['Observation']['note'] == ['low']
+
+
+def test_chunked_report_data(make_pdf, monkeypatch):
+    """Each chunk is extracted separately and the results merged."""
+    seen = []
+
+    def fake(text, api_key):
+        seen.append(text)
+        return {
+            'Patient': SimpleNamespace(model_dump=lambda: {'id': 'p'}),
+            'Observation': SimpleNamespace(
+                model_dump=lambda: {'note': [text]}
+            ),
+        }
+
+    monkeypatch.setattr(medical_reports, 'extract_fhir', fake)
+    pdf_path = make_pdf(['first page', 'second page', 'third page'])
+
+    data = get_report_data_from_pdf(pdf_path, api_key='k', chunk_chars=25)
+
+    assert sorted(seen) == ['first page\nsecond page', 'third page']
+    assert data['Patient'] == {'id': 'p'}
+    notes = [item['note'][0] for item in data['Observation']]
+    assert sorted(notes) == sorted(seen)
+
+
+def test_stream_pdf_text_matches_extraction(make_pdf, tmp_path):
+    """The low-memory path writes exactly what extraction returns."""
+    pdf_path = make_pdf([f'page {n}' for n in range(20)] + [''])
+    target = tmp_path / 'out.txt'
+
+    assert stream_pdf_text(pdf_path, target) == 20
+    assert target.read_text() == extract_text_from_pdf(pdf_path)
+
+    chunks = []
+    stream_pdf_text(pdf_path, chunks.append)
+    assert ''.join(chunks) == target.read_text()
+    assert list(iter_pdf_pages_mmap(pdf_path)) == list(
+        iter_pdf_pages(pdf_path)
+    )
+
+
+def test_stream_pdf_text_errors(tmp_path):
+    """Missing and unreadable files raise like extract_text_from_pdf."""
+    with pytest.raises(FileNotFoundError):
+        stream_pdf_text(tmp_path / 'missing.pdf', [].append)
+    broken = tmp_path / 'broken.pdf'
+    broken.write_bytes(b'')
+    with pytest.raises(ValueError, match='Error reading PDF'):
+        stream_pdf_text(broken, [].append)
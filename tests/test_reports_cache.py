@@ -0,0 +1,119 @@
+"""Tests for the content-hash report cache."""
+
+from __future__ import annotations
+
+import os
+
+from types import SimpleNamespace
+
+import pytest
+
+from sdx.agents.extraction import cache as report_cache
+from sdx.agents.extraction import medical_reports
+from sdx.agents.extraction.cache import ReportCache, file_digest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Install a fresh report cache for the test."""
+    active = ReportCache(tmp_path / 'cache')
+    report_cache.set_report_cache(active)
+    yield active
+    report_cache.set_report_cache(report_cache._UNSET)
+
+
+def test_duplicate_pdf_is_parsed_once(cache, make_pdf, monkeypatch):
+    """A copy of a PDF under another name hits the text cache."""
+    first = make_pdf(['lab results'], 'a.pdf')
+    copy = make_pdf(['lab results'], 'b.pdf')
+    assert medical_reports.extract_text_from_pdf(first) == 'lab results'
+
+    monkeypatch.setattr(
+        medical_reports,
+        'iter_pdf_pages',
+        lambda *a, **k: pytest.fail('PDF parsed again'),
+    )
+    assert medical_reports.extract_text_from_pdf(copy) == 'lab results'
+
+
+def test_fhir_output_cached_per_variant(cache, make_pdf, monkeypatch):
+    """extract_fhir runs once per PDF content and chunking setting."""
+    calls = []
+
+    def fake(text, api_key):
+        calls.append(text)
+        return {'Patient': SimpleNamespace(model_dump=lambda: {'id': 'p'})}
+
+    monkeypatch.setattr(medical_reports, 'extract_fhir', fake)
+    pdf_path = make_pdf(['report'])
+
+    for _ in range(2):
+        data = medical_reports.get_report_data_from_pdf(pdf_path, 'k')
+        chunked = medical_reports.get_report_data_from_pdf(
+            pdf_path, 'k', chunk_chars=100
+        )
+
+    assert data == chunked == {'Patient': {'id': 'p'}}
+    assert len(calls) == 2
+
+    assert cache.invalidate_file(pdf_path) == 3  # text + two variants
+    medical_reports.get_report_data_from_pdf(pdf_path, 'k')
+    assert len(calls) == 3
+
+
+def test_chunked_extraction_reuses_text_cache(cache, make_pdf, monkeypatch):
+    """The chunked path reads the PDF text through the cache too."""
+    monkeypatch.setattr(
+        medical_reports,
+        'extract_fhir',
+        lambda text, api_key: {
+            'Patient': SimpleNamespace(model_dump=lambda: {'id': text})
+        },
+    )
+    pdf_path = make_pdf(['lab results'])
+    medical_reports.extract_text_from_pdf(pdf_path)
+    monkeypatch.setattr(
+        medical_reports,
+        'iter_pdf_pages',
+        lambda *a, **k: pytest.fail('PDF parsed again'),
+    )
+
+    data = medical_reports.get_report_data_from_pdf(
+        pdf_path, 'k', chunk_chars=100
+    )
+
+    assert data == {'Patient': {'id': 'lab results'}}
+
+
+def test_size_eviction_drops_least_recently_used(tmp_path):
+    """Writes beyond max_bytes evict the oldest entries first."""
+    cache = ReportCache(tmp_path, max_bytes=25)
+    cache.set_text('aa01', 'x' * 10)
+    cache.set_text('aa02', 'y' * 10)
+    old = cache._path('aa02', '.txt')
+    os.utime(old, (1, 1))
+    cache.get_text('aa01')
+
+    cache.set_text('aa03', 'z' * 10)
+
+    assert cache.get_text('aa02') is None
+    assert cache.get_text('aa01') == 'x' * 10
+    assert cache.size == 20
+
+
+def test_digest_depends_on_extractor_version(tmp_path, monkeypatch):
+    """Bumping EXTRACTOR_VERSION changes every key."""
+    path = tmp_path / 'f.pdf'
+    path.write_bytes(b'%PDF')
+    before = file_digest(path)
+    monkeypatch.setattr(report_cache, 'EXTRACTOR_VERSION', 'other')
+
+    assert file_digest(path) != before
+
+
+def test_cache_disabled_by_default(monkeypatch):
+    """Without SDX_REPORT_CACHE nothing is written to disk."""
+    monkeypatch.delenv('SDX_REPORT_CACHE', raising=False)
+    monkeypatch.setattr(report_cache, '_cache', report_cache._UNSET)
+
+    assert report_cache.get_report_cache() is None
@@ -0,0 +1,93 @@
+"""Tests for the bulk PDF ingestion pipeline."""
+
+from __future__ import annotations
+
+import json
+import threading
+
+from types import SimpleNamespace
+
+import pytest
+
+from sdx.agents.extraction import ingest
+
+
+@pytest.fixture
+def fhir_calls(monkeypatch):
+    """Replace ``extract_fhir`` with a fake echoing the text it got."""
+    calls = []
+    lock = threading.Lock()
+
+    def fake(text, api_key):
+        with lock:
+            calls.append(text)
+        if 'broken' in text:
+            raise RuntimeError('model refused')
+        resource = SimpleNamespace(model_dump=lambda: {'text': text})
+        return {'Patient': resource}
+
+    monkeypatch.setattr(ingest, 'extract_fhir', fake)
+    return calls
+
+
+@pytest.fixture
+def reports(make_pdf, tmp_path):
+    """Folder with two good reports, one broken and one non-PDF."""
+    source = tmp_path / 'inbox'
+    (source / 'ward').mkdir(parents=True)
+    for name, text in [
+        ('a.pdf', 'alpha report'),
+        ('ward/b.pdf', 'beta report'),
+        ('c.pdf', 'broken report'),
+    ]:
+        make_pdf([text]).rename(source / name)
+    (source / 'notes.txt').write_text('not a pdf')
+    (source / 'empty.pdf').write_bytes(b'not really a pdf')
+    return source
+
+
+def test_ingest_writes_outputs_and_failures(reports, tmp_path, fhir_calls):
+    """Every PDF is converted or reported with the stage that failed."""
+    out = tmp_path / 'out'
+    seen = []
+
+    stats = ingest.ingest_reports(
+        reports,
+        out,
+        api_key='k',
+        cpu_workers=2,
+        io_concurrency=2,
+        queue_size=1,
+        progress=seen.append,
+    )
+
+    assert (stats.total, stats.succeeded, stats.failed) == (4, 2, 2)
+    assert json.loads((out / 'ward/b.json').read_text()) == {
+        'Patient': {'text': 'beta report'}
+    }
+    failures = {
+        entry['file']: entry['stage']
+        for entry in map(json.loads, (out / 'failures.jsonl').open())
+    }
+    assert failures == {'c.pdf': 'fhir', 'empty.pdf': 'text'}
+    assert len(seen) == 4
+    assert stats.files_per_second > 0
+
+
+def test_ingest_resumes_from_checkpoint(reports, tmp_path, fhir_calls):
+    """A second run only retries the files that did not succeed."""
+    out = tmp_path / 'out'
+    ingest.ingest_reports(reports, out, api_key='k', cpu_workers=1)
+    fhir_calls.clear()
+
+    stats = ingest.ingest_reports(reports, out, api_key='k', cpu_workers=1)
+
+    assert stats.skipped == 2
+    assert fhir_calls == ['broken report']
+
+
+def test_ingest_requires_api_key(reports, tmp_path, monkeypatch):
+    """Without a key nothing is processed."""
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    with pytest.raises(EnvironmentError):
+        ingest.ingest_reports(reports, tmp_path / 'out')
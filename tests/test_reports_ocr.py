@@ -0,0 +1,93 @@
+"""Tests for the OCR fallback of PDF text extraction."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from sdx.agents.extraction import cache as report_cache
+from sdx.agents.extraction import medical_reports
+from sdx.agents.extraction.cache import ReportCache
+from sdx.agents.extraction.ocr import OCREngine, TesseractOCR
+
+
+class FakeOCR(OCREngine):
+    """Engine 'reading' image bytes and logging every call to a file."""
+
+    def __init__(self, log: Path) -> None:
+        self.log = log
+
+    @property
+    def cache_id(self) -> str:
+        """Return an identifier of the engine and its settings."""
+        return 'fake'
+
+    def recognize(self, image: bytes) -> str:
+        """Return the image bytes as text."""
+        with self.log.open('a') as fh:
+            fh.write(image.decode() + '\n')
+        return f'ocr {image.decode()}'
+
+
+@pytest.fixture
+def scanned(make_pdf, monkeypatch):
+    """PDF whose pages 1 and 3 only hold an image."""
+    monkeypatch.setattr(
+        medical_reports,
+        'page_images',
+        lambda page: [f'scan-{page.page_number}'.encode()],
+    )
+    return make_pdf(['typed 0', '', 'typed 2', ''])
+
+
+def _ocr_calls(log: Path) -> list[str]:
+    return log.read_text().split() if log.exists() else []
+
+
+def test_only_textless_pages_are_ocred(scanned, tmp_path):
+    """Pages with a text layer never reach the engine; order is kept."""
+    log = tmp_path / 'ocr.log'
+
+    text = medical_reports.extract_text_from_pdf(
+        scanned, workers=2, ocr=FakeOCR(log)
+    )
+
+    assert text.split('\n') == [
+        'typed 0',
+        'ocr scan-1',
+        'typed 2',
+        'ocr scan-3',
+    ]
+    assert sorted(_ocr_calls(log)) == ['scan-1', 'scan-3']
+
+
+def test_ocr_results_cached_per_image(scanned, tmp_path):
+    """With a report cache, known images are not recognised again."""
+    report_cache.set_report_cache(ReportCache(tmp_path / 'cache'))
+    log = tmp_path / 'ocr.log'
+    try:
+        engine = FakeOCR(log)
+        first = list(medical_reports.iter_pdf_pages(scanned, ocr=engine))
+        second = list(medical_reports.iter_pdf_pages(scanned, ocr=engine))
+    finally:
+        report_cache.set_report_cache(report_cache._UNSET)
+
+    assert first == second
+    assert len(_ocr_calls(log)) == 2
+
+
+def test_tesseract_import_error(monkeypatch):
+    """Without pytesseract a clear ImportError is raised on use."""
+    import builtins
+
+    real_import = builtins.__import__
+
+    def blocked(name, *args, **kwargs):
+        if name in ('pytesseract', 'PIL'):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, '__import__', blocked)
+    with pytest.raises(ImportError, match='pytesseract'):
+        TesseractOCR().recognize(b'')
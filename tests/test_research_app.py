@@ -0,0 +1,123 @@
+"""Tests for the physician portal wiring."""
+
+from __future__ import annotations
+
+import pytest
+
+from fastapi.testclient import TestClient
+from sdx.agents import metrics
+
+from research.app import main
+from research.models.repositories import PatientRepository
+from research.models.sessions import SQLiteSessionStore
+
+
+@pytest.fixture
+def portal(tmp_path, monkeypatch):
+    """Portal client backed by an empty JSON repository."""
+    monkeypatch.setattr(
+        PatientRepository, 'DATA_PATH', tmp_path / 'patients.json'
+    )
+    monkeypatch.delenv('SDX_PATIENT_STORE', raising=False)
+    monkeypatch.delenv('SDX_SESSION_STORE', raising=False)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_repository_is_application_scoped(portal, monkeypatch):
+    """Requests reuse the repository created by the lifespan."""
+    repo = main.app.state.repository
+    created = []
+    monkeypatch.setattr(
+        main, 'get_patient_repository', lambda: created.append(1)
+    )
+
+    portal.get('/')
+    portal.get('/')
+
+    assert main.app.state.repository is repo
+    assert created == []
+
+
+def test_new_record_is_listed_on_dashboard(portal):
+    """Writes through the shared repository are visible immediately."""
+    main._sessions().save(
+        'sid-1',
+        {
+            'patient': {'age': 50, 'gender': 'F'},
+            'meta': {'uuid': 'sid-1', 'lang': 'en'},
+        },
+    )
+    try:
+        rsp = portal.post(
+            '/exams?sid=sid-1',
+            data={'selected': ['CBC']},
+            follow_redirects=False,
+        )
+        assert rsp.status_code == 303
+        assert 'Patient sid-1' in portal.get('/').text
+    finally:
+        main._sessions().delete('sid-1')
+
+
+def test_dashboard_is_paginated(portal):
+    """The dashboard renders one page and links to the next one."""
+    repo = main.app.state.repository
+    for n in range(3):
+        repo.create(
+            {
+                'meta': {
+                    'uuid': f'patient-{n}',
+                    'lang': 'en',
+                    'timestamp': f'2025-01-0{n + 1}T00:00:00',
+                },
+                'patient': {},
+            }
+        )
+
+    first = portal.get('/?limit=2')
+    assert 'Patient patient-' in first.text
+    assert 'patient-0' not in first.text
+    assert 'Next page' in first.text
+
+    next_url = first.text.split('href="/?')[1].split('"')[0]
+    second = portal.get('/?' + next_url.replace('&amp;', '&'))
+    assert 'patient-0' in second.text
+    assert 'Next page' not in second.text
+
+    assert portal.get('/?cursor=bogus').status_code == 400
+
+    cursor = next_url.split('cursor=')[1]
+    filtered = portal.get(f'/?lang=en&cursor={cursor}')
+    assert 'href="/?lang=en" class="btn btn-sm btn-outline-secondary"' in (
+        filtered.text
+    )
+
+
+def test_sessions_shared_between_workers(portal, tmp_path):
+    """With the SQLite store a wizard can hop between worker processes."""
+    path = tmp_path / 'sessions.sqlite3'
+    main.app.state.sessions = SQLiteSessionStore(path)
+    rsp = portal.post('/start', data={'lang': 'pt'}, follow_redirects=False)
+    sid = rsp.headers['location'].split('sid=')[1]
+
+    # a second worker opens its own connection to the same file
+    main.app.state.sessions = SQLiteSessionStore(path)
+    portal.post(f'/symptoms?sid={sid}', data={'symptoms': 'cough'})
+
+    stored = SQLiteSessionStore(path).get(sid)
+    assert stored['meta']['lang'] == 'pt'
+    assert stored['patient']['symptoms'] == 'cough'
+    assert portal.get('/metrics/sessions').json()['live'] == 1
+
+
+def test_llm_metrics_routes(portal, monkeypatch):
+    """LLM metrics are exposed as JSON and in the Prometheus format."""
+    registry = metrics.MetricsRegistry()
+    registry.record(metrics.CallRecord('differential', 'm', 'en'))
+    monkeypatch.setattr(metrics, 'registry', registry)
+
+    assert portal.get('/metrics/llm').json()[0]['calls'] == 1
+    rsp = portal.get('/metrics')
+    assert rsp.headers['content-type'].startswith('text/plain')
+    assert 'sdx_llm_calls_total{endpoint="differential"' in rsp.text
@@ -0,0 +1,220 @@
+"""Tests for speculative differential prefetching in the portal."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from fastapi.testclient import TestClient
+from sdx.schema.clinical_outputs import LLMDiagnosis
+
+from research.app import main
+from research.app.prefetch import Prefetcher, fingerprint
+from research.models.repositories import PatientRepository
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record the patients sent to a fake ``adifferential``."""
+    sent = []
+
+    async def fake(patient, language='en', session_id=None):
+        sent.append(dict(patient))
+        await asyncio.sleep(0)
+        return LLMDiagnosis(
+            summary=patient.get('symptoms', ''),
+            options=['Flu', 'Cold', 'Asthma'],
+        )
+
+    monkeypatch.setattr(main.diag, 'adifferential', fake)
+    return sent
+
+
+@pytest.fixture
+def exam_calls(monkeypatch):
+    """Record the selections sent to a fake ``aexams``."""
+    sent = []
+
+    async def fake(selected, language='en', session_id=None):
+        sent.append(list(selected))
+        return LLMDiagnosis(summary='', options=[f'CBC for {selected[0]}'])
+
+    monkeypatch.setattr(main.diag, 'aexams', fake)
+    return sent
+
+
+@pytest.fixture
+def portal(tmp_path, monkeypatch, calls):
+    """Portal with prefetching enabled and a fresh prefetcher."""
+    monkeypatch.setattr(
+        PatientRepository, 'DATA_PATH', tmp_path / 'patients.json'
+    )
+    monkeypatch.delenv('SDX_PATIENT_STORE', raising=False)
+    monkeypatch.delenv('SDX_SESSION_STORE', raising=False)
+    monkeypatch.setattr(main, '_PREFETCH', True)
+    monkeypatch.setattr(main, '_STREAMING', False)
+    monkeypatch.setattr(main, '_PREFETCH_EXAMS', False)
+    monkeypatch.setattr(main, '_PREFETCHER', Prefetcher())
+    with TestClient(main.app) as client:
+        sid = (
+            client.post('/start', data={'lang': 'en'}, follow_redirects=False)
+            .headers['location']
+            .split('sid=')[1]
+        )
+        client.post(f'/symptoms?sid={sid}', data={'symptoms': 'cough'})
+        yield client, sid
+
+
+def test_diagnosis_uses_prefetched_result(portal, calls):
+    """Posting the tests step starts the differential in the background."""
+    client, sid = portal
+    client.post(
+        f'/tests?sid={sid}',
+        data={'previous_tests': 'none'},
+        follow_redirects=False,
+    )
+    assert main._PREFETCHER.pending(sid) == ['differential']
+
+    rsp = client.get(f'/diagnosis?sid={sid}', follow_redirects=False)
+
+    assert 'cough' in rsp.text
+    assert len(calls) == 1
+    assert main._PREFETCHER.stats.hits == 1
+
+
+def test_edited_answers_reissue_prefetch(portal, calls):
+    """Changing earlier answers cancels the stale job and starts anew."""
+    client, sid = portal
+    client.post(
+        f'/tests?sid={sid}',
+        data={'previous_tests': 'none'},
+        follow_redirects=False,
+    )
+    client.post(f'/symptoms?sid={sid}', data={'symptoms': 'fever'})
+
+    rsp = client.get(f'/diagnosis?sid={sid}', follow_redirects=False)
+
+    assert 'fever' in rsp.text
+    assert calls[-1]['symptoms'] == 'fever'
+    assert main._PREFETCHER.stats.issued == 2
+    assert main._PREFETCHER.stats.hits == 1
+
+
+def test_no_prefetch_before_tests_step(portal, calls):
+    """Earlier steps never start speculation on their own."""
+    client, sid = portal
+    client.post(f'/mental?sid={sid}', data={'mental_health': 'ok'})
+
+    assert main._PREFETCHER.pending(sid) == []
+    assert calls == []
+
+
+def test_stale_job_is_not_used():
+    """A job whose fingerprint differs is cancelled, not returned."""
+    prefetcher = Prefetcher()
+
+    async def scenario():
+        prefetcher.bind(asyncio.get_running_loop())
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(60)
+
+        prefetcher.submit(('s', 'job'), fingerprint(1), slow)
+        await started.wait()
+        assert prefetcher.take(('s', 'job'), fingerprint(2)) is None
+
+    asyncio.run(scenario())
+    assert prefetcher.stats.cancelled == 1
+    assert prefetcher.stats.misses == 1
+
+
+def _choose(client, sid, selected):
+    client.get(f'/diagnosis?sid={sid}')
+    client.post(
+        f'/diagnosis?sid={sid}',
+        data={'selected': selected},
+        follow_redirects=False,
+    )
+    return client.get(f'/exams?sid={sid}')
+
+
+def test_exams_prefetched_for_top_diagnoses(portal, exam_calls, monkeypatch):
+    """Exams for each top-k diagnosis are requested ahead of selection."""
+    monkeypatch.setattr(main, '_PREFETCH_EXAMS', True)
+    monkeypatch.setattr(main, '_PREFETCH_TOP_K', 2)
+    client, sid = portal
+
+    rsp = _choose(client, sid, ['Cold'])
+
+    assert 'CBC for Cold' in rsp.text
+    assert sorted(exam_calls) == [['Cold'], ['Flu']]
+    assert main._PREFETCHER.pending(sid) == []
+
+
+def test_exams_prefetched_for_scored_options(portal, exam_calls, monkeypatch):
+    """Options in the {name: probability} form are ranked by probability."""
+    monkeypatch.setattr(main, '_PREFETCH_EXAMS', True)
+    monkeypatch.setattr(main, '_PREFETCH_TOP_K', 2)
+
+    async def fake(patient, language='en', session_id=None):
+        options = {'Cold': 0.1, 'Asthma': 0.6, 'Flu': 0.3}
+        return LLMDiagnosis(summary='', options=options)
+
+    monkeypatch.setattr(main.diag, 'adifferential', fake)
+    client, sid = portal
+
+    rsp = _choose(client, sid, ['Asthma'])
+
+    assert rsp.status_code == 200
+    assert 'CBC for Asthma' in rsp.text
+    assert sorted(exam_calls) == [['Asthma'], ['Flu']]
+
+
+def test_prefetch_failure_does_not_fail_page(portal, monkeypatch):
+    """An error while starting speculation is counted, not raised."""
+    monkeypatch.setattr(main, '_PREFETCH_EXAMS', True)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('loop gone')
+
+    monkeypatch.setattr(main._PREFETCHER, 'submit', broken)
+    client, sid = portal
+
+    rsp = client.get(f'/diagnosis?sid={sid}')
+
+    assert rsp.status_code == 200
+    assert main._PREFETCHER.stats.errors == 1
+
+
+def test_unlikely_selection_calls_live(portal, exam_calls, monkeypatch):
+    """A selection outside the guesses falls back to a live call."""
+    monkeypatch.setattr(main, '_PREFETCH_EXAMS', True)
+    monkeypatch.setattr(main, '_PREFETCH_TOP_K', 1)
+    client, sid = portal
+
+    rsp = _choose(client, sid, ['Flu', 'Asthma'])
+
+    assert 'CBC for Flu' in rsp.text
+    assert exam_calls == [['Flu'], ['Flu', 'Asthma']]
+    assert main._PREFETCHER.stats.misses == 2  # no differential, no exams
+
+
+def test_budget_caps_speculation():
+    """Jobs beyond the per-window budget are not started."""
+    prefetcher = Prefetcher(budget=1)
+
+    async def noop():
+        return None
+
+    async def scenario():
+        prefetcher.bind(asyncio.get_running_loop())
+        first = prefetcher.submit(('s', 'a'), fingerprint(1), noop)
+        second = prefetcher.submit(('s', 'b'), fingerprint(2), noop)
+        await asyncio.sleep(0)
+        return first, second
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert prefetcher.stats.over_budget == 1
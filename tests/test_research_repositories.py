@@ -1,5 +1,6 @@
 """Tests for the patient repository."""
 
+import json
 import random
 import shutil
 
@@ -7,7 +8,11 @@ from pathlib import Path
 
 import pytest
 
-from research.models.repositories import PatientRepository
+from research.models.repositories import (
+    PatientRepository,
+    SQLitePatientRepository,
+    get_patient_repository,
+)
 
 ########### FIXTURES ###########
 
@@ -81,3 +86,179 @@ def test_delete_patient(patient_repository, patient_id):
     assert patient is not None
     patient_repository.delete(patient_id)
     assert patient_repository.get(patient_id) is None
+
+
+########### SQLITE BACKEND ###########
+
+
+@pytest.fixture
+def sqlite_repository(tmp_path):
+    """SQLite repository migrated from the test patients file."""
+    json_path = Path(__file__).parent / 'data/patients/patients.json'
+    return SQLitePatientRepository(tmp_path / 'patients.sqlite3', json_path)
+
+
+def test_sqlite_migrates_json(sqlite_repository):
+    """The JSON database is imported on first start, in order."""
+    json_path = Path(__file__).parent / 'data/patients/patients.json'
+    with json_path.open() as f:
+        expected = json.load(f)
+
+    assert sqlite_repository.all() == expected
+
+
+def test_sqlite_crud(sqlite_repository):
+    """Point operations behave like the JSON repository."""
+    record = {'meta': {'uuid': 'new-patient'}, 'patient': {'age': 30}}
+    sqlite_repository.create(record)
+    assert sqlite_repository.get('new-patient') == record
+
+    record['patient']['age'] = 40
+    assert sqlite_repository.update('new-patient', record)
+    assert sqlite_repository.get('new-patient')['patient']['age'] == 40
+
+    assert sqlite_repository.delete('new-patient')
+    assert sqlite_repository.get('new-patient') is None
+    assert not sqlite_repository.delete('new-patient')
+    assert not sqlite_repository.update('new-patient', record)
+
+
+def test_sqlite_persists_between_instances(sqlite_repository, tmp_path):
+    """Writes are visible to a new repository on the same file."""
+    sqlite_repository.create({'meta': {'uuid': 'kept'}})
+    reopened = SQLitePatientRepository(
+        tmp_path / 'patients.sqlite3', tmp_path / 'missing.json'
+    )
+
+    assert reopened.get('kept') == {'meta': {'uuid': 'kept'}}
+    assert len(reopened.all()) == len(sqlite_repository.all())
+
+
+def test_store_selected_by_environment(monkeypatch, tmp_path):
+    """SDX_PATIENT_STORE picks the backend."""
+    monkeypatch.setattr(
+        SQLitePatientRepository, 'DATA_PATH', tmp_path / 'p.sqlite3'
+    )
+    monkeypatch.setenv('SDX_PATIENT_STORE', 'sqlite')
+
+    assert isinstance(get_patient_repository(), SQLitePatientRepository)
+
+
+def test_detects_changes_from_other_processes(patient_repository):
+    """A long-lived repository reloads when the file changes on disk."""
+    other = PatientRepository()
+    other.create({'meta': {'uuid': 'written-elsewhere'}})
+
+    assert patient_repository.get('written-elsewhere') is not None
+    assert len(patient_repository.all()) == len(other.all())
+
+
+########### QUERY API ###########
+
+
+def _record(n, lang='en', diagnoses=(), exams=()):
+    return {
+        'meta': {
+            'uuid': f'p{n:02d}',
+            'lang': lang,
+            'timestamp': f'2025-01-{n:02d}T00:00:00',
+        },
+        'selected_diagnoses': list(diagnoses),
+        'selected_exams': list(exams),
+    }
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def query_repository(request, tmp_path, monkeypatch):
+    """Empty repository of each backend filled with dated records."""
+    monkeypatch.setattr(
+        PatientRepository, 'DATA_PATH', tmp_path / 'patients.json'
+    )
+    if request.param == 'json':
+        repo = PatientRepository()
+    else:
+        repo = SQLitePatientRepository(
+            tmp_path / 'patients.sqlite3', tmp_path / 'missing.json'
+        )
+    for n in range(1, 8):
+        repo.create(
+            _record(
+                n,
+                lang='pt' if n % 2 else 'en',
+                diagnoses=['Asthma'] if n > 4 else ['Flu'],
+                exams=['CBC'] if n in (2, 6) else [],
+            )
+        )
+    return repo
+
+
+def _walk(repo, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page = repo.query(limit=3, cursor=cursor, **kwargs)
+        pages.append([p['meta']['uuid'] for p in page.items])
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+def test_query_pages_newest_first(query_repository):
+    """Cursors walk every record once, newest first."""
+    assert _walk(query_repository) == [
+        ['p07', 'p06', 'p05'],
+        ['p04', 'p03', 'p02'],
+        ['p01'],
+    ]
+    assert _walk(query_repository, descending=False)[0] == [
+        'p01',
+        'p02',
+        'p03',
+    ]
+
+
+def test_query_filters(query_repository):
+    """Filters combine and match diagnoses / exams case-insensitively."""
+    assert _walk(query_repository, language='pt') == [
+        ['p07', 'p05', 'p03'],
+        ['p01'],
+    ]
+    assert _walk(query_repository, diagnosis='asthma', exam='cbc') == [['p06']]
+    assert _walk(query_repository, language='fr') == [[]]
+
+
+def test_query_follows_writes(query_repository):
+    """Updates and deletes are reflected by the indexes."""
+    record = _record(6, lang='pt')
+    query_repository.update('p06', record)
+    query_repository.delete('p07')
+
+    assert _walk(query_repository, language='pt') == [
+        ['p06', 'p05', 'p03'],
+        ['p01'],
+    ]
+    assert _walk(query_repository, exam='cbc') == [['p02']]
+
+
+def test_saved_record_ignores_later_edits(query_repository):
+    """Editing a dict after saving it changes neither records nor indexes."""
+    created = _record(9, diagnoses=['Cold'])
+    updated = _record(6, diagnoses=['Cold'])
+    query_repository.create(created)
+    query_repository.update('p06', updated)
+    created['selected_diagnoses'] = ['Flu']
+    updated['selected_diagnoses'].append('Flu')
+    query_repository.create(_record(10))
+
+    assert _walk(query_repository, diagnosis='cold') == [['p09', 'p06']]
+    assert _walk(query_repository, diagnosis='flu') == [
+        ['p04', 'p03', 'p02'],
+        ['p01'],
+    ]
+    assert query_repository.get('p09')['selected_diagnoses'] == ['Cold']
+    assert query_repository.get('p06')['selected_diagnoses'] == ['Cold']
+
+
+def test_query_rejects_bad_cursor(query_repository):
+    """A malformed cursor raises ValueError."""
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        query_repository.query(cursor='not-a-cursor')
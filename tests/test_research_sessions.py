@@ -0,0 +1,127 @@
+"""Tests for the consultation session stores."""
+
+import asyncio
+import threading
+
+from types import SimpleNamespace
+
+import pytest
+
+from research.models import sessions
+from research.models.sessions import (
+    MemorySessionStore,
+    SQLiteSessionStore,
+    get_session_store,
+)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    """Return a factory building a store of each backend."""
+
+    def build(**kwargs):
+        if request.param == 'memory':
+            return MemorySessionStore(**kwargs)
+        return SQLiteSessionStore(tmp_path / 'sessions.sqlite3', **kwargs)
+
+    return build
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Control the clock seen by the stores."""
+    now = [1000.0]
+    monkeypatch.setattr(sessions, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_roundtrip(make_store):
+    """Saved sessions come back and can be deleted."""
+    store = make_store()
+    store.save('a', {'patient': {'age': 3}, 'meta': {'lang': 'en'}})
+
+    assert 'a' in store
+    assert store.get('a') == {'patient': {'age': 3}, 'meta': {'lang': 'en'}}
+    assert store.delete('a')
+    assert store.get('a') is None
+    assert not store.delete('a')
+
+
+def test_ttl_is_sliding(make_store, clock):
+    """Sessions expire after ``ttl`` seconds without use."""
+    store = make_store(ttl=10)
+    store.save('a', {})
+    store.save('b', {})
+
+    clock[0] += 8
+    assert store.get('a') == {}
+    clock[0] += 8
+    assert store.get('a') == {}
+    assert store.get('b') is None
+    assert 'b' not in store
+
+    clock[0] += 11
+    assert store.purge() == 1
+    assert len(store) == 0
+    assert store.stats.expired == 2
+
+
+def test_lru_eviction_and_stats(make_store, clock):
+    """The least recently used session is evicted when full."""
+    store = make_store(maxsize=2)
+    store.save('a', {})
+    clock[0] += 1
+    store.save('b', {})
+    clock[0] += 1
+    store.get('a')
+    clock[0] += 1
+    store.save('c', {})
+
+    assert store.get('b') is None
+    assert store.get('a') == {}
+    stats = store.stats
+    assert (stats.live, stats.created, stats.evicted) == (2, 3, 1)
+    assert (stats.hits, stats.misses) == (2, 1)
+
+
+def test_async_access_keeps_sqlite_off_the_loop(make_store):
+    """aget/asave round-trip; SQLite I/O runs in a worker thread."""
+    store = make_store()
+    threads = []
+    get = store._get
+
+    def recording_get(sid, now):
+        threads.append(threading.get_ident())
+        return get(sid, now)
+
+    store._get = recording_get
+
+    async def run():
+        await store.asave('a', {'step': 1})
+        return await store.aget('a'), threading.get_ident()
+
+    session, loop_thread = asyncio.run(run())
+
+    assert session == {'step': 1}
+    on_loop = threads == [loop_thread]
+    assert on_loop is isinstance(store, MemorySessionStore)
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    """Two stores on one file see each other's writes."""
+    first = SQLiteSessionStore(tmp_path / 'sessions.sqlite3')
+    second = SQLiteSessionStore(tmp_path / 'sessions.sqlite3')
+    first.save('a', {'step': 1})
+    second.save('a', {**second.get('a'), 'step': 2})
+
+    assert first.get('a') == {'step': 2}
+
+
+def test_store_selected_by_environment(monkeypatch, tmp_path):
+    """SDX_SESSION_STORE picks the backend."""
+    monkeypatch.setenv('SDX_SESSION_STORE', 'sqlite')
+    monkeypatch.setenv('SDX_SESSION_PATH', str(tmp_path / 's.sqlite3'))
+    assert isinstance(get_session_store(), SQLiteSessionStore)
+
+    monkeypatch.delenv('SDX_SESSION_STORE')
+    assert isinstance(get_session_store(), MemorySessionStore)
@@ -0,0 +1,65 @@
+"""Tests for parsing LLM replies into ``LLMDiagnosis``."""
+
+from __future__ import annotations
+
+import pytest
+
+from pydantic import ValidationError
+from sdx.schema.clinical_outputs import LLMDiagnosis, strip_fences
+
+BODY = '{"summary": "json-like start", "options": ["Flu", "Cold"]}'
+
+
+@pytest.mark.parametrize(
+    'reply',
+    [
+        BODY,
+        f'  {BODY}\n',
+        f'```json\n{BODY}\n```',
+        f'```{BODY}```',
+        f'\n```JSON\n{BODY}\n```  \n',
+        f'```json\n{BODY}',
+        f'{BODY}\n```\n',
+    ],
+)
+def test_fences_stripped(reply):
+    """Fenced and bare replies parse the same, as str and as bytes."""
+    expected = LLMDiagnosis(summary='json-like start', options=['Flu', 'Cold'])
+
+    assert LLMDiagnosis.from_llm(reply) == expected
+    assert LLMDiagnosis.from_llm(reply.encode()) == expected
+    assert LLMDiagnosis.from_llm(memoryview(reply.encode())) == expected
+
+
+def test_half_fenced_replies_stripped():
+    """An opening or a closing fence alone is removed too."""
+    assert strip_fences('```json\n{}') == '\n{}'
+    assert strip_fences(b'  {}```  ') == b'  {}'
+    assert strip_fences('{"summary": "```"}') == '{"summary": "```"}'
+
+
+def test_leading_json_characters_kept():
+    """Only the fence is removed, not a leading run of fence characters."""
+    assert strip_fences('```json\nnull\n```') == '\nnull\n'
+    assert strip_fences(b'```\n"json"```') == b'\n"json"'
+
+
+def test_unfenced_reply_not_copied():
+    """Replies without a fence are handed to the validator untouched."""
+    reply = f'  {BODY}  '.encode()
+
+    assert strip_fences(reply) is reply
+
+
+def test_from_llm_many():
+    """Bulk mode matches from_llm and reports the index of a bad reply."""
+    replies = [BODY, f'```json\n{BODY}\n```'.encode()]
+
+    assert LLMDiagnosis.from_llm_many(replies) == [
+        LLMDiagnosis.from_llm(reply) for reply in replies
+    ]
+    with pytest.raises(ValidationError) as info:
+        LLMDiagnosis.from_llm_many([BODY, '{"summary": "x"}'])
+    assert info.value.errors()[0]['loc'][0] == 1
+    with pytest.raises(ValueError, match='more than one'):
+        LLMDiagnosis.from_llm_many([f'{BODY},{BODY}'])